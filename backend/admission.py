@@ -0,0 +1,59 @@
+"""
+Control de admisión para las búsquedas que van a los upstreams.
+
+Cada búsqueda que no sale del cache tiene en vuelo varios requests a los
+upstreams durante segundos. Si llegan más de las que el proceso puede
+atender, encolarlas sólo hace que todas terminen tarde (y que el cliente
+reintente encima). Con `limit` búsquedas yendo a los upstreams, la siguiente
+que también tendría que ir se rechaza al instante (Overloaded -> 503 con
+Retry-After). El chequeo está en el camino del miss, dentro del handler: los
+hits del cache, las que se suman a una búsqueda en curso y el resto de las
+rutas (cotización, salud, métricas) nunca se rechazan.
+"""
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+SHED = REGISTRY.counter(
+    "autitos_requests_shed_total", "Búsquedas rechazadas con 503 por control de admisión", ("route",),
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "autitos_requests_in_flight", "Búsquedas en curso contra los upstreams",
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("servidor saturado, reintentar")
+        self.retry_after = retry_after
+
+
+class Admission:
+    def __init__(self, limit, retry_after=1):
+        self.limit = limit  # 0 = sin límite
+        self.retry_after = retry_after
+        self.in_flight = 0
+
+    def check(self, route):
+        """
+        Overloaded si ya hay `limit` búsquedas yendo a los upstreams.
+        """
+        if self.limit and self.in_flight >= self.limit:
+            SHED.inc(route=route)
+            raise Overloaded(self.retry_after)
+
+    @contextmanager
+    def slot(self, route, check=True):
+        """
+        Ocupa un lugar mientras dura la búsqueda. check=False cuenta sin
+        rechazar (cuando ya se chequeó antes de empezar a responder).
+        """
+        if check:
+            self.check(route)
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            IN_FLIGHT.set(self.in_flight)
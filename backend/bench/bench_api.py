@@ -0,0 +1,206 @@
+"""
+Benchmark de carga de /api/cars contra el mock de upstreams, sin red.
+
+Levanta bench/mock_upstream.py y uvicorn main:app como subprocesos (la app
+apunta al mock con AUTITOS_UPSTREAM_OVERRIDE, con snapshot de V6, historial
+y hot queries en un directorio temporal), espera a que respondan y recorre
+los niveles de concurrencia pedidos. Por nivel reporta p50/p95/p99,
+throughput, errores y p50/p95 de cada etapa según el header Server-Timing
+(rate, fetch y parse por fuente, batches de /items, dedup, score,
+serialización). --cold desactiva el cache de búsquedas: cada request va a los
+upstreams (las búsquedas idénticas concurrentes igual se coalescen).
+--workers N levanta N workers uvicorn con el cache compartido en SQLite; al
+final se imprime cuántos requests recibió cada host del mock.
+
+    cd backend && python bench/make_fixtures.py
+    cd backend && python bench/bench_api.py [--concurrency 1,8,32] [--requests 200] [--cold] [--workers 1]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from mock_upstream import DEFAULT_FIXTURES_DIR, add_arguments  # noqa: E402
+from make_fixtures import DEFAULT_QUERIES  # noqa: E402
+
+MOCK_ARGS = ("fixtures", "latency", "jitter", "error_rate", "rate_limit_rate", "timeout_rate", "seed")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def mock_command(args, port):
+    cmd = [sys.executable, os.path.join(BACKEND_DIR, "bench", "mock_upstream.py"), "--port", str(port)]
+    for name in MOCK_ARGS:
+        value = getattr(args, name)
+        if value is not None:
+            cmd += ["--" + name.replace("_", "-"), str(value)]
+    for value in args.host_latency or []:
+        cmd += ["--host-latency", value]
+    return cmd
+
+
+def app_env(args, mock_port, workdir):
+    env = dict(os.environ)
+    env.update({
+        "AUTITOS_UPSTREAM_OVERRIDE": f"http://127.0.0.1:{mock_port}",
+        "AUTITOS_V6_SNAPSHOT": os.path.join(workdir, "v6_snapshot.json"),
+        "AUTITOS_HOT_QUERIES_FILE": os.path.join(workdir, "hot_queries.json"),
+        "AUTITOS_HISTORY": "0",
+        "AUTITOS_PREWARM": "0",
+        "AUTITOS_SEARCH_CACHE_DIR": "",
+        "AUTITOS_CACHE_BACKEND": "sqlite" if args.workers > 1 else "memory",
+        "AUTITOS_CACHE_PATH": os.path.join(workdir, "shared_cache.db"),
+    })
+    env.setdefault("AUTITOS_LOG_LEVEL", "WARNING")
+    if args.cold:
+        env["AUTITOS_SEARCH_CACHE_MB"] = "0"
+    return env
+
+
+async def wait_ready(session, base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{base}/api/sources") as r:
+                if r.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"la app no respondió en {timeout}s")
+
+
+def parse_server_timing(header):
+    """
+    "rate;dur=12.3, ml-items;dur=40;desc=..." -> {"rate": 12.3, "ml-items": 40.0}
+    """
+    timings = {}
+    for entry in header.split(","):
+        name, *params = entry.strip().split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                timings[name] = float(value)
+    return timings
+
+
+async def one_request(session, base, params, latencies, stages, errors):
+    start = time.perf_counter()
+    try:
+        async with session.get(f"{base}/api/cars", params=params) as r:
+            data = await r.json()
+            ok = r.status == 200
+            server_timing = r.headers.get("Server-Timing", "")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        ok, data = False, None
+    latencies.append((time.perf_counter() - start) * 1000)
+    if not ok:
+        errors.append(1)
+        return
+    # Sólo los requests que fueron a los upstreams traen las etapas de fetch
+    for name, ms in parse_server_timing(server_timing).items():
+        stages.setdefault(name, []).append(ms)
+    for name, status in (data.get("sources") or {}).items():
+        if status.get("status") != "ok":
+            stages.setdefault(f"{name}:{status.get('status')}", []).append(1)
+
+
+async def run_level(session, base, queries, sources, concurrency, total):
+    latencies, stages, errors = [], {}, []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            params = {"query": queries[i % len(queries)], "sources": sources}
+            await one_request(session, base, params, latencies, stages, errors)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return latencies, stages, len(errors), wall
+
+
+def report(concurrency, latencies, stages, errors, wall):
+    print(
+        f"c={concurrency:<4} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50):7.1f}ms p95={percentile(latencies, 95):7.1f}ms "
+        f"p99={percentile(latencies, 99):7.1f}ms  {len(latencies) / wall:7.1f} req/s  errores={errors}"
+    )
+    for name in sorted(stages):
+        values = stages[name]
+        if ":" in name:
+            print(f"         {name:<24} {len(values)} veces")
+        else:
+            print(f"         {name:<24} p50={statistics.median(values):7.1f}ms p95={percentile(values, 95):7.1f}ms")
+
+
+async def drive(args, base, mock_base):
+    queries = [q.strip() for q in args.queries.split(",") if q.strip()]
+    timeout = aiohttp.ClientTimeout(total=60)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await wait_ready(session, base)
+        # Primera ronda sin medir: carga el snapshot de V6 y la cotización
+        await run_level(session, base, queries, args.sources, 1, len(queries))
+        for concurrency in args.concurrency:
+            report(concurrency, *await run_level(session, base, queries, args.sources, concurrency, args.requests))
+        async with session.get(f"{mock_base}/_mock/stats") as r:
+            by_host = (await r.json())["by_host"]
+        print("requests al mock: " + ", ".join(f"{host}={n}" for host, n in sorted(by_host.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    parser.set_defaults(fixtures=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--requests", type=int, default=200, help="requests por nivel de concurrencia")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--sources", default="mercadolibre,v6,kavak")
+    parser.add_argument("--cold", action="store_true", help="sin cache de búsquedas")
+    parser.add_argument("--workers", type=int, default=1, help="workers uvicorn (>1 usa cache en SQLite)")
+    args = parser.parse_args()
+
+    mock_port, app_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        mock = subprocess.Popen(mock_command(args, mock_port), cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning",
+             "--workers", str(args.workers)],
+            cwd=BACKEND_DIR, env=app_env(args, mock_port, workdir), stdout=subprocess.DEVNULL,
+        )
+        try:
+            print(f"mock :{mock_port}  app :{app_port}  cache={'off' if args.cold else 'on'}  workers={args.workers}  sources={args.sources}")
+            asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{mock_port}"))
+        finally:
+            for proc in (app, mock):
+                proc.terminate()
+                proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark de bytes en el cable y CPU de compresión de /api/cars.
+
+Arma páginas como las de /api/cars (ResultView.page sobre publicaciones
+sintéticas con títulos, ubicaciones, URLs e imágenes del proxy variados) de
+los tamaños típicos y mide, por codec y nivel, el tamaño comprimido y el
+tiempo de comprimir. Los codecs que no estén instalados se saltean.
+
+    cd backend && python bench/bench_compression.py [--sizes 20,50,200] [--result 800] [--runs 20]
+"""
+import argparse
+import gzip
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import BROTLI_QUALITY, GZIP_LEVEL, ZSTD_LEVEL, brotli, zstandard  # noqa: E402
+from listing import Listing  # noqa: E402
+from responses import dumps  # noqa: E402
+from result_view import MAX_LIMIT, ResultView, Selection  # noqa: E402
+
+MODELS = [
+    ("Volkswagen", "Gol Trend"), ("Chevrolet", "Onix"), ("Peugeot", "208"), ("Toyota", "Hilux"),
+    ("Ford", "Ranger"), ("Fiat", "Cronos"), ("Renault", "Sandero"), ("Toyota", "Etios"),
+]
+VERSIONS = ["1.6 Highline", "LT 1.4", "Active Pack", "SRV 4x4", "XLS", "Drive 1.3", "Life", "SE MT"]
+LOCATIONS = ["Capital Federal", "Córdoba", "Rosario, Santa Fe", "La Plata, Buenos Aires", "Mendoza", "Tigre"]
+SCORES = ("muy-bueno", "bueno", "regular", "malo", "muy-malo")
+
+
+def synthetic_result(n, rng):
+    cars = []
+    for i in range(n):
+        brand, model = rng.choice(MODELS)
+        year = rng.randint(2008, 2024)
+        source = ("mercadolibre", "v6", "kavak")[i % 3]
+        usd = i % 2 == 0
+        original = rng.randint(5000, 40000) if usd else rng.randint(8_000_000, 50_000_000)
+        image = f"https://http2.mlstatic.com/D_NQ_NP_{rng.randrange(10**9):09d}-MLA{rng.randrange(10**8)}_0{i % 9}-O.webp"
+        cars.append(Listing.from_dict({
+            "id": f"{rng.getrandbits(48):012x}",
+            "title": f"{brand} {model} {rng.choice(VERSIONS)} {year}",
+            "originalPrice": original,
+            "currency": "USD" if usd else "ARS",
+            "price": original * 1285 if usd else original,
+            "priceUSD": original if usd else original // 1285,
+            "year": year,
+            "km": rng.randrange(0, 250000, 100),
+            "location": rng.choice(LOCATIONS),
+            "image": f"/api/img?u={quote(image, safe='')}&w=320",
+            "url": f"https://auto.mercadolibre.com.ar/MLA-{rng.randrange(10**9)}-{brand.lower()}-{model.lower().replace(' ', '-')}-_JM",
+            "source": source,
+            "sourceId": f"MLA{rng.randrange(10**9)}",
+            "priceScore": rng.choice(SCORES),
+            "pricePercentile": round(rng.uniform(0, 100), 1),
+            "priceZScore": round(rng.gauss(0, 1), 2),
+        }))
+    sources = {name: {"status": "ok", "count": n // 3, "elapsed_ms": 812.4} for name in ("mercadolibre", "v6", "kavak")}
+    return {"cars": cars, "dollar_rate": 1285.0, "sources": sources}
+
+
+def codecs():
+    found = [("gzip", level, lambda b, lv=level: gzip.compress(b, compresslevel=lv, mtime=0)) for level in (1, GZIP_LEVEL, 9)]
+    if brotli is not None:
+        found += [("br", q, lambda b, q=q: brotli.compress(b, quality=q)) for q in (1, BROTLI_QUALITY, 11)]
+    if zstandard is not None:
+        found += [("zstd", level, lambda b, lv=level: zstandard.ZstdCompressor(level=lv).compress(b)) for level in (1, ZSTD_LEVEL, 19)]
+    return found
+
+
+def measure(label, body, runs):
+    print(f"\n{label}: {len(body) / 1024:.1f} KB sin comprimir")
+    for name, level, compress in codecs():
+        out = compress(body)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            compress(body)
+            times.append(time.perf_counter() - start)
+        chosen = " *" if (name, level) in (("gzip", GZIP_LEVEL), ("br", BROTLI_QUALITY), ("zstd", ZSTD_LEVEL)) else ""
+        print(f"  {name:>4} {level:>2}: {len(out) / 1024:7.1f} KB ({len(out) / len(body):5.1%})  "
+              f"{statistics.median(times) * 1000:7.2f} ms{chosen}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20,50,200")
+    parser.add_argument("--result", type=int, default=800, help="autos del resultado cacheado")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    result = synthetic_result(args.result, rng)
+    view = ResultView(result)
+    for limit in (int(s) for s in args.sizes.split(",")):
+        page = view.page(Selection(), limit)
+        page.update(dollar_rate=result["dollar_rate"], sources=result["sources"])
+        measure(f"página de {limit} autos (fields=card)", dumps(page), args.runs)
+    page = view.page(Selection(), MAX_LIMIT, fields="full")
+    measure(f"página de {MAX_LIMIT} autos (fields=full)", dumps(page), args.runs)
+    measure(f"resultado completo, {args.result} autos (como el stream)", dumps(result), args.runs)
+    print("\n* = nivel que usa compression.py")
+
+
+if __name__ == "__main__":
+    main()
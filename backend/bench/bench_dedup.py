@@ -0,0 +1,73 @@
+"""
+Benchmark de la deduplicación entre fuentes con listados sintéticos.
+
+Genera N autos únicos repartidos en V6 / MercadoLibre / Kavak, republica una
+parte en otra fuente con pequeñas diferencias (km, precio, título) y mide
+dedupe_cars contra el tamaño de la entrada. Con el índice de bloques cada
+auto se compara sólo con los de su bloque y los vecinos, nunca con todos.
+
+    cd backend && python bench/bench_dedup.py [--sizes 1000,5000,20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import dedupe_cars  # noqa: E402
+
+MODELS = [
+    ("Volkswagen", "Gol Trend"), ("Volkswagen", "Amarok"), ("Chevrolet", "Onix"),
+    ("Peugeot", "208"), ("Toyota", "Hilux"), ("Ford", "Ranger"), ("Fiat", "Cronos"),
+    ("Renault", "Sandero"), ("Toyota", "Etios"), ("Ford", "Ka"),
+]
+VERSIONS = ["1.6", "Highline", "LT", "Active", "SRV", "XLS", "Drive", "Life", "XS", "SE"]
+SOURCES = ("v6", "mercadolibre", "kavak")
+
+
+def synthetic(n, dup_ratio, rng):
+    cars = []
+    for i in range(n):
+        brand, model = rng.choice(MODELS)
+        car = {
+            "title": f"{brand} {model} {rng.choice(VERSIONS)} {rng.randint(2008, 2024)}",
+            "year": rng.randint(2008, 2024),
+            "km": rng.randrange(0, 250000, 500),
+            "priceUSD": rng.randint(4000, 40000),
+            "source": SOURCES[i % 3],
+            "sourceId": f"{i}",
+            "url": f"https://example.com/{i}",
+        }
+        cars.append(car)
+        if rng.random() < dup_ratio:
+            dup = dict(car)
+            dup["source"] = SOURCES[(i + 1) % 3]
+            dup["sourceId"] = f"dup-{i}"
+            dup["url"] = f"https://example.com/dup-{i}"
+            dup["km"] = car["km"] + rng.randint(-1000, 1000) if car["km"] > 1000 else car["km"]
+            dup["priceUSD"] = int(car["priceUSD"] * rng.uniform(0.97, 1.03))
+            cars.append(dup)
+    rng.shuffle(cars)
+    return cars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,5000,20000")
+    parser.add_argument("--dup-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for size in (int(s) for s in args.sizes.split(",")):
+        cars = synthetic(size, args.dup_ratio, rng)
+        start = time.perf_counter()
+        unique, merged = dedupe_cars(cars)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(cars):>7} autos -> {len(unique):>7} únicos, {len(merged):>6} colapsados   "
+              f"{elapsed:8.1f} ms   {elapsed * 1000 / len(cars):6.1f} µs/auto")
+
+
+if __name__ == "__main__":
+    main()
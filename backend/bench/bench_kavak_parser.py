@@ -0,0 +1,60 @@
+"""
+Benchmark de los backends del parser de Kavak sobre HTML guardado.
+
+Parsea cada fixture `bench/fixtures/kavak*.html` con todos los backends
+disponibles, verifica que devuelvan los mismos autos que BeautifulSoup y
+reporta el tiempo por parseo.
+
+    cd backend && python bench/bench_kavak_parser.py [--runs 50]
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kavak_parser import BACKENDS  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def bench(parse, body, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse(body)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, "kavak*.html")))
+    if not fixtures:
+        sys.exit(f"No hay fixtures de Kavak en {FIXTURES_DIR}")
+
+    for path in fixtures:
+        with open(path, "rb") as f:
+            body = f.read()
+        expected = BACKENDS["bs4"](body)
+        print(f"{os.path.basename(path)}: {len(body) / 1024:.0f} KiB, {len(expected)} autos")
+
+        medians = {}
+        for name, parse in BACKENDS.items():
+            same = parse(body) == expected
+            medians[name], best = bench(parse, body, args.runs)
+            print(f"  {name:<10} mediana {medians[name]:8.2f} ms   mín {best:8.2f} ms   {'OK' if same else 'DIFIERE de bs4'}")
+
+        for name, median in medians.items():
+            if name != "bs4":
+                print(f"  {name} es {medians['bs4'] / median:.1f}x más rápido que bs4")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark de memoria y serialización de un resultado de 10k publicaciones.
+
+Compara el formato anterior (lista de dicts serializada por FastAPI con
+jsonable_encoder + json.dumps) contra Listing (__slots__, strings
+internados) serializado con orjson.
+
+    cd backend && python bench/bench_listings.py [--n 10000] [--runs 20]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from listing import Listing  # noqa: E402
+from responses import dumps  # noqa: E402
+from v6_catalog import NO_IMAGE_URL  # noqa: E402
+
+LOCATIONS = ["Capital Federal", "Córdoba", "Rosario, Santa Fe", "La Plata, Buenos Aires", "Mendoza"]
+
+
+def raw_listings(n, seed=7):
+    """
+    Campos como llegan de los parsers: strings nuevos por publicación.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        source = ("mercadolibre", "v6", "kavak")[i % 3]
+        rows.append(dict(
+            title=f"Volkswagen Gol Trend 1.6 Highline {2008 + i % 15}",
+            originalPrice=rng.randint(5000, 40000) if i % 2 else rng.randint(8_000_000, 40_000_000),
+            currency="".join(["U", "SD"]) if i % 2 else "".join(["A", "RS"]),
+            year=2008 + i % 15,
+            km=rng.randrange(0, 250000, 100),
+            location="".join(rng.choice(LOCATIONS)),
+            image="".join(NO_IMAGE_URL) if i % 4 == 0 else f"https://http2.mlstatic.com/D_{i:08d}-O.jpg",
+            url=f"https://auto.mercadolibre.com.ar/MLA-{1000000 + i}",
+            source="".join(source),
+            sourceId=f"MLA{1000000 + i}",
+        ))
+    return rows
+
+
+def finish(car, i):
+    # Lo que agregan apply_dollar_rate, dedup y score_cars
+    car["price"] = 10_000_000 + i
+    car["priceUSD"] = 10_000 + i
+    car["id"] = f"{i:012x}"
+    car["priceScore"] = "regular"
+    car["pricePercentile"] = 50.0
+    car["priceZScore"] = 0.1
+    return car
+
+
+def build_dicts(rows):
+    return [finish(dict(row, priceScore="regular", publishDate="".join("desconocido")), i) for i, row in enumerate(rows)]
+
+
+def build_listings(rows):
+    return [finish(Listing(**row), i) for i, row in enumerate(rows)]
+
+
+def measure_memory(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cars = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cars, after - before
+
+
+def measure(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = raw_listings(args.n)
+    dicts, dict_bytes = measure_memory(build_dicts, rows)
+    listings, listing_bytes = measure_memory(build_listings, rows)
+    result_dicts = {"cars": dicts, "dollar_rate": 1285.0, "sources": {}}
+    result_listings = {"cars": listings, "dollar_rate": 1285.0, "sources": {}}
+
+    old_ms, old_size = measure(lambda: json.dumps(jsonable_encoder(result_dicts)).encode(), args.runs)
+    json_ms, _ = measure(lambda: json.dumps(result_dicts).encode(), args.runs)
+    new_ms, new_size = measure(lambda: dumps(result_listings), args.runs)
+
+    print(f"{args.n} publicaciones")
+    print(f"  memoria  dicts            {dict_bytes / 1024 / 1024:7.2f} MiB")
+    print(f"  memoria  Listing          {listing_bytes / 1024 / 1024:7.2f} MiB   ({dict_bytes / listing_bytes:.1f}x menos)")
+    print(f"  JSON     jsonable+json    {old_ms:7.1f} ms   {old_size / 1024:.0f} KiB")
+    print(f"  JSON     json.dumps       {json_ms:7.1f} ms")
+    print(f"  JSON     orjson Listing   {new_ms:7.1f} ms   {new_size / 1024:.0f} KiB   ({old_ms / new_ms:.0f}x más rápido)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark de las estadísticas de mercado (market_stats.py).
+
+Alimenta digests con precios sintéticos (log-normales, con empates en
+números redondos), en varios "workers" que después se combinan, y compara
+mediana/IQR/percentiles contra los exactos de NumPy. Mide también el tamaño
+serializado y el costo de puntuar un auto contra el digest.
+
+    cd backend && python bench/bench_market.py [--sizes 100,1000,20000] [--workers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_stats import TDigest  # noqa: E402
+from scoring import _market_score  # noqa: E402
+
+
+def synthetic(n, rng):
+    prices = []
+    for _ in range(n):
+        price = rng.lognormvariate(9.6, 0.35)
+        # Muchas publicaciones en números redondos
+        prices.append(round(price, -3) if rng.random() < 0.4 else round(price))
+    return prices
+
+
+def run(n, workers, rng):
+    prices = synthetic(n, rng)
+    parts = [TDigest() for _ in range(workers)]
+    start = time.perf_counter()
+    for i, price in enumerate(prices):
+        parts[i % workers].add(price)
+    digest = TDigest()
+    for part in parts:
+        digest.merge(part)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    exact = np.array(prices, dtype=np.float64)
+    median, iqr = digest.summary()
+    exact_median = np.median(exact)
+    exact_iqr = np.quantile(exact, 0.75) - np.quantile(exact, 0.25)
+    probes = exact[:: max(1, n // 500)]
+    pct_error = max(
+        abs(digest.cdf(p) - ((exact < p).sum() + 0.5 * (exact == p).sum()) / n) * 100 for p in probes
+    )
+
+    start = time.perf_counter()
+    for p in probes:
+        _market_score(p, digest)
+    score_us = (time.perf_counter() - start) / len(probes) * 1e6
+
+    print(f"{n:>7} precios / {workers} workers: {len(digest.means):>3} centroides, "
+          f"{len(digest.to_bytes()):>5} bytes, armado {build_ms:7.1f} ms")
+    print(f"         mediana {median:9.0f} (exacta {exact_median:9.0f}), IQR {iqr:8.0f} (exacto {exact_iqr:8.0f}), "
+          f"error máx. de percentil {pct_error:.2f} pts, {score_us:.1f} µs por auto")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,20000,200000")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    for n in (int(s) for s in args.sizes.split(",")):
+        run(n, args.workers, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Genera fixtures sintéticos de los upstreams para correr el mock sin red.
+
+Escribe, para cada query, las páginas de búsqueda de MercadoLibre con sus
+batches de /items (en el mismo orden en que los pide MercadoLibreSource) y
+las mismas páginas ordenadas por fecha para los refrescos delta, el
+listado de Kavak (reusa fixtures/kavak_listado.html) y, una sola vez, el dump
+de V6 y la cotización de bluelytics. Con AUTITOS_RECORD_DIR se pueden grabar
+fixtures reales en lugar de estos.
+
+    cd backend && python bench/make_fixtures.py [--queries "gol trend,onix,208"] [--pages 3]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sources import ML_CARS_CATEGORY, ML_ITEMS_BATCH, ML_PAGE_LIMIT, ML_RECENT_SORT, ML_SITE  # noqa: E402
+from upstream_fixtures import FixtureStore, split_request  # noqa: E402
+from v6_catalog import V6_API_URL  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures", "upstream")
+KAVAK_HTML = os.path.join(BENCH_DIR, "fixtures", "kavak_listado.html")
+
+DEFAULT_QUERIES = "gol trend,onix,208,hilux,cronos"
+VERSIONS = ["1.6", "Highline", "LT", "Active", "SRV", "XLS", "Drive", "Life", "XS", "SE"]
+PLACES = [("Capital Federal", "Buenos Aires"), ("Córdoba", "Córdoba"), ("Rosario", "Santa Fe"), ("Mendoza", "Mendoza")]
+# Como la API: el orden aplicado en "sort" y los demás en "available_sorts"
+ML_SORTS = {
+    "relevance": "Más relevantes",
+    "price_asc": "Menor precio",
+    "price_desc": "Mayor precio",
+    ML_RECENT_SORT: "Más recientes",
+}
+V6_MODELS = [
+    ("volkswagen", "gol trend"), ("volkswagen", "amarok"), ("chevrolet", "onix"), ("peugeot", "208"),
+    ("toyota", "hilux"), ("ford", "ranger"), ("fiat", "cronos"), ("renault", "sandero"),
+]
+
+
+def save_json(store, url, params, payload):
+    host, path, merged = split_request(url, params)
+    store.save(host, path, merged, 200, "application/json", json.dumps(payload).encode("utf-8"))
+
+
+def ml_results(query, rng):
+    results = []
+    for _ in range(ML_PAGE_LIMIT):
+        item_id = f"MLA{rng.randrange(10**9):09d}"
+        city, state = rng.choice(PLACES)
+        usd = rng.random() < 0.3
+        results.append({
+            "id": item_id,
+            "title": f"{query.title()} {rng.choice(VERSIONS)} {rng.randint(2008, 2024)}",
+            "price": rng.randint(5000, 35000) if usd else rng.randint(6_000_000, 45_000_000),
+            "currency_id": "USD" if usd else "ARS",
+            "permalink": f"https://auto.mercadolibre.com.ar/{item_id[:3]}-{item_id[3:]}",
+            "thumbnail": f"http://http2.mlstatic.com/D_{item_id}-I.jpg",
+            "secure_thumbnail": f"https://http2.mlstatic.com/D_{item_id}-I.jpg",
+            "address": {"city_name": city, "state_name": state},
+        })
+    return results
+
+
+def ml_items(results, rng):
+    return [{
+        "code": 200,
+        "body": {
+            "id": item["id"],
+            "attributes": [
+                {"name": "Año", "value_name": item["title"].rsplit(" ", 1)[-1]},
+                {"name": "Kilómetros", "value_name": f"{rng.randrange(0, 250000, 500)} km"},
+            ],
+        },
+    } for item in results]
+
+
+def ml_page(total, results, sort):
+    return {
+        "paging": {"total": total},
+        "results": results,
+        "sort": {"id": sort, "name": ML_SORTS[sort]},
+        "available_sorts": [{"id": sort_id, "name": name} for sort_id, name in ML_SORTS.items() if sort_id != sort],
+    }
+
+
+def write_mercadolibre(store, query, pages, rng):
+    url = f"https://api.mercadolibre.com/sites/{ML_SITE}/search"
+    total = pages * ML_PAGE_LIMIT
+    count = 0
+    for page in range(pages):
+        results = ml_results(query, rng)
+        params = {"q": query, "category": ML_CARS_CATEGORY, "limit": ML_PAGE_LIMIT, "offset": page * ML_PAGE_LIMIT}
+        save_json(store, url, params, ml_page(total, results, "relevance"))
+        # Las mismas páginas por fecha, para los refrescos delta (nada nuevo)
+        save_json(store, url, {**params, "sort": ML_RECENT_SORT}, ml_page(total, results, ML_RECENT_SORT))
+        count += 2
+        for i in range(0, len(results), ML_ITEMS_BATCH):
+            batch = results[i:i + ML_ITEMS_BATCH]
+            ids = ",".join(item["id"] for item in batch)
+            save_json(store, "https://api.mercadolibre.com/items", {"ids": ids}, ml_items(batch, rng))
+            count += 1
+    return count
+
+
+def write_kavak(store, query, html):
+    url = f"https://www.kavak.com/ar/usados/{query.strip().lower().replace(' ', '-')}"
+    host, path, params = split_request(url)
+    store.save(host, path, params, 200, "text/html; charset=utf-8", html)
+
+
+def write_v6(store, n, rng):
+    cars = []
+    for i in range(n):
+        brand, model = rng.choice(V6_MODELS)
+        city, province = rng.choice(PLACES)
+        cars.append({
+            "carId": f"v6-{i}",
+            "brand": brand,
+            "model": model,
+            "version": rng.choice(VERSIONS),
+            "year": rng.randint(2008, 2024),
+            "price": rng.randint(5000, 35000),
+            "kilometers": str(rng.randrange(0, 250000, 500)),
+            "city": city,
+            "province": province,
+        })
+    save_json(store, V6_API_URL, None, cars)
+
+
+def generate(out, queries, pages=3, v6_cars=5000, seed=7):
+    """
+    Escribe los fixtures en `out`. Devuelve {query: respuestas de MercadoLibre}.
+    """
+    rng = random.Random(seed)
+    store = FixtureStore(out)
+    with open(KAVAK_HTML, "rb") as f:
+        kavak_html = f.read()
+
+    counts = {}
+    for query in queries:
+        counts[query] = write_mercadolibre(store, query, pages, rng)
+        write_kavak(store, query, kavak_html)
+    write_v6(store, v6_cars, rng)
+    save_json(store, "https://api.bluelytics.com.ar/v2/latest", None, {"blue": {"value_avg": 1285.0}})
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--out", default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--v6-cars", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = [q.strip() for q in args.queries.split(",") if q.strip()]
+    counts = generate(args.out, queries, args.pages, args.v6_cars, args.seed)
+    for query, n in counts.items():
+        print(f"  {query!r}: {n} respuestas de MercadoLibre + Kavak")
+    print(f"{FixtureStore(args.out).count()} fixtures en {args.out}")
+
+if __name__ == "__main__":
+    main()
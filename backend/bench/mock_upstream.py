@@ -0,0 +1,142 @@
+"""
+Mock local de los upstreams (MercadoLibre, V6, Kavak, bluelytics).
+
+Sirve las respuestas grabadas en un directorio de fixtures (ver
+upstream_fixtures.py) con latencia configurable e inyección de errores. La
+app se apunta al mock con AUTITOS_UPSTREAM_OVERRIDE=http://127.0.0.1:<port>;
+el host original llega en el header X-Upstream-Host. GET /_mock/stats
+devuelve los requests recibidos por host.
+
+    cd backend && python bench/mock_upstream.py --port 9100 \\
+        --latency 80 --jitter 40 --error-rate 0.02 --host-latency api.mercadolibre.com=120
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import UPSTREAM_HOST_HEADER  # noqa: E402
+from upstream_fixtures import FixtureStore  # noqa: E402
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "upstream")
+
+
+class MockUpstream:
+    def __init__(self, store, latency_ms=50.0, jitter_ms=20.0, host_latency_ms=None,
+                 error_rate=0.0, rate_limit_rate=0.0, timeout_rate=0.0, seed=None):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.host_latency_ms = host_latency_ms or {}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.rng = random.Random(seed)
+        self.served = 0
+        self.missing = 0
+        self.injected = 0
+        self.by_host = {}
+
+    async def handle(self, request):
+        host = request.headers.get(UPSTREAM_HOST_HEADER, "")
+        self.by_host[host] = self.by_host.get(host, 0) + 1
+        base = self.host_latency_ms.get(host, self.latency_ms)
+        await asyncio.sleep(max(0.0, base + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            self.injected += 1
+            await asyncio.sleep(3600)  # el deadline del cliente corta antes
+        roll -= self.timeout_rate
+        if roll < self.error_rate:
+            self.injected += 1
+            return web.Response(status=503, text="mock: error inyectado")
+        roll -= self.error_rate
+        if roll < self.rate_limit_rate:
+            self.injected += 1
+            return web.Response(status=429, headers={"Retry-After": "0"}, text="mock: rate limit inyectado")
+
+        fixture = self.store.load(host, request.path, dict(request.query))
+        if fixture is None:
+            self.missing += 1
+            print(f"[mock] sin fixture: {host}{request.path_qs}")
+            return web.Response(status=404, text="mock: sin fixture")
+        status, content_type, body = fixture
+        self.served += 1
+        return web.Response(status=status, body=body, content_type=(content_type or "application/octet-stream").split(";")[0])
+
+    async def stats(self, request):
+        return web.json_response({
+            "served": self.served, "missing": self.missing, "injected": self.injected, "by_host": self.by_host,
+        })
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("GET", "/_mock/stats", self.stats)
+        app.router.add_route("GET", "/{tail:.*}", self.handle)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Levanta el mock en el loop actual. Devuelve (runner, puerto).
+        """
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+
+def parse_host_latency(values):
+    """
+    ["api.mercadolibre.com=120", ...] -> {"api.mercadolibre.com": 120.0}
+    """
+    result = {}
+    for value in values or []:
+        host, _, ms = value.partition("=")
+        result[host] = float(ms)
+    return result
+
+
+def add_arguments(parser):
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--latency", type=float, default=50.0, help="latencia base en ms")
+    parser.add_argument("--jitter", type=float, default=20.0, help="± ms aleatorios sobre la latencia")
+    parser.add_argument("--host-latency", action="append", metavar="HOST=MS", help="latencia base por host")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fracción de respuestas 429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fracción de requests que no responden")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def from_args(args):
+    return MockUpstream(
+        FixtureStore(args.fixtures),
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        host_latency_ms=parse_host_latency(args.host_latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    mock = from_args(args)
+    print(f"[mock] {mock.store.count()} fixtures en {args.fixtures}, escuchando en :{args.port}")
+    web.run_app(mock.app(), host="127.0.0.1", port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
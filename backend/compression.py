@@ -0,0 +1,163 @@
+"""
+Compresión de respuestas negociada con Accept-Encoding.
+
+Las respuestas de /api/cars son JSON de decenas a cientos de KB y la mayoría
+de los clientes son celulares: los bytes que viajan pesan más que el tiempo
+de servidor. El middleware comprime con zstd, brotli o gzip (en ese orden de
+preferencia a igual q, y sólo los que estén instalados) cuando:
+
+- el cuerpo sale en un solo mensaje (las respuestas streaming, como el
+  NDJSON de /api/cars/stream, pasan tal cual: comprimirlas demoraría cada
+  evento hasta llenar un bloque),
+- el tipo es texto/JSON, no trae Content-Encoding y pesa al menos
+  `min_size` bytes (por debajo, lo que se ahorra no paga los headers).
+
+Los cuerpos grandes se comprimen en un thread para no frenar el event loop.
+Los niveles salen de bench/bench_compression.py: rápidos, para contenido
+dinámico.
+"""
+import asyncio
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+from metrics import REGISTRY, stage
+
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+THREAD_MIN_BYTES = 256 * 1024
+COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/javascript", b"image/svg+xml")
+
+RESPONSE_BYTES = REGISTRY.counter(
+    "autitos_response_bytes_total", "Bytes de las respuestas antes (raw) y después (wire) de comprimir",
+    ("encoding", "size"),
+)
+
+
+def _zstd(body):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _gzip(body):
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Orden de preferencia del servidor
+CODECS = {
+    name: codec for name, codec, available in (
+        ("zstd", _zstd, zstandard is not None),
+        ("br", _brotli, brotli is not None),
+        ("gzip", _gzip, True),
+    ) if available
+}
+
+
+def negotiate(accept_encoding, codecs=CODECS):
+    """
+    Encoding a usar según el Accept-Encoding del cliente, o None.
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip()] = q
+    default = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in codecs:
+        q = weights.get(name, default)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body, encoding):
+    return CODECS[encoding](body)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept) if accept else None
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Se retiene hasta ver el cuerpo: de eso depende el encoding
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            pending, start = start, None
+            body = message.get("body", b"")
+            headers = pending.get("headers", [])
+            if message.get("more_body") or not self._compressible(pending["status"], headers):
+                await send(pending)
+                await send(message)
+                return
+            headers = [(k, v) for k, v in headers if k != b"content-length"]
+            headers.append((b"vary", b"Accept-Encoding"))
+            if encoding is None or len(body) < self.min_size:
+                RESPONSE_BYTES.inc(len(body), encoding="identity", size="raw")
+                RESPONSE_BYTES.inc(len(body), encoding="identity", size="wire")
+                headers.append((b"content-length", str(len(body)).encode()))
+                await send({**pending, "headers": headers})
+                await send(message)
+                return
+            with stage("compress"):
+                if len(body) >= THREAD_MIN_BYTES:
+                    compressed = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    compressed = compress(body, encoding)
+            RESPONSE_BYTES.inc(len(body), encoding=encoding, size="raw")
+            RESPONSE_BYTES.inc(len(compressed), encoding=encoding, size="wire")
+            headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"content-length", str(len(compressed)).encode()))
+            await send({**pending, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible(status, headers):
+        if status < 200 or status in (204, 304):
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(COMPRESSIBLE_TYPES)
@@ -0,0 +1,80 @@
+"""
+Pool de procesos acotado para el trabajo CPU-bound del request (parseo del
+HTML de Kavak).
+
+En un thread el parseo sigue compitiendo por el GIL con el event loop; en
+otro proceso no. Los workers se crean con "spawn" (no heredan el loop, los
+sockets ni los threads del proceso web) y se lanzan al arrancar para que el
+primer request no pague el import. Como mucho `max_pending` trabajos esperan
+a la vez: el resto espera acá, no en la cola del executor.
+
+Con workers=0 todo corre en un thread, como antes.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from logs import get_logger
+
+log = get_logger("cpu_pool")
+
+
+class CpuPool:
+    def __init__(self, workers, max_pending=None, initializer=None, initargs=()):
+        # initializer(*initargs) corre en cada worker al arrancar (p.ej. logging)
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_pending = max_pending or max(1, workers) * 2
+        self._executor = None
+        self._slots = None
+        self.submitted = 0
+        self.fallbacks = 0
+
+    def start(self):
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer, initargs=self.initargs,
+        )
+        # Levanta los workers ya (ProcessPoolExecutor los crea a demanda)
+        for _ in range(self.workers):
+            self._executor.submit(os.getpid)
+
+    async def run(self, fn, *args):
+        """
+        fn(*args) en el pool. `fn` y sus argumentos tienen que poder
+        picklearse (funciones a nivel de módulo, bytes, etc.).
+        """
+        if self._executor is None:
+            return await asyncio.to_thread(fn, *args)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            self.submitted += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            except BrokenProcessPool as e:
+                # Un worker murió (OOM, segfault de un parser nativo): se
+                # rearma el pool y este trabajo sale por un thread
+                log.error("pool de procesos roto, se reinicia: %s", e)
+                self.fallbacks += 1
+                self._restart()
+                return await asyncio.to_thread(fn, *args)
+
+    def _restart(self):
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {"workers": self.workers, "max_pending": self.max_pending,
+                "submitted": self.submitted, "fallbacks": self.fallbacks}
@@ -0,0 +1,163 @@
+"""
+Deduplicación entre fuentes e identidad estable de publicaciones.
+
+El mismo auto suele estar publicado en V6, MercadoLibre y Kavak a la vez.
+Para no compararlo todo contra todo, cada auto entra a un índice de bloques
+por (marca, modelo, año, tramo de km, banda de precio) y sólo se compara con
+los autos de su bloque y de los tramos vecinos de km y precio. Los pares que
+pasan el umbral de similitud se unen (union-find) y cada grupo se colapsa en
+un único registro con las URLs de todas sus fuentes.
+
+Los IDs son hashes del contenido que identifica a la publicación (fuente +
+id en la fuente), así que son los mismos entre requests.
+"""
+import hashlib
+import math
+
+from v6_catalog import tokenize
+
+KM_BUCKET = 10000            # ancho del tramo de km del bloque
+KM_TOLERANCE = 3000          # diferencia de km aceptable (absoluta)
+KM_TOLERANCE_RATIO = 0.05    # ... o relativa, la mayor de las dos
+PRICE_TOLERANCE = 0.07       # diferencia relativa de priceUSD aceptable
+PRICE_BAND = math.log(1.10)  # ancho de banda (log) > tolerancia: alcanza con ±1 banda
+MIN_TITLE_SIMILARITY = 0.5   # Jaccard de tokens del título (sin el año)
+
+BRAND_ALIASES = {"vw": "volkswagen", "chevy": "chevrolet", "mb": "mercedes"}
+# Palabras que no dicen nada del auto y corren la marca/modelo de lugar
+FILLER_TOKENS = {"vendo", "permuto", "impecable", "unico", "dueno", "oportunidad", "liquido", "benz"}
+
+
+def listing_id(car):
+    """
+    ID estable de una publicación: hash de (fuente, id en la fuente), o del
+    contenido si la fuente no da id.
+    """
+    if car.get("sourceId"):
+        identity = f"{car.get('source')}:{car['sourceId']}"
+    else:
+        identity = "|".join(str(car.get(k) or "") for k in ("source", "title", "year", "km", "originalPrice"))
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
+
+
+def title_tokens(title):
+    tokens = []
+    for token in tokenize(title):
+        if token in FILLER_TOKENS or (len(token) == 4 and token.isdigit() and token[:2] in ("19", "20")):
+            continue
+        tokens.append(BRAND_ALIASES.get(token, token))
+    return tokens
+
+
+class _Entry:
+    __slots__ = ("index", "car", "tokens", "km", "price")
+
+    def __init__(self, index, car, tokens):
+        self.index = index
+        self.car = car
+        self.tokens = frozenset(tokens)
+        self.km = car.get("km")
+        self.price = car.get("priceUSD") or 0
+
+
+def _block(tokens, car):
+    """
+    Bloque de un auto, o None si no hay datos suficientes para compararlo.
+    """
+    price = car.get("priceUSD") or 0
+    if len(tokens) < 2 or price <= 0:
+        return None
+    km = car.get("km")
+    km_bucket = -1 if km is None else km // KM_BUCKET
+    return (tokens[0], tokens[1], car.get("year")), km_bucket, int(math.log(price) // PRICE_BAND)
+
+
+def _neighbours(block):
+    model, km_bucket, price_band = block
+    km_buckets = (km_bucket,) if km_bucket < 0 else (km_bucket - 1, km_bucket, km_bucket + 1)
+    for km in km_buckets:
+        for band in (price_band - 1, price_band, price_band + 1):
+            yield model, km, band
+
+
+def is_duplicate(a, b):
+    if a.car.get("source") == b.car.get("source"):
+        return False  # dentro de una fuente sólo se unen publicaciones idénticas
+    if (a.km is None) != (b.km is None):
+        return False
+    if a.km is not None and abs(a.km - b.km) > max(KM_TOLERANCE, KM_TOLERANCE_RATIO * max(a.km, b.km)):
+        return False
+    if abs(a.price - b.price) > PRICE_TOLERANCE * max(a.price, b.price):
+        return False
+    return len(a.tokens & b.tokens) / len(a.tokens | b.tokens) >= MIN_TITLE_SIMILARITY
+
+
+def dedupe_cars(cars):
+    """
+    Asigna car["id"] estable a cada auto y colapsa los duplicados.
+
+    Devuelve (autos, merged): los autos únicos en el orden original (manda el
+    primero de cada grupo, así se respeta el orden de fuentes) y un dict
+    {id descartado: id que lo absorbió}. Los registros colapsados llevan en
+    "urls" la publicación de cada fuente.
+    """
+    n = len(cars)
+    parent = list(range(n))
+    sources = [{car.get("source")} for car in cars]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri == rj or sources[ri] & sources[rj]:
+            return  # nunca dos publicaciones distintas de la misma fuente
+        if rj < ri:
+            ri, rj = rj, ri
+        parent[rj] = ri
+        sources[ri] |= sources[rj]
+
+    by_identity = {}
+    blocks = {}
+    for i, car in enumerate(cars):
+        car["id"] = listing_id(car)
+        first = by_identity.setdefault(car["id"], i)
+        if first != i:
+            # La misma publicación repetida (p. ej. en dos páginas de ML)
+            parent[i] = find(first)
+            continue
+
+        tokens = title_tokens(car.get("title"))
+        block = _block(tokens, car)
+        if block is None:
+            continue
+        entry = _Entry(i, car, tokens)
+        for neighbour in _neighbours(block):
+            for other in blocks.get(neighbour, ()):
+                if is_duplicate(entry, other):
+                    union(other.index, i)
+        blocks.setdefault(block, []).append(entry)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+
+    unique = []
+    merged = {}
+    for root in sorted(groups):
+        members = groups[root]
+        car = cars[root]
+        urls = {}
+        for i in members:
+            other = cars[i]
+            if other["id"] not in urls:
+                urls[other["id"]] = {"source": other.get("source"), "url": other.get("url"), "priceUSD": other.get("priceUSD")}
+                if other is not car:
+                    merged[other["id"]] = car["id"]
+        if len(urls) > 1:
+            car["urls"] = list(urls.values())
+        unique.append(car)
+    return unique, merged
@@ -0,0 +1,93 @@
+"""
+Motor de fetch asíncrono para /api/cars.
+
+Corre todas las fuentes (y la cotización) al mismo tiempo, cada una con su
+propio deadline, dentro de un presupuesto total por request. Devuelve lo que
+haya terminado a tiempo junto con un bloque de estado por fuente.
+"""
+import asyncio
+import time
+
+
+class PartialResult(Exception):
+    """
+    Una fuente respondió sólo en parte (p. ej. una página que falló): el
+    resultado sale igual, con status "partial" y el error en el estado.
+    """
+    def __init__(self, result, error):
+        super().__init__(error)
+        self.result = result
+
+
+async def _run_job(name, factory, deadline):
+    start = time.monotonic()
+    try:
+        result = await asyncio.wait_for(factory(), timeout=deadline)
+        status = {"status": "ok"}
+    except PartialResult as e:
+        result = e.result
+        status = {"status": "partial", "error": str(e)}
+    except asyncio.TimeoutError:
+        result = None
+        status = {"status": "timeout", "error": f"deadline {deadline}s"}
+    except Exception as e:
+        result = None
+        status = {"status": "error", "error": str(e)}
+    status["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+    return name, result, status
+
+
+async def fan_out_iter(jobs, budget):
+    """
+    Ejecuta en paralelo `jobs` = {nombre: (factory, deadline)} y va devolviendo
+    (nombre, resultado, status) a medida que cada uno termina.
+    `factory` es un callable sin argumentos que devuelve una corrutina.
+
+    Las fuentes que no terminan dentro del presupuesto total se cancelan y
+    salen al final con status "timeout".
+    """
+    start = time.monotonic()
+    tasks = {
+        asyncio.create_task(_run_job(name, factory, deadline)): name
+        for name, (factory, deadline) in jobs.items()
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = budget - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in pending:
+            yield tasks[task], None, {
+                "status": "timeout",
+                "error": f"presupuesto total {budget}s agotado",
+                "elapsed_ms": int((time.monotonic() - start) * 1000),
+            }
+    finally:
+        # Si el consumidor corta antes (p.ej. cliente desconectado), no dejar tareas colgadas
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def fan_out(jobs, budget):
+    """
+    Igual que fan_out_iter pero espera a todas las fuentes.
+    Devuelve (results, statuses).
+    """
+    results = {}
+    statuses = {}
+    async for name, result, status in fan_out_iter(jobs, budget):
+        results[name] = result
+        statuses[name] = status
+    return results, statuses
@@ -0,0 +1,31 @@
+"""
+Configuración de gunicorn para correr la app con varios workers uvicorn:
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Cada worker es un proceso con su propio event loop, pool de conexiones y
+pool de parseo. Con más de uno el cache pasa a SQLite (AUTITOS_CACHE_PATH)
+para que los workers compartan búsquedas, cotización y catálogo de V6 y no
+multipliquen los requests a los upstreams.
+
+Procesos Python en total: 1 master + WEB_CONCURRENCY × (1 worker +
+AUTITOS_PARSE_PROCESSES). Con los defaults (2 workers, 1 proceso de parseo
+cada uno) son 5. No se usa cpu_count(): en containers suele reportar los
+cores del host y no los asignados, y la memoria se acaba antes.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or "2")
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Una búsqueda fría puede tardar el presupuesto entero (AUTITOS_REQUEST_BUDGET)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+if workers > 1:
+    # Los workers heredan el entorno del master
+    os.environ.setdefault("AUTITOS_CACHE_BACKEND", "sqlite")
+    # El parseo ya se reparte entre workers: un proceso de parseo por worker
+    os.environ.setdefault("AUTITOS_PARSE_PROCESSES", "1")
@@ -0,0 +1,233 @@
+"""
+Historial persistente de publicaciones y precios observados.
+
+Guarda cada auto devuelto por /api/cars (publicación + precio del día) y
+mantiene un rollup mensual por búsqueda que sirve /api/price-history.
+El esquema es el de prisma/schema.prisma (listings, price_observations,
+price_monthly).
+
+Backends:
+- PostgreSQL si DATABASE_URL es postgres:// o postgresql:// (psycopg 3 con
+  pool de conexiones).
+- SQLite como reemplazo local en cualquier otro caso (útil para desarrollo y
+  para probar sin un Postgres a mano).
+"""
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+CHUNK_ROWS = 500
+
+SQLITE_DDL = """
+CREATE TABLE IF NOT EXISTS listings (
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    year INTEGER,
+    km INTEGER,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (source, listing_id)
+);
+CREATE TABLE IF NOT EXISTS price_observations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    observed_on TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    price_usd INTEGER NOT NULL,
+    currency TEXT NOT NULL,
+    UNIQUE (query_key, source, listing_id, observed_on)
+);
+CREATE INDEX IF NOT EXISTS price_observations_listing_idx
+    ON price_observations (source, listing_id, observed_on);
+CREATE TABLE IF NOT EXISTS price_monthly (
+    query_key TEXT NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum_usd INTEGER NOT NULL,
+    min_usd INTEGER NOT NULL,
+    max_usd INTEGER NOT NULL,
+    PRIMARY KEY (query_key, month)
+);
+"""
+
+POSTGRES_DDL = """
+CREATE TABLE IF NOT EXISTS listings (
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    year INTEGER,
+    km INTEGER,
+    first_seen TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, listing_id)
+);
+CREATE TABLE IF NOT EXISTS price_observations (
+    id BIGSERIAL PRIMARY KEY,
+    query_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    observed_on DATE NOT NULL,
+    price BIGINT NOT NULL,
+    price_usd INTEGER NOT NULL,
+    currency TEXT NOT NULL,
+    FOREIGN KEY (source, listing_id) REFERENCES listings (source, listing_id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS price_observations_query_key_source_listing_id_observed_on_key
+    ON price_observations (query_key, source, listing_id, observed_on);
+CREATE INDEX IF NOT EXISTS price_observations_source_listing_id_observed_on_idx
+    ON price_observations (source, listing_id, observed_on);
+CREATE TABLE IF NOT EXISTS price_monthly (
+    query_key TEXT NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum_usd BIGINT NOT NULL,
+    min_usd INTEGER NOT NULL,
+    max_usd INTEGER NOT NULL,
+    PRIMARY KEY (query_key, month)
+);
+"""
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+class HistoryStore:
+    def __init__(self, database_url=None, sqlite_path=None, pool_size=4):
+        if database_url and database_url.startswith(("postgres://", "postgresql://")):
+            # Dependencia opcional: sólo hace falta con Postgres
+            from psycopg_pool import ConnectionPool
+
+            self.dialect = "postgres"
+            self.ph = "%s"
+            self._pool = ConnectionPool(database_url, min_size=1, max_size=pool_size, open=True)
+            with self._pool.connection() as conn:
+                conn.execute(POSTGRES_DDL)
+        else:
+            self.dialect = "sqlite"
+            self.ph = "?"
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(sqlite_path or ":memory:", check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SQLITE_DDL)
+
+    def _run(self, fn):
+        """
+        Corre fn(cursor) dentro de una transacción del backend activo.
+        """
+        if self.dialect == "postgres":
+            with self._pool.connection() as conn:
+                with conn.cursor() as cur:
+                    return fn(cur)
+        with self._lock:
+            with self._conn:
+                return fn(self._conn.cursor())
+
+    def _values(self, n_rows, n_cols):
+        row = "(" + ", ".join([self.ph] * n_cols) + ")"
+        return ", ".join([row] * n_rows)
+
+    def record(self, query_key, cars, observed_at=None):
+        """
+        Upsert en bloque de publicaciones y observaciones de precio para una
+        búsqueda. Una observación por (búsqueda, publicación, día): repetir la
+        misma búsqueda en el día no duplica datos ni infla el rollup.
+        """
+        observed_at = observed_at or datetime.now(timezone.utc)
+        seen = observed_at.strftime("%Y-%m-%d %H:%M:%S")
+        day = observed_at.strftime("%Y-%m-%d")
+        month = observed_at.strftime("%Y-%m")
+
+        listings = {}
+        for car in cars:
+            if not car.get("sourceId") or not car.get("priceUSD"):
+                continue
+            listings[(car["source"], str(car["sourceId"]))] = car
+        if not listings:
+            return 0
+
+        listing_rows = [
+            (source, listing_id, car["title"], car["url"], car.get("year"), car.get("km"), seen, seen)
+            for (source, listing_id), car in listings.items()
+        ]
+        observation_rows = [
+            (query_key, source, listing_id, day, int(car["price"]), int(car["priceUSD"]), car.get("currency") or "ARS")
+            for (source, listing_id), car in listings.items()
+        ]
+        least, greatest = ("LEAST", "GREATEST") if self.dialect == "postgres" else ("MIN", "MAX")
+
+        def write(cur):
+            for chunk in _chunks(listing_rows):
+                cur.execute(
+                    "INSERT INTO listings (source, listing_id, title, url, year, km, first_seen, last_seen) "
+                    f"VALUES {self._values(len(chunk), 8)} "
+                    "ON CONFLICT (source, listing_id) DO UPDATE SET "
+                    "title = excluded.title, url = excluded.url, "
+                    "year = COALESCE(excluded.year, listings.year), km = COALESCE(excluded.km, listings.km), "
+                    "last_seen = excluded.last_seen",
+                    [v for row in chunk for v in row],
+                )
+
+            inserted = []
+            for chunk in _chunks(observation_rows):
+                cur.execute(
+                    "INSERT INTO price_observations "
+                    "(query_key, source, listing_id, observed_on, price, price_usd, currency) "
+                    f"VALUES {self._values(len(chunk), 7)} "
+                    "ON CONFLICT (query_key, source, listing_id, observed_on) DO NOTHING "
+                    "RETURNING price_usd",
+                    [v for row in chunk for v in row],
+                )
+                inserted.extend(row[0] for row in cur.fetchall())
+
+            # El rollup sólo suma las observaciones realmente nuevas
+            if inserted:
+                cur.execute(
+                    "INSERT INTO price_monthly (query_key, month, count, sum_usd, min_usd, max_usd) "
+                    f"VALUES {self._values(1, 6)} "
+                    "ON CONFLICT (query_key, month) DO UPDATE SET "
+                    "count = price_monthly.count + excluded.count, "
+                    "sum_usd = price_monthly.sum_usd + excluded.sum_usd, "
+                    f"min_usd = {least}(price_monthly.min_usd, excluded.min_usd), "
+                    f"max_usd = {greatest}(price_monthly.max_usd, excluded.max_usd)",
+                    (query_key, month, len(inserted), sum(inserted), min(inserted), max(inserted)),
+                )
+            return len(inserted)
+
+        return self._run(write)
+
+    def monthly(self, query_key, months=12):
+        """
+        Agregados mensuales (los últimos `months`) para una búsqueda.
+        """
+        def read(cur):
+            cur.execute(
+                "SELECT month, count, sum_usd, min_usd, max_usd FROM price_monthly "
+                f"WHERE query_key = {self.ph} ORDER BY month DESC LIMIT {self.ph}",
+                (query_key, months),
+            )
+            return cur.fetchall()
+
+        rows = self._run(read)
+        return [
+            {
+                "month": month,
+                "count": count,
+                "avgUSD": int(sum_usd / count) if count else 0,
+                "minUSD": min_usd,
+                "maxUSD": max_usd,
+            }
+            for month, count, sum_usd, min_usd, max_usd in reversed(rows)
+        ]
+
+    def close(self):
+        if self.dialect == "postgres":
+            self._pool.close()
+        else:
+            self._conn.close()
@@ -0,0 +1,212 @@
+"""
+Cliente HTTP compartido para todos los upstreams (MercadoLibre, V6, Kavak,
+bluelytics).
+
+- Una sola ClientSession con pool de conexiones keep-alive que vive lo que
+  vive la app (se abre en el startup de FastAPI y se cierra en el shutdown).
+- Semáforo de concurrencia por host.
+- Reintentos con backoff exponencial y jitter ante 429/5xx y errores de
+  conexión, respetando Retry-After.
+- Contadores por host: requests, errores, reintentos y latencia (también
+  como histograma en /metrics).
+- Opcional: grabar cada respuesta OK como fixture (record_dir) o mandar
+  todo a un mock local (override) que sirve esos fixtures, para medir sin red.
+"""
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from logs import get_logger
+from metrics import UPSTREAM_SECONDS
+from upstream_fixtures import FixtureStore, split_request
+
+log = get_logger("upstream")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Con override, el host original viaja en este header para que el mock sepa qué servir
+UPSTREAM_HOST_HEADER = "X-Upstream-Host"
+# User-Agent de navegador para los upstreams que sirven HTML o bloquean clientes desconocidos
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+class UpstreamResponse:
+    __slots__ = ("url", "status", "headers", "body")
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "retries", "latency_sum", "latency_max", "in_flight")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.in_flight = 0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "in_flight": self.in_flight,
+            "avg_latency_ms": round(self.latency_sum / self.requests * 1000, 1) if self.requests else None,
+            "max_latency_ms": round(self.latency_max * 1000, 1),
+        }
+
+
+def parse_retry_after(value):
+    """
+    Retry-After puede venir en segundos o como fecha HTTP.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamClient:
+    def __init__(self, host_concurrency=None, default_concurrency=6, max_retries=2,
+                 backoff_base=0.25, backoff_cap=4.0, max_retry_after=10.0,
+                 pool_size=100, keepalive_timeout=60, record_dir=None, override=None):
+        self.host_concurrency = host_concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.recorder = FixtureStore(record_dir) if record_dir else None
+        self.override = override.rstrip("/") if override else None
+        self._session = None
+        self._semaphores = {}
+        self.stats = {}
+
+    def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _semaphore(self, host):
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.host_concurrency.get(host, self.default_concurrency))
+            self._semaphores[host] = sem
+        return sem
+
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter; si el upstream pidió esperar, se respeta como mínimo
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def get(self, url, params=None, headers=None, timeout=10, retries=None, allow_redirects=True):
+        """
+        GET con reintentos. Devuelve un UpstreamResponse con el body ya leído
+        (la conexión vuelve al pool enseguida). Los status no reintentables se
+        devuelven tal cual; errores de red agotados los reintentos se lanzan.
+        Con allow_redirects=False un 3xx se devuelve como cualquier status.
+        """
+        session = self.start()
+        host = urlsplit(url).hostname or ""
+        request_url = url
+        if self.override:
+            # Misma ruta y query, pero contra el mock; las stats siguen por host original
+            parts = urlsplit(url)
+            request_url = self.override + parts.path + (f"?{parts.query}" if parts.query else "")
+            headers = {**(headers or {}), UPSTREAM_HOST_HEADER: host}
+        stats = self.stats.setdefault(host, HostStats())
+        retries = self.max_retries if retries is None else retries
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            retry_after = None
+            error = None
+            response = None
+            async with self._semaphore(host):
+                stats.in_flight += 1
+                try:
+                    async with session.get(
+                        request_url, params=params, headers=headers, timeout=client_timeout,
+                        allow_redirects=allow_redirects,
+                    ) as r:
+                        body = await r.read()
+                        response = UpstreamResponse(str(r.url), r.status, r.headers, body)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                finally:
+                    stats.in_flight -= 1
+                    elapsed = time.monotonic() - start
+                    stats.requests += 1
+                    stats.latency_sum += elapsed
+                    stats.latency_max = max(stats.latency_max, elapsed)
+                    UPSTREAM_SECONDS.observe(elapsed, host=host)
+
+            if response is not None and response.status not in RETRY_STATUSES:
+                if response.status >= 400:
+                    stats.errors += 1
+                elif self.recorder is not None and response.status == 200:
+                    await asyncio.to_thread(self._record, url, params, response)
+                return response
+
+            stats.errors += 1
+            if response is not None:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            # Si el upstream pide esperar más de lo razonable no vale la pena reintentar
+            give_up = attempt >= retries or (retry_after is not None and retry_after > self.max_retry_after)
+            if give_up:
+                if error is not None:
+                    raise error
+                return response
+
+            stats.retries += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def _record(self, url, params, response):
+        host, path, merged = split_request(url, params)
+        try:
+            self.recorder.save(host, path, merged, response.status, response.headers.get("Content-Type", ""), response.body)
+        except OSError as e:
+            log.warning("no se pudo grabar fixture de %s: %s", url, e)
+
+    def host_stats(self):
+        return {host: stats.as_dict() for host, stats in sorted(self.stats.items())}
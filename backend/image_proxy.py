@@ -0,0 +1,236 @@
+"""
+Proxy de las imágenes de las publicaciones (/api/img).
+
+Las imágenes de MercadoLibre, Kavak y V6 (y el placeholder de Wikipedia)
+vienen de varios CDNs y muchas en tamaño completo. El proxy baja cada una una
+sola vez, la achica a uno de los anchos fijos (IMG_WIDTHS) en el pool de
+procesos y la sirve como WebP con ETag fuerte y cache largo.
+
+- Los thumbnails se guardan en disco por el hash de su contenido (que es
+  también el ETag). La referencia (url, ancho) -> hash va al SharedCache, así
+  todos los workers la ven y sólo uno baja cada imagen.
+- El directorio tiene tope de tamaño: al pasarlo se borran los archivos con
+  mtime más viejo (cada hit actualiza el mtime), hasta el 90 % del tope.
+- Sólo se aceptan los CDNs de las fuentes (host exacto o subdominio); las
+  URLs de otros hosts no se reescriben. Las redirecciones no se siguen: un
+  host permitido no puede mandar el fetch a otro lado.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+
+from http_client import BROWSER_USER_AGENT
+from logs import get_logger
+from metrics import REGISTRY
+
+log = get_logger("img")
+
+IMG_WIDTHS = (160, 320, 640)
+IMG_QUALITY = 80
+MAX_SOURCE_BYTES = 8 * 1024 * 1024
+MAX_SOURCE_PIXELS = 40_000_000
+REF_TTL = 30 * 24 * 3600    # la misma URL de un CDN no cambia de contenido
+FAILURE_TTL = 10 * 60       # imagen rota: no se reintenta enseguida
+# MercadoLibre, Kavak, V6 y el placeholder de V6 sin foto; nunca dominios de
+# almacenamiento genéricos (amazonaws.com, cloudinary.com) que sirven a cualquiera
+DEFAULT_HOSTS = ("mlstatic.com", "images.prd.kavak.io", "v6.com.ar", "upload.wikimedia.org")
+IMG_HEADERS = {"User-Agent": BROWSER_USER_AGENT, "Accept": "image/*"}
+
+REQUESTS = REGISTRY.counter(
+    "autitos_img_requests_total", "Requests a /api/img por resultado", ("result",),
+)
+
+
+class ImageError(Exception):
+    pass
+
+
+def make_thumbnail(data, width, quality=IMG_QUALITY):
+    """
+    Bytes de la imagen original -> WebP de como mucho `width` px de ancho.
+    Corre en el pool de procesos.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            if img.width > width:
+                img.thumbnail((width, width * 4), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, "WEBP", quality=quality, method=4)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(f"imagen ilegible: {e}") from e
+    return out.getvalue()
+
+
+def snap_width(width):
+    # El ancho pedido sube al siguiente de la lista: pocos tamaños por imagen
+    for candidate in IMG_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return IMG_WIDTHS[-1]
+
+
+class ThumbnailStore:
+    """
+    Archivos <hash>.webp en `directory` (en subdirectorios por los dos
+    primeros caracteres) con tope de `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None  # aproximado: se recalcula al recorrer el directorio
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + ".webp")
+
+    def touch(self, digest):
+        """
+        True si está en disco (y lo marca como recién usado).
+        """
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.path(digest)
+        if not self.touch(digest):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+            if self._bytes is None:
+                self._scan()
+            else:
+                self._bytes += len(body)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return digest
+
+    def _scan(self):
+        files = []
+        os.makedirs(self.directory, exist_ok=True)
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".webp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        self._bytes = sum(size for _, size, _ in files)
+        return files
+
+    def _evict(self):
+        # Otros workers escriben en el mismo directorio: se mira el estado real
+        files = sorted(self._scan())
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in files:
+            if self._bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._bytes -= size
+            removed += 1
+        log.info("thumbnails: %d archivos borrados, %.1f MB en disco", removed, self._bytes / 1e6)
+
+
+class ImageProxy:
+    def __init__(self, client, shared, pool, directory, max_bytes, hosts=DEFAULT_HOSTS, public_base=""):
+        self.client = client
+        self.shared = shared
+        self.pool = pool
+        self.store = ThumbnailStore(directory, max_bytes)
+        self.hosts = tuple(hosts)
+        self.public_base = public_base.rstrip("/")
+        self._prefix = self.public_base + "/api/img?"
+
+    def allowed(self, url):
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return False
+        host = (parts.hostname or "").lower()
+        return parts.scheme in ("http", "https") and any(
+            host == allowed or host.endswith("." + allowed) for allowed in self.hosts
+        )
+
+    def proxy_url(self, url, width):
+        if not url or url.startswith(self._prefix) or not self.allowed(url):
+            return url
+        return sys.intern(f"{self._prefix}u={quote(url, safe='')}&w={snap_width(width)}")
+
+    def rewrite(self, cars, width):
+        """
+        Cambia `image` de cada auto por la URL del proxy.
+        """
+        for car in cars:
+            car["image"] = self.proxy_url(car["image"], width)
+        return cars
+
+    async def get(self, url, width):
+        """
+        (ruta del thumbnail, ETag). ImageError si el host no está permitido
+        o la imagen no se pudo bajar o leer.
+        """
+        if not self.allowed(url):
+            REQUESTS.inc(result="forbidden")
+            raise ImageError("host no permitido")
+        width = snap_width(width)
+        key = "img:" + hashlib.sha1(f"{width}|{url}".encode()).hexdigest()
+
+        for _ in range(2):
+            digest, _, _, status = await self.shared.get_or_fetch(
+                key, lambda: self._fetch(url, width), self._ref_ttl,
+                lock_ttl=30, encode=str.encode, decode=bytes.decode,
+            )
+            if not digest:
+                REQUESTS.inc(result="error")
+                raise ImageError("imagen no disponible")
+            if await asyncio.to_thread(self.store.touch, digest):
+                REQUESTS.inc(result="hit" if status != "MISS" else "miss")
+                return self.store.path(digest), digest
+            # El archivo se borró por el tope de disco: se baja de nuevo
+            await self.shared.delete(key)
+        raise ImageError("thumbnail no disponible")
+
+    @staticmethod
+    def _ref_ttl(digest):
+        return REF_TTL if digest else FAILURE_TTL
+
+    async def _fetch(self, url, width):
+        """
+        Baja, achica y guarda. Devuelve el hash o "" si la imagen está rota.
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(url, headers=IMG_HEADERS, timeout=10, retries=1, allow_redirects=False)
+            if response.status != 200:
+                raise ImageError(f"status {response.status}")
+            if len(response.body) > MAX_SOURCE_BYTES:
+                raise ImageError(f"imagen de {len(response.body)} bytes")
+            body = await self.pool.run(make_thumbnail, response.body, width)
+        except (ImageError, aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            log.warning("img %s: %s", url, e)
+            return ""
+        digest = await asyncio.to_thread(self.store.put, body)
+        log.debug("img %s @%d: %d -> %d bytes en %.0f ms", url, width, len(response.body), len(body),
+                  (time.perf_counter() - start) * 1000)
+        return digest
@@ -0,0 +1,196 @@
+"""
+Parser del listado de Kavak con backends intercambiables.
+
+- "selectolax" (el más rápido) y "lxml" usan selectores CSS / XPath
+  precompilados y parsean directo desde los bytes de la respuesta.
+- "bs4" es el parser original con BeautifulSoup, como fallback cuando no
+  están instaladas las dependencias rápidas.
+
+El backend se elige con AUTITOS_KAVAK_PARSER; por defecto el primero
+disponible en ese orden. Todos devuelven exactamente los mismos autos.
+"""
+import logging
+import os
+import re
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # dependencia opcional
+    HTMLParser = None
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # dependencia opcional
+    etree = lxml_html = None
+
+from bs4 import BeautifulSoup
+
+from listing import Listing
+from logs import get_logger, sampled
+
+log = get_logger("kavak")
+
+CARD_CLASS = "card-product_cardProduct__"
+TITLE_CLASS = "card-product_cardProduct__title"
+PRICE_CLASS = "amount_uki-amount__large__price"
+SUBTITLE_CLASS = "card-product_cardProduct__subtitle"
+
+YEAR_RE = re.compile(r"(20\d{2}|19\d{2})")
+KM_RE = re.compile(r"(\d{1,3}(?:\.\d{3})*)\s*km")
+TESTID_RE = re.compile(r"card-product-(\d+)")
+
+# selectolax: selectores CSS (se compilan una vez por selector en lexbor)
+CSS_CARD = f'a[class*="{CARD_CLASS}"]'
+CSS_TITLE = f'h3[class*="{TITLE_CLASS}"]'
+CSS_PRICE = f'span[class*="{PRICE_CLASS}"]'
+CSS_SUBTITLE = f'p[class*="{SUBTITLE_CLASS}"]'
+
+# lxml: XPath precompilado
+if etree is not None:
+    XP_CARD = etree.XPath(f'//a[contains(@class, "{CARD_CLASS}")]')
+    XP_TITLE = etree.XPath(f'.//h3[contains(@class, "{TITLE_CLASS}")]')
+    XP_PRICE = etree.XPath(f'.//span[contains(@class, "{PRICE_CLASS}")]')
+    XP_SUBTITLE = etree.XPath(f'.//p[contains(@class, "{SUBTITLE_CLASS}")]')
+    XP_IMG = etree.XPath('.//img')
+
+# bs4: los mismos matchers de clase que usaba get_cars, compilados una vez
+RE_CARD = re.compile(CARD_CLASS)
+RE_TITLE = re.compile(TITLE_CLASS)
+RE_PRICE = re.compile(PRICE_CLASS)
+RE_SUBTITLE = re.compile(SUBTITLE_CLASS)
+
+
+def build_car(title, price_text, subtitle_text, image, url_base, testid):
+    """
+    Arma el auto a partir de los textos ya extraídos de una card.
+    Devuelve None si la card no es válida o no tiene precio.
+    """
+    if title is None:
+        return None  # no es una card válida
+    title = title.strip()
+    # Precio
+    price = int(price_text.strip().replace(".", "").replace("$", "")) if price_text is not None else 0
+    if price == 0:
+        return None
+    # Año y KM
+    year, km = None, None
+    if subtitle_text is not None:
+        year_match = YEAR_RE.search(subtitle_text)
+        km_match = KM_RE.search(subtitle_text.lower())
+        if year_match:
+            year = int(year_match.group())
+        if km_match:
+            km = int(km_match.group(1).replace(".", ""))
+    # URL + ID
+    match = TESTID_RE.search(testid or "")
+    car_id = match.group(1) if match else None
+    url = f"{url_base}?id={car_id}" if car_id else url_base
+    return Listing(
+        title=title,
+        originalPrice=price,
+        currency="ARS",
+        year=year,
+        km=km,
+        location="Buenos Aires",
+        image=image or "",
+        url=url,
+        source="kavak",
+        sourceId=car_id or url_base,
+    )
+
+
+def _collect(cards, extract):
+    log.debug("%d cards encontradas", len(cards))
+    kavak_cars = []
+    for card in cards:
+        try:
+            car = build_car(*extract(card))
+            if car:
+                kavak_cars.append(car)
+        except Exception as e:
+            sampled(log, logging.WARNING, "kavak.card", "error procesando card: %s", e)
+    return kavak_cars
+
+
+def parse_selectolax(body):
+    tree = HTMLParser(body)
+
+    def extract(card):
+        title = card.css_first(CSS_TITLE)
+        price = card.css_first(CSS_PRICE)
+        subtitle = card.css_first(CSS_SUBTITLE)
+        img = card.css_first("img")
+        return (
+            title.text() if title is not None else None,
+            price.text() if price is not None else None,
+            subtitle.text() if subtitle is not None else None,
+            img.attributes.get("src") if img is not None else None,
+            card.attributes["href"],
+            card.attributes.get("data-testid"),
+        )
+
+    return _collect(tree.css(CSS_CARD), extract)
+
+
+def parse_lxml(body):
+    root = lxml_html.fromstring(body)
+
+    def first(xpath, card):
+        found = xpath(card)
+        return found[0] if found else None
+
+    def extract(card):
+        title = first(XP_TITLE, card)
+        price = first(XP_PRICE, card)
+        subtitle = first(XP_SUBTITLE, card)
+        img = first(XP_IMG, card)
+        return (
+            title.text_content() if title is not None else None,
+            price.text_content() if price is not None else None,
+            subtitle.text_content() if subtitle is not None else None,
+            img.get("src") if img is not None else None,
+            card.attrib["href"],
+            card.get("data-testid"),
+        )
+
+    return _collect(XP_CARD(root), extract)
+
+
+def parse_bs4(body):
+    soup = BeautifulSoup(body, "html.parser")
+
+    def extract(card):
+        title = card.find("h3", class_=RE_TITLE)
+        price = card.find("span", class_=RE_PRICE)
+        subtitle = card.find("p", class_=RE_SUBTITLE)
+        img = card.find("img")
+        return (
+            title.text if title else None,
+            price.text if price else None,
+            subtitle.text if subtitle else None,
+            img["src"] if img and "src" in img.attrs else None,
+            card["href"],
+            card.get("data-testid", ""),
+        )
+
+    return _collect(soup.find_all("a", class_=RE_CARD), extract)
+
+
+BACKENDS = {}
+if HTMLParser is not None:
+    BACKENDS["selectolax"] = parse_selectolax
+if lxml_html is not None:
+    BACKENDS["lxml"] = parse_lxml
+BACKENDS["bs4"] = parse_bs4
+
+DEFAULT_BACKEND = os.getenv("AUTITOS_KAVAK_PARSER") or next(iter(BACKENDS))
+
+
+def parse_kavak_html(body, backend=None):
+    """
+    Parsea el listado de Kavak (bytes o str). Es CPU puro: llamarlo fuera del
+    event loop.
+    """
+    parse = BACKENDS.get(backend or DEFAULT_BACKEND, parse_bs4)
+    return parse(body)
@@ -0,0 +1,86 @@
+"""
+Tipo interno de una publicación, común a todas las fuentes.
+
+Listing es un dataclass con __slots__: sin __dict__ por instancia, así un
+resultado cacheado de miles de autos ocupa bastante menos que la lista de
+dicts equivalente. Los strings que se repiten entre publicaciones (moneda,
+fuente, ubicación, imagen de "sin foto") se internan para que todas las
+instancias compartan el mismo objeto.
+
+orjson serializa los dataclasses de forma nativa, sin pasar por
+jsonable_encoder. Para el resto del código se comporta como el dict de
+antes (get, [], in), así scoring, dedup e historial no cambian.
+"""
+import copy
+import sys
+from dataclasses import dataclass, fields
+
+
+@dataclass(slots=True)
+class Listing:
+    title: str
+    originalPrice: int
+    currency: str
+    year: int | None
+    km: int | None
+    location: str
+    image: str
+    url: str
+    source: str
+    sourceId: str
+    priceScore: str = "regular"
+    publishDate: str = "desconocido"
+    price: int = 0
+    priceUSD: int = 0
+    id: str | None = None
+    pricePercentile: float | None = None
+    priceZScore: float | None = None
+    urls: list | None = None
+
+    def __post_init__(self):
+        self.currency = sys.intern(self.currency)
+        self.source = sys.intern(self.source)
+        self.location = sys.intern(self.location)
+        self.image = sys.intern(self.image)
+        self.priceScore = sys.intern(self.priceScore)
+        self.publishDate = sys.intern(self.publishDate)
+
+    # --- compatibilidad con el dict de antes --------------------------------
+
+    def get(self, key, default=None):
+        if key in FIELD_NAMES:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key not in FIELD_NAMES:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELD_NAMES:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        # Un campo opcional en None cuenta como ausente (p. ej. "urls")
+        return key in FIELD_NAMES and getattr(self, key) is not None
+
+    def copy(self):
+        return copy.copy(self)
+
+    def __reduce__(self):
+        # pickle / copy pasan por __init__: al volver del pool de parseo (otro
+        # proceso) los strings se internan de nuevo en este
+        return (Listing, tuple(getattr(self, name) for name in FIELD_ORDER))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rearma un Listing desde su JSON (p. ej. el cache en disco).
+        """
+        return cls(**{key: value for key, value in data.items() if key in FIELD_NAMES})
+
+
+FIELD_ORDER = tuple(f.name for f in fields(Listing))
+FIELD_NAMES = frozenset(FIELD_ORDER)
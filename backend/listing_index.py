@@ -0,0 +1,239 @@
+"""
+Índice local de todas las publicaciones que devolvió /api/cars.
+
+Cada búsqueda en vivo alimenta una tabla SQLite (un archivo que comparten
+los workers) con el auto completo, columnas numéricas para año, km y
+precio USD, y un índice FTS5 con tokenizer trigram sobre el título
+normalizado. Sirve para responder sin ir a los upstreams:
+
+- mode=index en /api/cars: la búsqueda sale sólo del índice, con un
+  presupuesto de tiempo estricto (la consulta se corta si lo pasa).
+- fallback: cuando una fuente falla o se corta por deadline, sus autos
+  salen del índice.
+
+Tolerancia a errores de tipeo: los candidatos son los títulos con algún
+trigrama (con los bordes de palabra, " go", "lf ") de cada palabra de la
+query, y después cada palabra tiene que coincidir con alguna del título:
+igual, como prefijo o a distancia de edición 1 (2 en palabras largas).
+Así "golf trend" encuentra "gol trend" pero un "Ranger Trend" no sale para
+"gol trend". Números y palabras cortas ("208", "c3") van exactas.
+"""
+import sqlite3
+import threading
+import time
+
+import orjson
+
+from listing import Listing
+from logs import get_logger
+from v6_catalog import tokenize
+
+log = get_logger("index")
+
+PURGE_EVERY = 50     # ingestas entre limpiezas de publicaciones viejas
+PROGRESS_STEPS = 1000  # instrucciones de SQLite entre chequeos del presupuesto
+SCORE_CHECK_EVERY = 200  # candidatos puntuados en Python entre chequeos del presupuesto
+
+DDL = """
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    year INTEGER,
+    km INTEGER,
+    price_usd INTEGER,
+    data BLOB NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS listings_seen_idx ON listings (seen_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+    title, content='listings', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS listings_ai AFTER INSERT ON listings BEGIN
+    INSERT INTO listings_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS listings_ad AFTER DELETE ON listings BEGIN
+    INSERT INTO listings_fts (listings_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS listings_au AFTER UPDATE OF title ON listings BEGIN
+    INSERT INTO listings_fts (listings_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO listings_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+"""
+
+UPSERT = """
+INSERT INTO listings (id, source, title, year, km, price_usd, data, seen_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    source = excluded.source, title = excluded.title, year = excluded.year, km = excluded.km,
+    price_usd = excluded.price_usd, data = excluded.data, seen_at = excluded.seen_at
+"""
+
+
+class IndexTimeout(Exception):
+    pass
+
+
+def index_title(text):
+    # Con espacios en los bordes, así el trigrama " go" marca inicio de palabra
+    return " " + " ".join(tokenize(text)) + " "
+
+
+def word_match(word):
+    """
+    Expresión FTS5 de los candidatos para una palabra de la query.
+    """
+    if len(word) < 4 or word.isdigit():
+        # Sin tolerancia a errores (ver word_score): comienzo de palabra exacto
+        return f'" {word}"'
+    padded = f" {word} "
+    grams = sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+    return "(" + " OR ".join(f'"{g}"' for g in grams) + ")"
+
+
+def within_distance(a, b, limit):
+    """
+    True si la distancia de edición entre a y b es <= limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def word_score(word, title_words):
+    """
+    Qué tan bien coincide una palabra de la query con el título (0 = no).
+    """
+    best = 0.0
+    limit = 0 if word.isdigit() else 2 if len(word) >= 8 else 1 if len(word) >= 4 else 0
+    for candidate in title_words:
+        if candidate == word:
+            return 1.0
+        if len(word) >= 3 and candidate.startswith(word):
+            best = max(best, 0.9)
+        elif limit and within_distance(word, candidate, limit):
+            best = max(best, 0.8)
+    return best
+
+
+class ListingIndex:
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age  # segundos sin ver una publicación antes de borrarla
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(DDL)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, cars, now=None):
+        """
+        Inserta o actualiza los autos de una búsqueda en vivo.
+        """
+        now = now or time.time()
+        rows = [
+            (car["id"], car["source"], index_title(car["title"]), car.get("year"), car.get("km"),
+             car.get("priceUSD") or None, orjson.dumps(car), now)
+            for car in cars if car.get("id")
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(UPSERT, rows)
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                cursor = conn.execute("DELETE FROM listings WHERE seen_at < ?", (now - self.max_age,))
+                if cursor.rowcount:
+                    log.info("índice: %d publicaciones viejas borradas", cursor.rowcount)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def search(self, query, sources=None, year_min=None, year_max=None, km_min=None, km_max=None,
+               price_min=None, price_max=None, limit=500, budget=None):
+        """
+        Autos del índice que coinciden con `query` (tolerando errores de
+        tipeo) y los rangos dados, de mejor a peor coincidencia y, a igual
+        coincidencia, los vistos más recientemente primero. Con `budget`
+        (segundos) lanza IndexTimeout si las consultas tardan más.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        # Algún trigrama de cada palabra; el filtro fino va después, por palabra
+        match = " AND ".join(word_match(word) for word in words)
+        where, params = ["listings_fts MATCH ?"], [match]
+        for column, op, value in (
+            ("year", ">=", year_min), ("year", "<=", year_max), ("km", ">=", km_min),
+            ("km", "<=", km_max), ("price_usd", ">=", price_min), ("price_usd", "<=", price_max),
+        ):
+            if value is not None:
+                where.append(f"l.{column} {op} ?")
+                params.append(value)
+        if sources:
+            where.append(f"l.source IN ({','.join('?' * len(sources))})")
+            params.extend(sorted(sources))
+
+        conn = self._conn()
+        deadline = None
+        if budget is not None:
+            deadline = time.perf_counter() + budget
+            conn.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_STEPS)
+        try:
+            rows = conn.execute(
+                "SELECT l.rowid, l.title, l.seen_at FROM listings_fts JOIN listings l ON l.rowid = listings_fts.rowid "
+                f"WHERE {' AND '.join(where)}", params,
+            ).fetchall()
+            scored = {}  # título -> coincidencia; los títulos se repiten mucho
+            matches = []
+            for i, (rowid, title, seen_at) in enumerate(rows):
+                # El filtro fino también entra en el presupuesto, no sólo SQLite
+                if deadline is not None and i % SCORE_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    raise IndexTimeout(f"índice: más de {budget * 1000:.0f} ms ({len(rows)} candidatos)")
+                score = scored.get(title)
+                if score is None:
+                    title_words = title.split()
+                    scores = [word_score(word, title_words) for word in words]
+                    score = scored[title] = sum(scores) / len(scores) if min(scores) > 0 else 0.0
+                if score:
+                    matches.append((-score, -seen_at, rowid))
+            matches.sort()
+            rowids = [rowid for _, _, rowid in matches[:limit]]
+            data = dict(conn.execute(
+                f"SELECT rowid, data FROM listings WHERE rowid IN ({','.join('?' * len(rowids))})", rowids,
+            ).fetchall()) if rowids else {}
+        except sqlite3.OperationalError as e:
+            if budget is not None and "interrupt" in str(e):
+                raise IndexTimeout(f"índice: más de {budget * 1000:.0f} ms") from e
+            raise
+        finally:
+            if budget is not None:
+                conn.set_progress_handler(None, 0)
+        return [Listing.from_dict(orjson.loads(data[rowid])) for rowid in rowids if rowid in data]
+
+    def stats(self):
+        count, oldest = self._conn().execute("SELECT count(*), min(seen_at) FROM listings").fetchone()
+        return {"listings": count, "oldest_age_seconds": round(time.time() - oldest) if oldest else None}
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
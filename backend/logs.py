@@ -0,0 +1,42 @@
+"""
+Logging del backend: loggers "autitos.<módulo>" con nivel configurable y
+muestreo para los mensajes que se repiten por publicación.
+
+En el hot path (un error de parseo por auto, por ejemplo) un log por
+ocurrencia cuesta tiempo y tapa todo lo demás: sampled() registra la primera
+ocurrencia de cada clave y después una de cada `every`, con el total visto.
+"""
+import logging
+import threading
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+DEFAULT_SAMPLE_EVERY = 100
+
+_sample_every = DEFAULT_SAMPLE_EVERY
+_sample_counts = {}
+_sample_lock = threading.Lock()  # los parsers corren en threads
+
+
+def setup_logging(level="INFO", sample_every=DEFAULT_SAMPLE_EVERY):
+    global _sample_every
+    _sample_every = max(1, sample_every)
+    logging.basicConfig(format=LOG_FORMAT)
+    logging.getLogger("autitos").setLevel(level.upper())
+
+
+def get_logger(name):
+    return logging.getLogger(f"autitos.{name}")
+
+
+def sampled(logger, level, key, msg, *args):
+    """
+    Loguea `msg` la primera vez que aparece `key` y después cada
+    `sample_every` ocurrencias.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    with _sample_lock:
+        count = _sample_counts.get(key, 0) + 1
+        _sample_counts[key] = count
+    if count == 1 or count % _sample_every == 0:
+        logger.log(level, msg + " (%d veces)", *args, count)
@@ -1,18 +1,169 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import requests
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
+import os
+import sqlite3
 from bs4 import BeautifulSoup
 import re
-from collections import defaultdict
 from datetime import datetime, timedelta
-import math
+import time
+
+from fetch_engine import fan_out, fan_out_iter
+from rate_cache import RateCache
+from http_client import UpstreamClient
+from http_client import BROWSER_USER_AGENT
+from v6_catalog import V6Catalog
+from listing import Listing
+from sources import CircuitBreaker, KavakSource, MercadoLibreSource, SourceRegistry, V6Source
+from search_cache import SearchCache, make_key, normalize_query
+from responses import JSONResponse, dumps as json_dumps, make_etag, not_modified
+from result_view import DEFAULT_LIMIT, InvalidCursor, ResultView, Selection, ViewCache, compare
+from scoring import score_cars
+from dedup import dedupe_cars, listing_id
+from history_store import HistoryStore
+from prewarm import HotQueries, Prewarmer, parse_static_queries
+from logs import get_logger, setup_logging
+from metrics import REGISTRY, TimingMiddleware, stage
+from admission import Admission, Overloaded
+from compression import CompressionMiddleware
+from cpu_pool import CpuPool
+from shared_cache import build_shared_cache
+from ml_delta import KnownListingsStore
+from image_proxy import DEFAULT_HOSTS, ImageError, ImageProxy
+from listing_index import IndexTimeout, ListingIndex
+from market_stats import MarketStats
 
 app = FastAPI()
 
-ML_SITE = "MLA"             # Argentina
-ML_CARS_CATEGORY = "MLA1744"  # Autos y Camionetas
-ML_PAGE_LIMIT = 50            # máx 50 por página en search API
+# Páginas por búsqueda: cada una es un request más a cada fuente y otra clave de cache
+MAX_PAGES = int(os.getenv("AUTITOS_MAX_PAGES", "10"))
+
+ML_PAGE_CONCURRENCY = int(os.getenv("AUTITOS_ML_PAGE_CONCURRENCY", "4"))
+ML_ITEMS_CONCURRENCY = int(os.getenv("AUTITOS_ML_ITEMS_CONCURRENCY", "6"))
+# Refresco incremental de MercadoLibre: pasada completa cada N refrescos (1 = siempre)
+ML_DELTA_ENABLED = os.getenv("AUTITOS_ML_DELTA", "1") == "1"
+ML_FULL_EVERY = int(os.getenv("AUTITOS_ML_FULL_EVERY", "6"))
+
+# Logging: nivel de los loggers "autitos.*" y muestreo de errores repetidos por auto
+LOG_LEVEL = os.getenv("AUTITOS_LOG_LEVEL", "INFO")
+LOG_SAMPLE_EVERY = int(os.getenv("AUTITOS_LOG_SAMPLE_EVERY", "100"))
+
+DEFAULT_DOLLAR_RATE = 1285.0
+DOLLAR_RATE_TTL = float(os.getenv("AUTITOS_RATE_TTL", "900"))  # segundos
+
+# Cliente HTTP compartido: concurrencia por host y reintentos
+UPSTREAM_HOST_CONCURRENCY = int(os.getenv("AUTITOS_HOST_CONCURRENCY", "6"))
+ML_HOST_CONCURRENCY = int(os.getenv("AUTITOS_ML_HOST_CONCURRENCY", "10"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("AUTITOS_UPSTREAM_RETRIES", "2"))
+# Grabar respuestas como fixtures / apuntar todo a un mock (ver bench/mock_upstream.py)
+UPSTREAM_RECORD_DIR = os.getenv("AUTITOS_RECORD_DIR") or None
+UPSTREAM_OVERRIDE = os.getenv("AUTITOS_UPSTREAM_OVERRIDE") or None
+
+# Deadlines (segundos) por fuente y presupuesto total de /api/cars
+SOURCE_DEADLINES = {
+    "dollar_rate": float(os.getenv("AUTITOS_DEADLINE_RATE", "4")),
+    "v6": float(os.getenv("AUTITOS_DEADLINE_V6", "8")),
+    "mercadolibre": float(os.getenv("AUTITOS_DEADLINE_ML", "10")),
+    "kavak": float(os.getenv("AUTITOS_DEADLINE_KAVAK", "8")),
+}
+REQUEST_BUDGET = float(os.getenv("AUTITOS_REQUEST_BUDGET", "12"))
+
+# Búsquedas yendo a los upstreams antes de responder 503 (0 = sin límite; los
+# hits del cache no cuentan) y procesos para parsear HTML fuera del event loop
+# (0 = en un thread)
+MAX_INFLIGHT_SEARCHES = int(os.getenv("AUTITOS_MAX_INFLIGHT", "64"))
+PARSE_PROCESSES = int(os.getenv("AUTITOS_PARSE_PROCESSES", "2"))
+
+# Compresión de respuestas (zstd/br/gzip según el cliente) desde este tamaño en bytes
+COMPRESS_ENABLED = os.getenv("AUTITOS_COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("AUTITOS_COMPRESS_MIN_BYTES", "1024"))
+
+# /api/cars/batch: búsquedas por pedido y cuántas van a los upstreams a la vez
+BATCH_MAX_QUERIES = int(os.getenv("AUTITOS_BATCH_MAX_QUERIES", "10"))
+BATCH_CONCURRENCY = int(os.getenv("AUTITOS_BATCH_CONCURRENCY", "3"))
+
+# Circuit breaker por fuente: fallas seguidas para abrir y cool-down inicial (segundos)
+BREAKER_FAILURES = int(os.getenv("AUTITOS_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("AUTITOS_BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = float(os.getenv("AUTITOS_BREAKER_MAX_COOLDOWN", "300"))
+
+# Snapshot local del catálogo de V6
+V6_SNAPSHOT_PATH = os.getenv("AUTITOS_V6_SNAPSHOT", os.path.join(os.path.dirname(__file__), ".cache", "v6_snapshot.json"))
+V6_REFRESH_INTERVAL = float(os.getenv("AUTITOS_V6_REFRESH", "600"))  # segundos
+
+# Cache de búsquedas: TTL (segundos) por fuente y tope de memoria por proceso
+SEARCH_TTLS = {
+    "mercadolibre": float(os.getenv("AUTITOS_TTL_ML", "300")),
+    "kavak": float(os.getenv("AUTITOS_TTL_KAVAK", "900")),
+    "v6": float(os.getenv("AUTITOS_TTL_V6", "900")),
+}
+SEARCH_TTL_ON_ERROR = float(os.getenv("AUTITOS_TTL_ON_ERROR", "30"))
+SEARCH_CACHE_MAX_BYTES = int(float(os.getenv("AUTITOS_SEARCH_CACHE_MB", "64")) * 1024 * 1024)
+SEARCH_CACHE_DIR = os.getenv("AUTITOS_SEARCH_CACHE_DIR") or None  # legado: implica sqlite
+
+# Cache compartido entre workers y worker.py (búsquedas, cotización, V6):
+# "memory" (un solo proceso) o "sqlite" (archivo en modo WAL)
+CACHE_BACKEND = os.getenv("AUTITOS_CACHE_BACKEND") or ("sqlite" if SEARCH_CACHE_DIR else "memory")
+CACHE_PATH = os.getenv("AUTITOS_CACHE_PATH") or os.path.join(
+    SEARCH_CACHE_DIR or os.path.join(os.path.dirname(__file__), ".cache"), "shared_cache.db"
+)
+
+# Proxy de imágenes: las publicaciones apuntan a /api/img (con AUTITOS_PUBLIC_URL
+# delante si se quiere una URL absoluta), que sirve thumbnails WebP cacheados en disco
+IMG_PROXY_ENABLED = os.getenv("AUTITOS_IMG_PROXY", "1") == "1"
+IMG_LISTING_WIDTH = int(os.getenv("AUTITOS_IMG_WIDTH", "320"))
+IMG_CACHE_DIR = os.getenv("AUTITOS_IMG_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".cache", "img"))
+IMG_CACHE_MAX_BYTES = int(float(os.getenv("AUTITOS_IMG_CACHE_MB", "256")) * 1024 * 1024)
+IMG_HOSTS = [h.strip() for h in os.getenv("AUTITOS_IMG_HOSTS", ",".join(DEFAULT_HOSTS)).split(",") if h.strip()]
+IMG_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PUBLIC_URL = os.getenv("AUTITOS_PUBLIC_URL", "")
+
+# Índice local de las publicaciones vistas: /api/cars?mode=index responde sólo
+# desde ahí, y con fallback las fuentes que fallan se completan desde el índice
+INDEX_ENABLED = os.getenv("AUTITOS_INDEX", "1") == "1"
+INDEX_PATH = os.getenv("AUTITOS_INDEX_PATH", os.path.join(os.path.dirname(__file__), ".cache", "listings_index.db"))
+INDEX_MAX_AGE = float(os.getenv("AUTITOS_INDEX_MAX_AGE_DAYS", "14")) * 24 * 3600
+INDEX_BUDGET = float(os.getenv("AUTITOS_INDEX_BUDGET_MS", "50")) / 1000
+INDEX_FALLBACK = os.getenv("AUTITOS_INDEX_FALLBACK", "1") == "1"
+INDEX_MAX_RESULTS = 500
+
+# Estadísticas de mercado por modelo/segmento (t-digest en el cache compartido):
+# con MARKET_MIN_COUNT publicaciones vistas el priceScore se calcula contra ellas
+MARKET_ENABLED = os.getenv("AUTITOS_MARKET", "1") == "1"
+MARKET_MIN_COUNT = int(os.getenv("AUTITOS_MARKET_MIN_COUNT", "30"))
+MARKET_REFRESH = float(os.getenv("AUTITOS_MARKET_REFRESH", "60"))  # segundos
+MARKET_FLUSH = float(os.getenv("AUTITOS_MARKET_FLUSH", "30"))      # segundos
+
+# Historial de precios: Postgres si DATABASE_URL apunta a uno, si no SQLite local
+HISTORY_ENABLED = os.getenv("AUTITOS_HISTORY", "1") == "1"
+HISTORY_SQLITE_PATH = os.getenv("AUTITOS_HISTORY_SQLITE", os.path.join(os.path.dirname(__file__), ".cache", "history.db"))
+DB_POOL_SIZE = int(os.getenv("AUTITOS_DB_POOL_SIZE", "4"))
+
+# Pre-calentado de búsquedas populares (en la app o con `python worker.py`)
+PREWARM_IN_APP = os.getenv("AUTITOS_PREWARM", "0") == "1"
+PREWARM_QUERIES = os.getenv("AUTITOS_PREWARM_QUERIES", "")
+PREWARM_TOP_N = int(os.getenv("AUTITOS_PREWARM_TOP", "20"))
+PREWARM_INTERVAL = float(os.getenv("AUTITOS_PREWARM_INTERVAL", "240"))
+PREWARM_PACE = float(os.getenv("AUTITOS_PREWARM_PACE", "5"))
+HOT_QUERIES_PATH = os.getenv("AUTITOS_HOT_QUERIES_FILE", os.path.join(os.path.dirname(__file__), ".cache", "hot_queries.json"))
+
+setup_logging(LOG_LEVEL, LOG_SAMPLE_EVERY)
+log = get_logger("api")
+
+# Admisión: más de MAX_INFLIGHT_SEARCHES búsquedas contra los upstreams -> 503 inmediato
+admission = Admission(MAX_INFLIGHT_SEARCHES)
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+# Compresión negociada; queda dentro del timing, así "compress" sale en Server-Timing
+if COMPRESS_ENABLED:
+    app.add_middleware(CompressionMiddleware, min_size=COMPRESS_MIN_BYTES)
+# Tiempos por etapa en Server-Timing e histogramas de /metrics
+app.add_middleware(TimingMiddleware)
 
 # Habilitar CORS para frontend en localhost
 app.add_middleware(
@@ -26,27 +177,287 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class Car(BaseModel):
-    title: str
-    price: int
-    priceUSD: int
-    year: int | None = None
-    km: int | None = None
-    location: str | None = None
-    image: str
-    url: str
-    priceScore: str
-    publishDate: str | None = None
-
-def get_dollar_rate():
+upstream = UpstreamClient(
+    host_concurrency={"api.mercadolibre.com": ML_HOST_CONCURRENCY},
+    default_concurrency=UPSTREAM_HOST_CONCURRENCY,
+    max_retries=UPSTREAM_MAX_RETRIES,
+    record_dir=UPSTREAM_RECORD_DIR,
+    override=UPSTREAM_OVERRIDE,
+)
+
+async def fetch_dollar_rate():
+    response = await upstream.get("https://api.bluelytics.com.ar/v2/latest", timeout=10)
+    if response.status != 200:
+        raise RuntimeError(f"bluelytics status {response.status}")
+    return response.json()["blue"]["value_avg"]
+
+shared_cache = build_shared_cache(CACHE_BACKEND, CACHE_PATH)
+rate_cache = RateCache(fetch_dollar_rate, ttl=DOLLAR_RATE_TTL, default=DEFAULT_DOLLAR_RATE, shared=shared_cache)
+v6_catalog = V6Catalog(upstream, V6_SNAPSHOT_PATH, V6_REFRESH_INTERVAL, shared=shared_cache)
+
+def new_breaker():
+    return CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN, BREAKER_MAX_COOLDOWN)
+
+# Fuentes habilitables por nombre; el orden de registro es el de la respuesta
+source_registry = SourceRegistry()
+source_registry.register(V6Source(v6_catalog, SOURCE_DEADLINES["v6"], SEARCH_TTLS["v6"], new_breaker()))
+source_registry.register(MercadoLibreSource(
+    upstream, SOURCE_DEADLINES["mercadolibre"], SEARCH_TTLS["mercadolibre"],
+    page_concurrency=ML_PAGE_CONCURRENCY, items_concurrency=ML_ITEMS_CONCURRENCY, breaker=new_breaker(),
+    known=KnownListingsStore(shared_cache) if ML_DELTA_ENABLED else None, full_every=ML_FULL_EVERY,
+))
+cpu_pool = CpuPool(PARSE_PROCESSES, initializer=setup_logging, initargs=(LOG_LEVEL, LOG_SAMPLE_EVERY))
+source_registry.register(KavakSource(
+    upstream, SOURCE_DEADLINES["kavak"], SEARCH_TTLS["kavak"], new_breaker(), pool=cpu_pool,
+))
+
+image_proxy = ImageProxy(
+    upstream, shared_cache, cpu_pool, IMG_CACHE_DIR, IMG_CACHE_MAX_BYTES, hosts=IMG_HOSTS, public_base=PUBLIC_URL,
+)
+
+def decode_cached_result(result):
+    # En el cache compartido los autos quedan como JSON; en memoria vuelven a ser Listing
+    result["cars"] = [Listing.from_dict(car) for car in result["cars"]]
+    return result
+
+# Con un solo proceso el LRU en memoria ya es el cache compartido: no se duplica
+search_cache = SearchCache(
+    SEARCH_CACHE_MAX_BYTES,
+    shared=shared_cache if shared_cache.backend.cross_process else None,
+    decode=decode_cached_result,
+    lock_ttl=REQUEST_BUDGET + 5,
+)
+result_views = ViewCache()
+market_stats = MarketStats(shared_cache, MARKET_MIN_COUNT, MARKET_REFRESH, MARKET_FLUSH) if MARKET_ENABLED else None
+history_store = None
+listing_index = None
+background_tasks = set()
+hot_queries = HotQueries(shared_cache, HOT_QUERIES_PATH)
+prewarmer = None
+
+# Métricas que ya cuentan otros componentes: se leen al exportar /metrics
+BREAKER_STATES = {"closed": 0, "half-open": 1, "open": 2}
+REGISTRY.callback(
+    "autitos_search_cache_requests_total", "Búsquedas resueltas por el cache (hit incluye coalesced)",
+    "counter", ("result",),
+    lambda: [({"result": "hit"}, search_cache.hits), ({"result": "miss"}, search_cache.misses)],
+)
+REGISTRY.callback(
+    "autitos_search_cache_hit_ratio", "Fracción de búsquedas servidas sin ir a los upstreams",
+    "gauge", (), lambda: [({}, search_cache.stats()["hit_ratio"])],
+)
+REGISTRY.callback(
+    "autitos_search_cache_bytes", "Tamaño aproximado del cache de búsquedas en memoria",
+    "gauge", (), lambda: [({}, search_cache.stats()["bytes"])],
+)
+REGISTRY.callback(
+    "autitos_upstream_requests_total", "Intentos contra cada upstream (incluye reintentos)",
+    "counter", ("host",), lambda: [({"host": host}, s.requests) for host, s in upstream.stats.items()],
+)
+REGISTRY.callback(
+    "autitos_upstream_errors_total", "Respuestas 4xx/5xx y errores de red por upstream",
+    "counter", ("host",), lambda: [({"host": host}, s.errors) for host, s in upstream.stats.items()],
+)
+REGISTRY.callback(
+    "autitos_upstream_retries_total", "Reintentos por upstream",
+    "counter", ("host",), lambda: [({"host": host}, s.retries) for host, s in upstream.stats.items()],
+)
+REGISTRY.callback(
+    "autitos_source_circuit_state", "Estado del circuito por fuente (0 closed, 1 half-open, 2 open)",
+    "gauge", ("source",),
+    lambda: [({"source": name}, BREAKER_STATES[h["state"]]) for name, h in source_registry.health().items()],
+)
+REGISTRY.callback(
+    "autitos_shared_cache_total", "Fetches hechos por este proceso y esperas a otro proceso en el cache compartido",
+    "counter", ("result",),
+    lambda: [({"result": "fetch"}, shared_cache.fetches), ({"result": "wait"}, shared_cache.waits)],
+)
+REGISTRY.callback(
+    "autitos_ml_refreshes_total", "Búsquedas de MercadoLibre por tipo de refresco",
+    "counter", ("mode",), lambda: [({"mode": mode}, n) for mode, n in source_registry["mercadolibre"].refreshes.items()],
+)
+REGISTRY.callback(
+    "autitos_ml_items_total", "Publicaciones de MercadoLibre por refresco: pedidas a /items, reusadas del estado o removidas",
+    "counter", ("result",),
+    lambda: [
+        ({"result": "fetched"}, source_registry["mercadolibre"].items_fetched),
+        ({"result": "reused"}, source_registry["mercadolibre"].items_reused),
+        ({"result": "removed"}, source_registry["mercadolibre"].removed),
+    ],
+)
+REGISTRY.callback(
+    "autitos_v6_snapshot_age_seconds", "Antigüedad del catálogo de V6",
+    "gauge", (), lambda: [({}, v6_catalog.age())],
+)
+
+@app.on_event("startup")
+async def startup():
+    global history_store, listing_index, prewarmer
+    upstream.start()
+    cpu_pool.start()
+    v6_catalog.start()
+    hot_queries.start()
+    if market_stats:
+        market_stats.start()
+    if HISTORY_ENABLED:
+        try:
+            os.makedirs(os.path.dirname(HISTORY_SQLITE_PATH), exist_ok=True)
+            history_store = await asyncio.to_thread(
+                HistoryStore, os.getenv("DATABASE_URL"), HISTORY_SQLITE_PATH, DB_POOL_SIZE
+            )
+        except Exception as e:
+            log.warning("historial de precios deshabilitado: %s", e)
+    if INDEX_ENABLED:
+        try:
+            os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+            listing_index = await asyncio.to_thread(ListingIndex, INDEX_PATH, INDEX_MAX_AGE)
+        except Exception as e:
+            log.warning("índice local deshabilitado: %s", e)
+    if PREWARM_IN_APP:
+        prewarmer = build_prewarmer()
+        prewarmer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if prewarmer:
+        await prewarmer.stop()
+    await hot_queries.stop()
+    await v6_catalog.stop()
+    if market_stats:
+        await market_stats.stop()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    if history_store:
+        history_store.close()
+    if listing_index:
+        listing_index.close()
+    await upstream.close()
+    await asyncio.to_thread(cpu_pool.close)
+    shared_cache.close()
+
+def run_in_background(coro):
+    # Guarda la referencia para que la tarea no se pierda antes de terminar
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def record_history(query, cars):
+    """
+    Guarda las observaciones de una búsqueda sin demorar la respuesta.
+    """
+    if history_store is None or not cars:
+        return
+
+    def write():
+        try:
+            history_store.record(normalize_query(query), cars)
+        except Exception as e:
+            log.error("error guardando historial: %s", e)
+
+    run_in_background(asyncio.to_thread(write))
+
+def index_listings(cars):
+    """
+    Suma al índice local los autos de una búsqueda en vivo, en segundo plano.
+    """
+    if listing_index is None or not cars:
+        return
+
+    def write():
+        try:
+            listing_index.add(cars)
+        except Exception as e:
+            log.error("error actualizando el índice: %s", e)
+
+    run_in_background(asyncio.to_thread(write))
+
+async def market_baseline(cars):
+    """
+    Trae las estadísticas de mercado de los modelos de `cars` y devuelve el
+    market(car) para score_cars (None si están deshabilitadas).
+    """
+    if market_stats is None:
+        return None
+    with stage("market"):
+        try:
+            await market_stats.prepare(cars)
+        except Exception as e:
+            log.warning("estadísticas de mercado no disponibles: %s", e)
+        return market_stats.baseline()
+
+def observe_market(live_cars):
+    # Después de puntuar: así ningún auto se compara contra su propio precio
+    if market_stats is not None:
+        market_stats.observe(live_cars)
+
+async def search_index(query, sources, year=(None, None), km=(None, None)):
+    """
+    Autos del índice local, en a lo sumo INDEX_BUDGET (si no, IndexTimeout).
+    """
+    with stage("index"):
+        return await asyncio.to_thread(
+            listing_index.search, query, sources, year_min=year[0], year_max=year[1], km_min=km[0], km_max=km[1],
+            limit=INDEX_MAX_RESULTS, budget=INDEX_BUDGET,
+        )
+
+async def index_fallback(query, sources):
+    """
+    Autos del índice para las fuentes que fallaron o no llegaron a tiempo;
+    el estado de cada una dice cuántos salieron de ahí.
+    """
+    failed = {name for name, status in sources.items() if name in source_registry and status["status"] != "ok"}
+    if listing_index is None or not INDEX_FALLBACK or not failed:
+        return []
     try:
-        response = requests.get("https://api.bluelytics.com.ar/v2/latest", timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data["blue"]["value_avg"]
-    except Exception as e:
-        print(f"Error al obtener cotización del dólar: {e}")
-        return 1285.0
+        cars = await search_index(query, failed)
+    except (IndexTimeout, sqlite3.Error) as e:
+        # El fallback es un extra: si el índice falla la búsqueda sigue sin él
+        log.warning("fallback al índice para %r: %s", query, e)
+        return []
+    for name in failed:
+        sources[name]["fallback"] = sum(1 for car in cars if car["source"] == name)
+    return cars
+
+async def index_search_result(query, requested, selection):
+    """
+    Resultado armado sólo desde el índice local (mode=index): sin upstreams,
+    con la última cotización conocida.
+    """
+    start = time.perf_counter()
+    status = {"status": "ok"}
+    try:
+        cars = await search_index(query, requested, selection.year, selection.km)
+    except IndexTimeout as e:
+        cars = []
+        status = {"status": "timeout", "error": str(e)}
+    except sqlite3.Error as e:
+        log.error("índice no disponible para %r: %s", query, e)
+        cars = []
+        status = {"status": "error", "error": str(e)}
+    dollar_rate = rate_cache.value or DEFAULT_DOLLAR_RATE
+    apply_dollar_rate(cars, dollar_rate)
+    market = await market_baseline(cars)
+    with stage("score"):
+        score_cars(cars, market)
+    status.update(count=len(cars), elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+    # Sin generated_at: el cursor sigue valiendo mientras el índice no cambie
+    return {"cars": cars, "dollar_rate": dollar_rate, "sources": {"index": status}}
+
+def apply_dollar_rate(cars, dollar_rate):
+    """
+    Completa price (ARS) y priceUSD a partir de originalPrice/currency.
+    Las fuentes no dependen de la cotización, así se pueden pedir en paralelo.
+    """
+    for car in cars:
+        original = car.get("originalPrice") or 0
+        if car.get("currency") == "USD":
+            car["priceUSD"] = int(original)
+            car["price"] = int(original * dollar_rate) if original > 0 else 0
+        else:
+            car["price"] = int(original)
+            car["priceUSD"] = int(original / dollar_rate) if original > 0 else 0
+    return cars
 
 def parse_price_and_currency(price_container):
     if not price_container:
@@ -130,479 +541,613 @@ def extract_car_url(item):
     
     return "https://www.mercadolibre.com.ar"
 
-def get_v6_cars(query, dollar_rate):
+def build_search_jobs(query, pages, sources, rate_lookup=None):
     """
-    Función mejorada para obtener autos de V6 usando su API oficial
+    Jobs de fan-out: la cotización y las fuentes pedidas, todas al mismo
+    tiempo. Devuelve también el status de las fuentes salteadas por breaker.
+    `rate_lookup` reemplaza la consulta de la cotización (el batch la
+    resuelve una sola vez para todas las búsquedas).
     """
-    print("Procesando V6 usando API oficial...")
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Origin": "https://v6.com.ar",
-        "Referer": "https://v6.com.ar/"
-    }
-    
-    v6_cars = []
-    
-    try:
-        response = requests.get(
-            "https://autoprecios-api.onrender.com/api/db/getPublishedCars", 
-            headers=headers, 
-            timeout=15
-        )
-        
-        if response.status_code != 200:
-            print(f"Error en V6 API: status {response.status_code}")
-            return v6_cars
-        
-        cars_data = response.json()
-        
-        # Filtrar autos que coincidan con la query
-        query_terms = query.lower().split()
-        
-        for car in cars_data:
-            # Crear título completo para buscar
-            full_title = f"{car.get('brand', '')} {car.get('model', '')} {car.get('version', '')}".lower()
-            
-            # Verificar si algún término de búsqueda está en el título
-            query_clean = query.lower().strip()
-            full_title = f"{car.get('brand', '')} {car.get('model', '')} {car.get('version', '')}".lower()
-
-            if query_clean in full_title:
-                try:
-                    # Construir título legible
-                    title = f"{car.get('brand', '').title()} {car.get('model', '').title()}"
-                    if car.get('version'):
-                        title += f" {car.get('version')}"
-                    if car.get('year'):
-                        title += f" {car.get('year')}"
-                    
-                    # Precio (parece que está en centavos o formato especial)
-                    price_raw = car.get('price', 0)
-                    if isinstance(price_raw, str):
-                        price_raw = int(re.sub(r'[^\d]', '', price_raw))
-                    
-                    # Si el precio es muy alto, probablemente esté en centavos
-                    if price_raw > 1000000:  # Más de 1M, probablemente centavos
-                        price_in_pesos = price_raw
-                        price_usd = int(price_raw / dollar_rate) if price_raw > 0 else 0
-                    else:  # Probablemente ya en USD
-                        price_usd = price_raw
-                        price_in_pesos = int(price_raw * dollar_rate) if price_raw > 0 else 0
-                    
-                    # Kilómetros
-                    km = None
-                    km_raw = car.get('kilometers')
-                    if km_raw:
-                        try:
-                            km = int(re.sub(r'[^\d]', '', str(km_raw)))
-                        except:
-                            pass
-                    
-                    # Año
-                    year = None
-                    year_raw = car.get('year')
-                    if year_raw:
-                        try:
-                            year = int(year_raw)
-                        except:
-                            pass
-                    
-                    # Ubicación
-                    location = car.get('city', '')
-                    if car.get('province') and location:
-                        location += f", {car.get('province')}"
-                    elif car.get('province'):
-                        location = car.get('province')
-                    
-                    # Imagen
-                    image = "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ac/No_image_available.svg/480px-No_image_available.svg.png"
-                    if car.get('cover') and car['cover'].get('url'):
-                        image = car['cover']['url']
-                    elif car.get('exterior') and len(car['exterior']) > 0:
-                        image = car['exterior'][0].get('url', image)
-                    
-                    # URL
-                    car_id = car.get('carId') or car.get('id', '')
-                    url = f"https://v6.com.ar/car/{car_id}" if car_id else "https://v6.com.ar"
-                    
-                    v6_car = {
-                        "id": len(v6_cars) + 1000,  # Offset para evitar conflictos
-                        "title": title.strip(),
-                        "price": price_in_pesos,
-                        "priceUSD": price_usd,
-                        "year": year,
-                        "km": km,
-                        "location": location or "Argentina",
-                        "image": image,
-                        "url": url,
-                        "priceScore": "regular",
-                        "publishDate": "desconocido",
-                        "source": "v6"  # ← AGREGAR ESTE CAMPO
-                    }
-                    
-                    v6_cars.append(v6_car)
-                    print(f"✅ Auto V6 agregado: {title} - ${price_usd}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error procesando auto V6: {e}")
-                    continue
-        
-        print(f"📊 V6: {len(v6_cars)} autos encontrados")
-        
-    except Exception as e:
-        print(f"❌ Error conectando con V6 API: {e}")
-    
-    return v6_cars
-
-def get_km_cluster(km):
-    if km is None:
-        return "desconocido"
-    if km < 70000:
-        return "0-70k"
-    elif km < 140000:
-        return "70k-140k"
-    elif km < 200000:
-        return "140k-200k"
-    else:
-        return "+200k"
+    # Se busca con la query normalizada: es la clave con la que se cachea y
+    # se comparte el resultado, así que tiene que ser también lo que se pide
+    query = normalize_query(query)
+    jobs, skipped = source_registry.jobs(sources, query, pages)
+    jobs["dollar_rate"] = (rate_lookup or lookup_dollar_rate, SOURCE_DEADLINES["dollar_rate"])
+    return jobs, skipped
 
-@app.get("/api/cars")
-def get_cars(query: str = Query(...), pages: int = 3, include_kavak: bool = False, include_ml: bool = True, include_v6: bool = False):
-    # Crear search_query solo para MercadoLibre
-    ml_search_query = "-".join(query.strip().split())
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    }
+async def lookup_dollar_rate():
+    with stage("rate"):
+        return await rate_cache.get()
+
+def requested_sources(sources, include_kavak, include_ml, include_v6):
+    """
+    Fuentes pedidas por nombre (sources=v6,kavak) o, si no, por los flags
+    include_* de siempre.
+    """
+    if sources:
+        names = {name.strip() for name in sources.split(",") if name.strip()}
+        unknown = names - set(source_registry.names())
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"fuentes desconocidas: {', '.join(sorted(unknown))}")
+        return names
+    return {name for name, on in (("kavak", include_kavak), ("mercadolibre", include_ml), ("v6", include_v6)) if on}
 
-    dollar_rate = get_dollar_rate()
+def resolve_dollar_rate(rate_info, status):
+    if rate_info:
+        status.update(source=rate_info["source"], age_seconds=rate_info["age_seconds"])
+        return rate_info["value"]
+    return rate_cache.value or DEFAULT_DOLLAR_RATE
+
+def annotate_source_status(name, status, cars):
+    source_registry.observe(name, status)
+    status["count"] = len(cars)
+    source_registry[name].annotate(status)
+
+async def admitted(route, fetch):
+    """
+    Corre fetch() (una búsqueda contra los upstreams) si hay cupo; si no,
+    Overloaded. Va dentro del fetch del cache: sólo los miss ocupan lugar.
+    """
+    with admission.slot(route):
+        return await fetch()
+
+async def search_cars(query, pages, requested, rate_lookup=None):
+    """
+    Fan-out a todas las fuentes pedidas, conversión de precios y priceScore.
+    """
+    log.debug("buscando %r en %s", query, ", ".join(sorted(requested)))
+
+    jobs, skipped = build_search_jobs(query, pages, requested, rate_lookup)
+    results, sources = await fan_out(jobs, REQUEST_BUDGET)
+    sources.update(skipped)
+
+    dollar_rate = resolve_dollar_rate(results.pop("dollar_rate"), sources["dollar_rate"])
+
+    # Mismo orden de siempre: V6, MercadoLibre, Kavak
     all_cars = []
-    
-    print(f"Buscando: {query}")
-    print(f"Include ML: {include_ml}, Include Kavak: {include_kavak}, Include V6: {include_v6}")
-
-    # V6 - NUEVA IMPLEMENTACIÓN CON API
-    if include_v6:
-        v6_cars = get_v6_cars(query, dollar_rate)
-        all_cars.extend(v6_cars)
-
-    # MERCADOLIBRE (antes: scraping)
-    if include_ml:
-        print("Procesando MercadoLibre...")
-        ml_cars = get_ml_cars(query, dollar_rate, pages=pages)
-        all_cars.extend(ml_cars)
-
-    # KAVAK (solo si se solicita explícitamente)
-    if include_kavak:
-        print("Procesando Kavak...")
-        kavak_query = query.strip().lower().replace(" ", "-")
-        kavak_url = f"https://www.kavak.com/ar/usados/{kavak_query}"
-        print(f"URL Kavak: {kavak_url}")
-        try:
-            r = requests.get(kavak_url, headers=headers, timeout=10)
-            if r.status_code == 200:
-                soup = BeautifulSoup(r.text, 'html.parser')
-                cards = soup.find_all("a", class_=re.compile("card-product_cardProduct__"))
-                print(f"Encontradas {len(cards)} cards en Kavak")
-                for card in cards:
-                    try:
-                        title_elem = card.find("h3", class_=re.compile("card-product_cardProduct__title"))
-                        if not title_elem:
-                            continue  # no es una card válida
-                        title = title_elem.text.strip()
-                        # Precio
-                        price_elem = card.find("span", class_=re.compile("amount_uki-amount__large__price"))
-                        price = int(price_elem.text.strip().replace(".", "").replace("$", "")) if price_elem else 0
-                        if price == 0:
-                            continue
-                        # Año y KM
-                        subtitle = card.find("p", class_=re.compile("card-product_cardProduct__subtitle"))
-                        year, km = None, None
-                        if subtitle:
-                            text = subtitle.text
-                            year_match = re.search(r"(20\d{2}|19\d{2})", text)
-                            km_match = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*km", text.lower())
-                            if year_match:
-                                year = int(year_match.group())
-                            if km_match:
-                                km = int(km_match.group(1).replace(".", ""))
-                        # Imagen
-                        image_tag = card.find("img")
-                        image = image_tag["src"] if image_tag and "src" in image_tag.attrs else ""
-                        # URL + ID
-                        url_base = card["href"]
-                        testid = card.get("data-testid", "")
-                        match = re.search(r'card-product-(\d+)', testid)
-                        car_id = match.group(1) if match else None
-                        url = f"{url_base}?id={car_id}" if car_id else url_base
-                        car = {
-                            "id": len(all_cars) + 1,
-                            "title": title,
-                            "price": price,
-                            "priceUSD": int(price / dollar_rate) if price > 0 else 0,
-                            "year": year,
-                            "km": km,
-                            "location": "Buenos Aires",
-                            "image": image,
-                            "url": url,
-                            "priceScore": "regular",
-                            "publishDate": "desconocido",
-                            "source": "kavak"  # ← AGREGAR ESTE CAMPO
-                        }
-                        all_cars.append(car)
-                    except Exception as e:
-                        print(f"Error procesando card de Kavak: {e}")
-            else:
-                print(f"Error en Kavak: status {r.status_code}")
-        except Exception as e:
-            print(f"Error conectando con Kavak: {e}")
-
-    print(f"Total autos encontrados: {len(all_cars)}")
-
-    # Agrupación por km para priceScore
-    cluster_prices = defaultdict(list)
-    for car in all_cars:
-        cluster = get_km_cluster(car["km"])
-        cluster_prices[cluster].append(car["price"])
-
-    cluster_avg = {}
-    for cluster, prices in cluster_prices.items():
-        if prices:
-            cluster_avg[cluster] = sum(prices) / len(prices)
-
-    for car in all_cars:
-        cluster = get_km_cluster(car["km"])
-        avg_price = cluster_avg.get(cluster)
-        p = car["price"]
-
-        if not avg_price:
-            score = "regular"
-        elif p < avg_price * 0.9:
-            score = "muy-bueno"
-        elif p < avg_price * 0.97:
-            score = "bueno"
-        elif p < avg_price * 1.03:
-            score = "regular"
-        elif p < avg_price * 1.1:
-            score = "malo"
+    for name in source_registry.names():
+        if name in sources:
+            cars = results.get(name) or []
+            annotate_source_status(name, sources[name], cars)
+            all_cars.extend(cars)
+    live_cars = list(all_cars)
+    all_cars.extend(await index_fallback(query, sources))
+
+    apply_dollar_rate(all_cars, dollar_rate)
+    if IMG_PROXY_ENABLED:
+        image_proxy.rewrite(all_cars, IMG_LISTING_WIDTH)
+    with stage("dedup"):
+        all_cars, merged = dedupe_cars(all_cars)
+    log.info("%r: %d autos (%d duplicados colapsados)", query, len(all_cars), len(merged))
+
+    # Lo que salió del índice no se vuelve a registrar como visto
+    live_ids = {id(car) for car in live_cars}
+    live_cars = [car for car in all_cars if id(car) in live_ids]
+    market = await market_baseline(all_cars)
+    with stage("score"):
+        score_cars(all_cars, market)
+    observe_market(live_cars)
+    record_history(query, live_cars)
+    index_listings(live_cars)
+
+    return {"cars": all_cars, "dollar_rate": dollar_rate, "sources": sources, "generated_at": time.time()}
+
+def ndjson_event(payload):
+    return json_dumps(payload) + b"\n"
+
+def scores_event(cars):
+    return {
+        "type": "scores",
+        "scores": {car["id"]: car["priceScore"] for car in cars},
+        "details": {
+            car["id"]: {"pricePercentile": car.get("pricePercentile"), "priceZScore": car.get("priceZScore")}
+            for car in cars
+        },
+    }
+
+def cached_events(result, cache_status):
+    """
+    Eventos de un resultado ya armado: uno "source" por fuente, "scores" y "done".
+    """
+    for name in source_registry.names():
+        if name in result["sources"]:
+            cars = [car for car in result["cars"] if car["source"] == name]
+            yield ndjson_event({"type": "source", "source": name, "status": result["sources"][name], "cars": cars})
+    yield ndjson_event(scores_event(result["cars"]))
+    yield ndjson_event({"type": "done", "cache": cache_status, "dollar_rate": result["dollar_rate"], "sources": result["sources"]})
+
+async def stream_search_cars(key, query, pages, requested, cached):
+    """
+    Variante de search_cars que emite eventos NDJSON a medida que cada fuente
+    termina, y al final los duplicados colapsados y los priceScore definitivos.
+    `cached` es la entrada del cache que ya buscó el handler (o None). Si ya
+    hay una búsqueda en curso para la misma clave (de /api/cars o de otro
+    stream) se espera su resultado en vez de repetirla.
+    """
+    if cached is not None:
+        for chunk in cached_events(cached.value, "HIT"):
+            yield chunk
+        return
+
+    task = search_cache.inflight(key)
+    if task is None:
+        events = asyncio.Queue()
+
+        async def fetch():
+            # El handler ya chequeó el cupo antes de empezar a responder
+            with admission.slot("/api/cars/stream", check=False):
+                return await stream_live_search(query, pages, requested, events.put_nowait)
+
+        # La búsqueda corre en su propia tarea: si el cliente se va, termina
+        # igual y queda en el cache para los que se sumaron
+        task = search_cache.start(key, fetch, search_ttl)
+        while True:
+            get = asyncio.ensure_future(events.get())
+            try:
+                await asyncio.wait((get, task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not get.done():
+                    get.cancel()
+            if get.cancelled():
+                break
+            event = get.result()
+            yield ndjson_event(event)
+            if event["type"] == "done":
+                return
+        # Terminó sin eventos: otro proceso ya la estaba trayendo
+
+    value, _ = await asyncio.shield(task)
+    for chunk in cached_events(value, "COALESCED"):
+        yield chunk
+
+async def stream_live_search(query, pages, requested, emit):
+    """
+    Búsqueda en vivo del stream: emit(evento) por cada fuente que termina
+    (con los autos del índice si falló), "dedup", "scores" y "done".
+    Devuelve el resultado para el cache.
+    """
+    log.debug("buscando (stream) %r", query)
+    sources = {}
+    by_source = {}
+    buffered = []
+    live_ids = set()
+    dollar_rate = None
+
+    jobs, skipped = build_search_jobs(query, pages, requested)
+    # Las fuentes con el circuito abierto salen enseguida, sin autos (o con
+    # los del índice, que esperan a la cotización como las demás)
+    fallback = await index_fallback(query, skipped)
+    for name, status in skipped.items():
+        status["count"] = 0
+        sources[name] = status
+        cars = [car for car in fallback if car["source"] == name]
+        if cars:
+            buffered.append((name, cars))
         else:
-            score = "muy-malo"
+            by_source[name] = []
+            emit({"type": "source", "source": name, "status": status, "cars": []})
 
-        car["priceScore"] = score
+    async for name, result, status in fan_out_iter(jobs, REQUEST_BUDGET):
+        sources[name] = status
+        if name == "dollar_rate":
+            dollar_rate = resolve_dollar_rate(result, status)
+        else:
+            cars = result or []
+            annotate_source_status(name, status, cars)
+            live_ids.update(id(car) for car in cars)
+            # Cada fuente que falló completa con el índice apenas termina
+            buffered.append((name, cars + await index_fallback(query, {name: status})))
+
+        # Sin cotización no hay precios: las fuentes esperan a que llegue
+        if dollar_rate is None:
+            continue
+        for source_name, cars in buffered:
+            for car in cars:
+                car["id"] = listing_id(car)
+            apply_dollar_rate(cars, dollar_rate)
+            if IMG_PROXY_ENABLED:
+                image_proxy.rewrite(cars, IMG_LISTING_WIDTH)
+            by_source[source_name] = cars
+            emit({"type": "source", "source": source_name, "status": sources[source_name], "cars": cars})
+        buffered = []
+
+    # Con todas las fuentes adentro se colapsan los duplicados y los
+    # promedios por cluster ya son finales
+    all_cars = [car for name in source_registry.names() for car in by_source.get(name, [])]
+    with stage("dedup"):
+        all_cars, merged = dedupe_cars(all_cars)
+    emit({
+        "type": "dedup",
+        "merged": merged,
+        "urls": {car["id"]: car["urls"] for car in all_cars if "urls" in car},
+    })
+    # Lo que salió del índice no se vuelve a registrar como visto
+    live_cars = [car for car in all_cars if id(car) in live_ids]
+    market = await market_baseline(all_cars)
+    with stage("score"):
+        score_cars(all_cars, market)
+    observe_market(live_cars)
+    emit(scores_event(all_cars))
+    emit({"type": "done", "cache": "MISS", "dollar_rate": dollar_rate, "sources": sources})
+
+    record_history(query, live_cars)
+    index_listings(live_cars)
+    return {"cars": all_cars, "dollar_rate": dollar_rate, "sources": sources, "generated_at": time.time()}
+
+def search_ttl(result):
+    """
+    TTL de una búsqueda cacheada: el de la fuente más volátil incluida, o uno
+    corto si alguna fuente falló (para no cachear una caída por mucho tiempo).
+    """
+    sources = result["sources"]
+    if any(s["status"] != "ok" for s in sources.values()):
+        return SEARCH_TTL_ON_ERROR
+    return min(
+        (source_registry[name].ttl for name in sources if name in source_registry),
+        default=SEARCH_TTL_ON_ERROR,
+    )
 
-    return all_cars
+def search_cache_control(result, age):
+    """
+    Cache-Control de un resultado: lo que le queda de vida en el cache
+    (TTL de su fuente más volátil, o el corto si alguna falló, menos su edad).
+    """
+    remaining = int(search_ttl(result) - age)
+    return f"public, max-age={remaining}" if remaining > 0 else "no-cache"
 
-def get_ml_cars(query: str, dollar_rate: float, pages: int = 3):
+@app.get("/api/cars")
+async def get_cars(
+    request: Request,
+    query: str = Query(...),
+    pages: int = Query(3, ge=1, le=MAX_PAGES),
+    include_kavak: bool = False,
+    include_ml: bool = True,
+    include_v6: bool = False,
+    sources: str = None,
+    year_min: int = None,
+    year_max: int = None,
+    km_min: int = None,
+    km_max: int = None,
+    price_min: int = None,
+    price_max: int = None,
+    source: str = None,
+    price_score: str = None,
+    sort: str = "relevance",
+    limit: int = DEFAULT_LIMIT,
+    cursor: str = None,
+    fields: str = "card",
+    mode: str = "live",
+):
     """
-    Busca autos en Mercado Libre usando la API oficial:
-    https://api.mercadolibre.com/sites/MLA/search
-    Nota: Para km y año más precisos podemos enriquecer con /items más abajo.
+    Una página del resultado. Filtros (precios en USD; source y price_score
+    separados por coma), orden y cursor se resuelven sobre el resultado
+    cacheado; next_cursor trae la página siguiente con los mismos filtros.
+    fields=full devuelve todos los campos de cada auto. mode=index responde
+    sólo desde el índice local, sin ir a los upstreams. Con If-None-Match
+    igual al ETag (hash del resultado + parámetros) responde 304.
     """
-    ml_cars = []
+    try:
+        selection = Selection(year_min, year_max, km_min, km_max, price_min, price_max, source, price_score, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if mode not in ("live", "index"):
+        raise HTTPException(status_code=400, detail=f"mode desconocido: {mode} (opciones: live, index)")
 
-    # Normalizamos query y armamos paginado por offset
-    q = query.strip()
-    total_to_fetch = pages * ML_PAGE_LIMIT
+    requested = requested_sources(sources, include_kavak, include_ml, include_v6)
+    if mode == "index":
+        return await get_cars_from_index(request, query, requested, selection, limit, cursor, fields)
+    key = make_key(query, pages, requested)
+    hot_queries.hit(query, pages, requested)
 
-    # Headers opcionales (no necesarios para la API, pero útil para trazas)
+    result, status, age = await search_cache.get_or_fetch(
+        key,
+        lambda: admitted("/api/cars", lambda: search_cars(query, pages, requested)),
+        search_ttl,
+    )
+    view = result_views.get(key, result)
     headers = {
-        "Accept": "application/json",
-        "User-Agent": "autitos/1.0 (+https://autitos-two.vercel.app)"
+        "X-Cache": status, "X-Cache-Age": str(int(age)),
+        "ETag": make_etag(view.etag_base, request.url.query),
+        "Cache-Control": search_cache_control(result, age),
     }
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    try:
+        with stage("page"):
+            page = view.page(selection, limit, cursor, fields)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    fetched = 0
-    offset = 0
-    while fetched < total_to_fetch:
-        try:
-            params = {
-                "q": q,
-                "category": ML_CARS_CATEGORY,
-                "limit": ML_PAGE_LIMIT,
-                "offset": offset
-            }
-            r = requests.get(
-                f"https://api.mercadolibre.com/sites/{ML_SITE}/search",
-                headers=headers, params=params, timeout=10
+    page.update(dollar_rate=result["dollar_rate"], sources=result["sources"])
+    # Respuesta directa con orjson: los Listing se serializan sin jsonable_encoder
+    with stage("serialize"):
+        return JSONResponse(page, headers=headers)
+
+async def get_cars_from_index(request, query, requested, selection, limit, cursor, fields):
+    if listing_index is None:
+        raise HTTPException(status_code=503, detail="índice local deshabilitado")
+    result = await index_search_result(query, requested, selection)
+    view = ResultView(result)
+    # El índice cambia con cada búsqueda en vivo: siempre se revalida
+    headers = {"X-Cache": "INDEX", "ETag": make_etag(view.etag_base, request.url.query), "Cache-Control": "no-cache"}
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    try:
+        with stage("page"):
+            page = view.page(selection, limit, cursor, fields)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page.update(dollar_rate=result["dollar_rate"], sources=result["sources"])
+    with stage("serialize"):
+        return JSONResponse(page, headers=headers)
+
+class BatchSearch(BaseModel):
+    queries: list[str]
+    pages: int = Field(3, ge=1, le=MAX_PAGES)
+    sources: list[str] = None
+    include_kavak: bool = False
+    include_ml: bool = True
+    include_v6: bool = False
+    year_min: int = None
+    year_max: int = None
+    km_min: int = None
+    km_max: int = None
+    price_min: int = None
+    price_max: int = None
+    source: str = None
+    price_score: str = None
+    sort: str = "relevance"
+    limit: int = DEFAULT_LIMIT
+    fields: str = "card"
+
+async def search_batch(queries, pages, requested):
+    """
+    Resuelve varias búsquedas compartiendo el trabajo: la cotización se pide
+    una vez para todas, V6 es un lookup en el catálogo ya cargado y los
+    fetch de MercadoLibre / Kavak pasan por un mismo cupo (BATCH_CONCURRENCY
+    búsquedas a la vez, más los límites por host del cliente). Cada búsqueda
+    entra al cache como si fuera un GET /api/cars.
+    Devuelve {query: (result, status, age)}.
+    """
+    try:
+        rate_info = await asyncio.wait_for(lookup_dollar_rate(), SOURCE_DEADLINES["dollar_rate"])
+    except asyncio.TimeoutError:
+        rate_info = None
+
+    async def shared_rate():
+        return rate_info
+
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(query):
+        async with slots:
+            return await admitted("/api/cars/batch", lambda: search_cars(query, pages, requested, shared_rate))
+
+    async def one(query):
+        hot_queries.hit(query, pages, requested)
+        return await search_cache.get_or_fetch(
+            make_key(query, pages, requested), lambda: fetch(query), search_ttl,
+        )
+
+    results = await asyncio.gather(*(one(query) for query in queries))
+    return dict(zip(queries, results))
+
+@app.post("/api/cars/batch")
+async def get_cars_batch(batch: BatchSearch):
+    """
+    Varias búsquedas en un pedido (p.ej. para comparar modelos). Por búsqueda
+    devuelve la primera página con los filtros y el orden pedidos (se sigue
+    con GET /api/cars y next_cursor) más un resumen de precios, año y km;
+    "comparison" ordena las búsquedas por precio mediano.
+    """
+    # Una vez por búsqueda normalizada ("Onix" y "onix " son la misma)
+    unique = {}
+    for query in batch.queries:
+        if query.strip():
+            unique.setdefault(normalize_query(query), query.strip())
+    queries = list(unique.values())
+    if not queries:
+        raise HTTPException(status_code=400, detail="queries vacío")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"máximo {BATCH_MAX_QUERIES} búsquedas por pedido")
+    try:
+        selection = Selection(
+            batch.year_min, batch.year_max, batch.km_min, batch.km_max, batch.price_min, batch.price_max,
+            batch.source, batch.price_score, batch.sort,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    requested = requested_sources(
+        ",".join(batch.sources) if batch.sources else None, batch.include_kavak, batch.include_ml, batch.include_v6,
+    )
+    searches = await search_batch(queries, batch.pages, requested)
+
+    results = []
+    summaries = {}
+    with stage("page"):
+        for query, (result, status, age) in searches.items():
+            view = result_views.get(make_key(query, batch.pages, requested), result)
+            page = view.page(selection, batch.limit, None, batch.fields)
+            summaries[query] = view.summary(selection)
+            page.update(
+                query=query, cache=status, cache_age=int(age), summary=summaries[query],
+                dollar_rate=result["dollar_rate"], sources=result["sources"],
             )
-            if r.status_code != 200:
-                print(f"[ML API] status {r.status_code} offset {offset}")
-                break
+            results.append(page)
 
-            data = r.json()
-            results = data.get("results", [])
-            if not results:
-                break
+    with stage("serialize"):
+        return JSONResponse({"results": results, "comparison": compare(summaries)})
 
-            # Junta IDs para enriquecer atributos (km/año) con /items
-            ids = [item.get("id") for item in results if item.get("id")]
-            attrs_map = {}
-            if ids:
-                # batch hasta 20 por request para /items
-                for i in range(0, len(ids), 20):
-                    group = ids[i:i+20]
-                    rr = requests.get(
-                        "https://api.mercadolibre.com/items",
-                        params={"ids": ",".join(group)}, timeout=10
-                    )
-                    if rr.status_code == 200:
-                        arr = rr.json()
-                        for entry in arr:
-                            if isinstance(entry, dict) and entry.get("code") == 200:
-                                item = entry.get("body", {})
-                                attrs_map[item.get("id")] = item
-                    else:
-                        print(f"[ML items] status {rr.status_code}")
-
-            for item in results:
-                try:
-                    item_id = item.get("id", "")
-                    title = item.get("title", "N/A")
-                    price_value = item.get("price", 0) or 0
-                    currency_id = item.get("currency_id", "ARS")
-                    permalink = item.get("permalink", "")
-                    thumbnail = item.get("thumbnail", "") or item.get("thumbnail_id", "")
-                    # imagen más grande si viene secure_thumbnail
-                    image = item.get("secure_thumbnail") or thumbnail or "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ac/No_image_available.svg/480px-No_image_available.svg.png"
-
-                    # ubicación
-                    addr = item.get("address", {}) or {}
-                    city = addr.get("city_name") or ""
-                    state = addr.get("state_name") or ""
-                    location = ", ".join([p for p in [city, state] if p]) or "Argentina"
-
-                    # precio en ARS / USD
-                    if currency_id == "USD":
-                        price_usd = int(price_value)
-                        price_ars = int(price_value * dollar_rate)
-                    else:
-                        price_ars = int(price_value)
-                        price_usd = int(price_value / dollar_rate) if price_value else 0
-
-                    # Enriquecer con atributos (km/año) desde /items
-                    year, km = None, None
-                    body = attrs_map.get(item_id, {})
-                    for att in (body.get("attributes") or []):
-                        # Names suelen ser 'Año' y 'Kilómetros'
-                        name = (att.get("name") or "").lower()
-                        val = att.get("value_name") or ""
-                        if "año" in name:
-                            try:
-                                y = int(re.search(r"(19|20)\d{2}", val).group()) if re.search(r"(19|20)\d{2}", val) else None
-                                if y and 1950 <= y <= 2030:
-                                    year = y
-                            except:
-                                pass
-                        if "kilómetro" in name or "kilometro" in name:
-                            try:
-                                km = int(re.sub(r"[^\d]", "", val)) if val else None
-                            except:
-                                pass
-
-                    ml_cars.append({
-                        "id": len(ml_cars) + 1,
-                        "title": title,
-                        "price": price_ars,
-                        "priceUSD": price_usd,
-                        "year": year,
-                        "km": km,
-                        "location": location,
-                        "image": image,
-                        "url": permalink,
-                        "priceScore": "regular",
-                        "publishDate": "desconocido",
-                        "source": "mercadolibre"
-                    })
-
-                except Exception as e:
-                    print(f"[ML parse] {e}")
-                    continue
-
-            fetched += len(results)
-            offset += ML_PAGE_LIMIT
-            if len(results) < ML_PAGE_LIMIT:
-                break
+@app.get("/api/cars/stream")
+async def get_cars_stream(query: str = Query(...), pages: int = Query(3, ge=1, le=MAX_PAGES), include_kavak: bool = False, include_ml: bool = True, include_v6: bool = False, sources: str = None):
+    """
+    Igual que /api/cars pero en NDJSON: un evento "source" por fuente apenas
+    termina, después "dedup" con los duplicados entre fuentes, "scores" con
+    los priceScore finales y por último "done".
+    """
+    requested = requested_sources(sources, include_kavak, include_ml, include_v6)
+    key = make_key(query, pages, requested)
+    hot_queries.hit(query, pages, requested)
+    cached = await search_cache.get(key)
+    if cached is None and search_cache.inflight(key) is None:
+        # Una vez empezado el stream ya no se puede responder 503
+        admission.check("/api/cars/stream")
+    return StreamingResponse(
+        stream_search_cars(key, query, pages, requested, cached),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        except Exception as e:
-            print(f"[ML API error] {e}")
-            break
+async def prewarm_search(query, pages, sources):
+    """
+    Re-crawlea una búsqueda fuera del request y la deja en el cache.
+    """
+    result = await search_cars(query, pages, set(sources))
+    await search_cache.set(make_key(query, pages, sources), result, search_ttl(result))
+    return result["sources"]
 
-    print(f"[ML API] total agregados: {len(ml_cars)}")
-    return ml_cars
+async def prewarm_is_fresh(query, pages, sources, horizon):
+    # Sólo se refresca lo que vence antes de la próxima ronda
+    entry = await search_cache.get(make_key(query, pages, sources))
+    return entry is not None and entry.expires_at - time.time() > horizon
 
-@app.get("/api/dollar-rate")
-def get_current_dollar_rate():
-    rate = get_dollar_rate()
-    return {"dollar_rate": rate}
+def build_prewarmer(reload_hot_queries=False):
+    return Prewarmer(
+        prewarm_search,
+        prewarm_is_fresh,
+        hot_queries,
+        static_queries=parse_static_queries(PREWARM_QUERIES),
+        top_n=PREWARM_TOP_N,
+        interval=PREWARM_INTERVAL,
+        pace=PREWARM_PACE,
+        reload_hot_queries=reload_hot_queries,
+    )
 
-@app.get("/api/debug-v6")
-def debug_v6_api(query: str = Query(...)):
+@app.get("/api/dollar-rate")
+async def get_current_dollar_rate(request: Request):
     """
-    Endpoint de debug para probar la nueva API de V6
+    Cotización actual. Mientras no cambie el valor el ETag es el mismo, y
+    max-age es lo que le falta para vencer (sin cache si es un valor de
+    respaldo).
     """
+    info = await rate_cache.get()
+    remaining = int(DOLLAR_RATE_TTL - (info["age_seconds"] or 0))
+    fresh = info["source"] in ("upstream", "cache") and remaining > 0
     headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Origin": "https://v6.com.ar",
-        "Referer": "https://v6.com.ar/"
+        "ETag": make_etag(info["value"], info["source"]),
+        "Cache-Control": f"public, max-age={remaining}" if fresh else "no-cache",
     }
-    
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    return JSONResponse({
+        "dollar_rate": info["value"],
+        "source": info["source"],
+        "age_seconds": info["age_seconds"],
+    }, headers=headers)
+
+@app.get("/api/price-history")
+async def get_price_history(query: str = Query(...), months: int = 12):
+    """
+    Promedio, mínimo y máximo mensual (USD) de lo observado para una búsqueda.
+    """
+    if history_store is None:
+        return {"query": query, "months": []}
+    rows = await asyncio.to_thread(history_store.monthly, normalize_query(query), months)
+    return {"query": query, "months": rows}
+
+@app.get("/api/sources")
+async def sources_health():
+    """
+    Estado de cada fuente: circuito (closed / open / half-open), fallas
+    seguidas, último error y cuándo se vuelve a probar.
+    """
+    return source_registry.health()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Métricas en formato de texto de Prometheus (por proceso).
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/img")
+async def get_image(request: Request, u: str = Query(...), w: int = Query(IMG_LISTING_WIDTH, ge=1)):
+    """
+    Thumbnail WebP de la imagen de una publicación (ver image_proxy.py).
+    """
+    if not image_proxy.allowed(u):
+        raise HTTPException(status_code=403, detail="host de imagen no permitido")
     try:
-        response = requests.get(
-            "https://autoprecios-api.onrender.com/api/db/getPublishedCars", 
-            headers=headers, 
-            timeout=15
-        )
-        
-        if response.status_code != 200:
-            return {"error": f"Status code: {response.status_code}"}
-        
-        cars_data = response.json()
-        
-        # Filtrar por query
-        query_terms = query.lower().split()
+        path, digest = await image_proxy.get(u, w)
+    except ImageError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    headers = {"ETag": f'"{digest}"', "Cache-Control": IMG_CACHE_CONTROL}
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+@app.get("/api/debug-upstreams")
+async def debug_upstreams():
+    """
+    Contadores por host del cliente HTTP compartido, del pool de parseo y
+    del cache compartido
+    """
+    return {**upstream.host_stats(), "cpu_pool": cpu_pool.stats(), "shared_cache": shared_cache.stats(),
+            "market": market_stats.stats() if market_stats else None}
+
+@app.get("/api/debug-v6")
+async def debug_v6_api(query: str = Query(...)):
+    """
+    Endpoint de debug para probar el catálogo indexado de V6
+    """
+    try:
+        matches = v6_catalog.search_raw(query)
+
         filtered_cars = []
-        
-        for car in cars_data[:10]:  # Solo los primeros 10 para debug
-            full_title = f"{car.get('brand', '')} {car.get('model', '')} {car.get('version', '')}".lower()
-            
-            if any(term in full_title for term in query_terms):
-                filtered_cars.append({
-                    "id": car.get('id'),
-                    "brand": car.get('brand'),
-                    "model": car.get('model'),
-                    "version": car.get('version'),
-                    "year": car.get('year'),
-                    "price": car.get('price'),
-                    "kilometers": car.get('kilometers'),
-                    "city": car.get('city'),
-                    "province": car.get('province'),
-                    "cover_url": car.get('cover', {}).get('url', '')
-                })
-        
+        for car in matches[:10]:  # Solo los primeros 10 para debug
+            filtered_cars.append({
+                "id": car.get('id'),
+                "brand": car.get('brand'),
+                "model": car.get('model'),
+                "version": car.get('version'),
+                "year": car.get('year'),
+                "price": car.get('price'),
+                "kilometers": car.get('kilometers'),
+                "city": car.get('city'),
+                "province": car.get('province'),
+                "cover_url": (car.get('cover') or {}).get('url', '')
+            })
+
         return {
-            "total_cars": len(cars_data),
-            "filtered_count": len(filtered_cars),
+            "total_cars": v6_catalog.info()["total_cars"],
+            "filtered_count": len(matches),
             "query": query,
+            "catalog": v6_catalog.info(),
             "sample_results": filtered_cars
         }
-        
+
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/api/debug-html")
-def debug_html_structure(query: str = Query(...)):
+async def debug_html_structure(query: str = Query(...)):
     search_query = "-".join(query.strip().split())
     url = f"https://listado.mercadolibre.com.ar/{search_query}"
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    }
+    r = await upstream.get(url, headers={"User-Agent": BROWSER_USER_AGENT}, timeout=15)
+    if r.status != 200:
+        return {"error": f"Status code: {r.status}"}
 
-    r = requests.get(url, headers=headers)
-    if r.status_code != 200:
-        return {"error": f"Status code: {r.status_code}"}
+    debug_info = await asyncio.to_thread(debug_html_items, r.text())
+    return {"debug_info": debug_info, "url": url}
 
-    soup = BeautifulSoup(r.text, 'html.parser')
+def debug_html_items(html):
+    soup = BeautifulSoup(html, 'html.parser')
     items = soup.find_all('li', class_='ui-search-layout__item')
     
     debug_info = []
@@ -642,4 +1187,4 @@ def debug_html_structure(query: str = Query(...)):
         
         debug_info.append(item_debug)
     
-    return {"debug_info": debug_info, "url": url}
\ No newline at end of file
+    return debug_info
\ No newline at end of file
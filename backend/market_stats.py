@@ -0,0 +1,421 @@
+"""
+Estadísticas de mercado de largo plazo para el priceScore.
+
+Por modelo (marca y modelo sacados del título de cada publicación, como los
+bloques de dedup.py, así "toyota" no mezcla Hilux con Etios y "gol" y "gol
+trend" alimentan el mismo) y segmento (banda de años × cluster de km, los
+mismos de scoring.py) se mantiene un t-digest de los precios en USD de cada
+publicación vista en una búsqueda en vivo. Con eso cada auto se compara
+contra todo lo que se vio del modelo y no sólo contra los pocos autos de la
+búsqueda actual: la mediana, el IQR y el percentil salen del digest sin
+volver a leer nada.
+
+- Los autos de una búsqueda se puntúan antes de sumarlos (prepare ->
+  baseline -> score_cars -> observe): ninguno se compara contra su propio
+  precio.
+
+- Cada publicación cuenta una vez: por segmento se guardan los hashes de los
+  ids ya contados (hasta SEEN_MAX; los más viejos se olvidan).
+- Las observaciones nuevas quedan pendientes en el proceso y cada
+  `flush_interval` se suman al estado del SharedCache con un lock por
+  modelo, así todos los workers (y worker.py) alimentan el mismo digest y el
+  mismo auto no se cuenta dos veces aunque lo vean dos workers.
+- El estado se guarda en binario: float32 por centroide y uint32 por id.
+"""
+import asyncio
+import bisect
+import math
+import struct
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+from dedup import title_tokens
+from logs import get_logger
+from metrics import REGISTRY
+from scoring import YEAR_BAND_WIDTH, get_km_cluster
+
+log = get_logger("market")
+
+COMPRESSION = 100     # más = más centroides y cuantiles más precisos
+BUFFER_SIZE = 256     # valores sin compactar antes de compactar
+SEEN_MAX = 5000       # ids recordados por segmento
+STATE_TTL = 180 * 24 * 3600
+MAX_MODELS = 1000     # modelos en memoria por proceso
+
+OBSERVATIONS = REGISTRY.counter(
+    "autitos_market_observations_total", "Publicaciones vistas por las estadísticas de mercado",
+    ("result",),
+)
+BASELINES = REGISTRY.counter(
+    "autitos_price_baseline_total", "Autos puntuados contra el mercado o sólo contra la búsqueda",
+    ("baseline",),
+)
+
+
+class TDigest:
+    """
+    t-digest con compactación por merge (escala k1). Acepta valores sueltos,
+    se combina con otro digest y responde cuantiles y CDF aproximados, con
+    más precisión en las colas.
+    """
+
+    __slots__ = ("compression", "means", "weights", "min", "max", "_total", "_buffer", "_centers", "_summary")
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.min = math.inf
+        self.max = -math.inf
+        self._total = 0.0
+        self._buffer = []
+        self._centers = None  # peso acumulado al centro de cada centroide
+        self._summary = None  # (mediana, IQR)
+
+    @property
+    def count(self):
+        return self._total + len(self._buffer)
+
+    def add(self, value):
+        self._buffer.append(value)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self._summary = None
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._compress(list(zip(other.means, other.weights)))
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k):
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self, extra=()):
+        if not self._buffer and not extra and self._centers is not None:
+            return
+        items = sorted([*zip(self.means, self.weights), *((v, 1.0) for v in self._buffer), *extra])
+        self._buffer = []
+        self._summary = None
+        means, weights = [], []
+        if items:
+            total = sum(w for _, w in items)
+            done = 0.0
+            limit = self._k_inverse(self._k(0.0) + 1) * total
+            mean, weight = items[0]
+            for value, w in items[1:]:
+                if done + weight + w <= limit:
+                    weight += w
+                    mean += (value - mean) * w / weight
+                else:
+                    means.append(mean)
+                    weights.append(weight)
+                    done += weight
+                    limit = self._k_inverse(self._k(done / total) + 1) * total
+                    mean, weight = value, w
+            means.append(mean)
+            weights.append(weight)
+        self.means, self.weights = means, weights
+        self._total = sum(weights)
+        centers, done = [], 0.0
+        for w in weights:
+            centers.append(done + w / 2)
+            done += w
+        self._centers = centers
+
+    def quantile(self, q):
+        self._compress()
+        if not self.means:
+            return None
+        total = self._total
+        target = q * total
+        centers = self._centers
+        if target <= centers[0]:
+            # Entre el mínimo y el centro del primer centroide
+            return self.min + (self.means[0] - self.min) * (target / centers[0] if centers[0] else 1.0)
+        if target >= centers[-1]:
+            tail = total - centers[-1]
+            return self.means[-1] + (self.max - self.means[-1]) * ((target - centers[-1]) / tail if tail else 0.0)
+        i = bisect.bisect_right(centers, target)
+        lo, hi = centers[i - 1], centers[i]
+        return self.means[i - 1] + (self.means[i] - self.means[i - 1]) * (target - lo) / (hi - lo)
+
+    def cdf(self, value):
+        """
+        Fracción (0-1) de lo visto por debajo de `value`.
+        """
+        self._compress()
+        if not self.means:
+            return None
+        if value <= self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        total = self._total
+        means, centers = self.means, self._centers
+        if value <= means[0]:
+            span = means[0] - self.min
+            return centers[0] * ((value - self.min) / span if span else 1.0) / total
+        if value >= means[-1]:
+            span = self.max - means[-1]
+            tail = total - centers[-1]
+            return (centers[-1] + tail * ((value - means[-1]) / span if span else 0.0)) / total
+        i = bisect.bisect_right(means, value)
+        lo, hi = means[i - 1], means[i]
+        if hi == lo:
+            return centers[i] / total
+        return (centers[i - 1] + (centers[i] - centers[i - 1]) * (value - lo) / (hi - lo)) / total
+
+    def summary(self):
+        """
+        (mediana, IQR), calculados una vez por cada cambio del digest.
+        """
+        if self._summary is None:
+            self._summary = (self.quantile(0.5), self.quantile(0.75) - self.quantile(0.25))
+        return self._summary
+
+    def to_bytes(self):
+        self._compress()
+        header = struct.pack("<HIdd", self.compression, len(self.means), self.min, self.max)
+        return header + array("f", self.means).tobytes() + array("f", self.weights).tobytes()
+
+    @classmethod
+    def from_bytes(cls, body, offset=0):
+        """
+        (digest, offset siguiente).
+        """
+        compression, n, low, high = struct.unpack_from("<HIdd", body, offset)
+        offset += struct.calcsize("<HIdd")
+        means, weights = array("f"), array("f")
+        means.frombytes(body[offset:offset + 4 * n])
+        weights.frombytes(body[offset + 4 * n:offset + 8 * n])
+        digest = cls(compression)
+        digest.means, digest.weights = means.tolist(), weights.tolist()
+        digest.min, digest.max = low, high
+        digest._compress()
+        return digest, offset + 8 * n
+
+
+class Segment:
+    """
+    Digest de un segmento más los ids (hash de 32 bits) ya contados.
+    """
+
+    __slots__ = ("digest", "seen", "_seen_set")
+
+    def __init__(self, digest=None, seen=None):
+        self.digest = digest or TDigest()
+        self.seen = seen if seen is not None else array("I")
+        self._seen_set = set(self.seen)
+
+    def add(self, id_hash, price):
+        if id_hash in self._seen_set:
+            return False
+        self.digest.add(price)
+        self.seen.append(id_hash)
+        self._seen_set.add(id_hash)
+        if len(self.seen) > SEEN_MAX:
+            # Se olvidan los más viejos; si reaparecen cuentan de nuevo
+            forgotten = self.seen[:len(self.seen) - SEEN_MAX // 2]
+            del self.seen[:len(forgotten)]
+            self._seen_set.difference_update(forgotten)
+        return True
+
+
+def model_key(car):
+    # Marca y modelo: "VW Gol Trend 1.6" y "Volkswagen Gol 1.4" son el mismo
+    tokens = title_tokens(car.get("title"))
+    return " ".join(tokens[:2]) if len(tokens) >= 2 else ""
+
+
+def segment_key(car):
+    year = car.get("year")
+    band = f"{year // YEAR_BAND_WIDTH * YEAR_BAND_WIDTH}" if year else "?"
+    return f"{band}|{get_km_cluster(car.get('km'))}"
+
+
+def id_hash(car):
+    return zlib.crc32(str(car.get("id") or car.get("url") or "").encode())
+
+
+def encode_model(segments):
+    parts = [struct.pack("<H", len(segments))]
+    for key, segment in segments.items():
+        name = key.encode()
+        parts.append(struct.pack("<B", len(name)) + name)
+        parts.append(segment.digest.to_bytes())
+        parts.append(struct.pack("<I", len(segment.seen)) + segment.seen.tobytes())
+    return b"".join(parts)
+
+
+def decode_model(body):
+    segments = {}
+    (n,), offset = struct.unpack_from("<H", body), 2
+    for _ in range(n):
+        size = body[offset]
+        key = body[offset + 1:offset + 1 + size].decode()
+        digest, offset = TDigest.from_bytes(body, offset + 1 + size)
+        (n_seen,) = struct.unpack_from("<I", body, offset)
+        seen = array("I")
+        seen.frombytes(body[offset + 4:offset + 4 + 4 * n_seen])
+        offset += 4 + 4 * n_seen
+        segments[key] = Segment(digest, seen)
+    return segments
+
+
+class MarketStats:
+    def __init__(self, shared, min_count=30, refresh_interval=60.0, flush_interval=30.0):
+        self.shared = shared
+        self.min_count = min_count  # con menos publicaciones se puntúa contra la búsqueda
+        self.refresh_interval = refresh_interval
+        self.flush_interval = flush_interval
+        self._views = OrderedDict()  # modelo -> (leído en, {segmento: Segment})
+        self._pending = {}           # modelo -> {segmento: {id_hash: precio}}
+        self._task = None
+
+    def _key(self, model):
+        return "market:" + model
+
+    async def _load(self, model):
+        try:
+            found = await self.shared.get(self._key(model))
+            return decode_model(found[0]) if found is not None else {}
+        except Exception as e:
+            log.warning("mercado: estado de %r ilegible: %s", model, e)
+            return {}
+
+    async def prepare(self, cars):
+        """
+        Trae del cache compartido el estado de los modelos de `cars` cuyo
+        estado en este proceso tiene más de refresh_interval. Va antes de
+        baseline/observe.
+        """
+        now = time.time()
+        stale = []
+        for model in {model_key(car) for car in cars}:
+            view = self._views.get(model)
+            if view is not None and now - view[0] < self.refresh_interval:
+                self._views.move_to_end(model)
+            elif model:
+                stale.append(model)
+        loaded = await asyncio.gather(*(self._load(model) for model in stale))
+        for model, segments in zip(stale, loaded):
+            # Lo pendiente de este proceso todavía no está en el estado compartido
+            self._apply(segments, self._pending.get(model, {}))
+            self._views[model] = (time.time(), segments)
+            self._views.move_to_end(model)
+        while len(self._views) > MAX_MODELS:
+            self._views.popitem(last=False)
+
+    @staticmethod
+    def _apply(segments, pending):
+        for key, prices in pending.items():
+            segment = segments.setdefault(key, Segment())
+            for h, price in prices.items():
+                segment.add(h, price)
+
+    def observe(self, cars):
+        """
+        Suma los autos de una búsqueda en vivo (precio en USD) a los digests
+        de su modelo. Va después de puntuarlos.
+        """
+        new = seen = 0
+        for car in cars:
+            price = car.get("priceUSD") or 0
+            model = model_key(car)
+            if price <= 0 or not model:
+                continue
+            view = self._views.get(model)
+            if view is None:
+                view = self._views[model] = (time.time(), {})
+            key, h = segment_key(car), id_hash(car)
+            if view[1].setdefault(key, Segment()).add(h, float(price)):
+                self._pending.setdefault(model, {}).setdefault(key, {})[h] = float(price)
+                new += 1
+            else:
+                seen += 1
+        OBSERVATIONS.inc(new, result="new")
+        OBSERVATIONS.inc(seen, result="seen")
+
+    def baseline(self):
+        """
+        car -> TDigest del segmento del modelo del auto, o None si hay menos
+        de min_count publicaciones (ver score_cars).
+        """
+        def lookup(car):
+            view = self._views.get(model_key(car))
+            segment = view[1].get(segment_key(car)) if view is not None else None
+            if segment is None or segment.digest.count < self.min_count:
+                BASELINES.inc(baseline="search")
+                return None
+            BASELINES.inc(baseline="market")
+            return segment.digest
+
+        return lookup
+
+    async def flush(self):
+        """
+        Suma lo pendiente al estado compartido, un modelo a la vez con su lock.
+        Los modelos con el lock tomado quedan para la próxima vuelta.
+        """
+        for model in list(self._pending):
+            try:
+                await self._flush_model(model)
+            except Exception as e:
+                # Cache compartido caído o bloqueado: lo pendiente sigue para la próxima vuelta
+                log.warning("mercado: no se pudo guardar %r: %s", model, e)
+
+    async def _flush_model(self, model):
+        lock_key = "lock:" + self._key(model)
+        token = await self.shared.try_lock(lock_key, 10)
+        if token is None:
+            return
+        pending = self._pending.pop(model)
+        try:
+            segments = await self._load(model)
+            self._apply(segments, pending)
+            await self.shared.set(self._key(model), encode_model(segments), STATE_TTL)
+            # Lo observado mientras se guardaba sigue pendiente
+            self._apply(segments, self._pending.get(model, {}))
+            self._views[model] = (time.time(), segments)
+        except Exception:
+            for key, prices in pending.items():
+                self._pending.setdefault(model, {}).setdefault(key, {}).update(prices)
+            raise
+        finally:
+            await self.shared.unlock(lock_key, token)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("mercado: error en el guardado periódico: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "models": len(self._views),
+            "segments": sum(len(view[1]) for view in self._views.values()),
+            "pending": sum(len(p) for segs in self._pending.values() for p in segs.values()),
+        }
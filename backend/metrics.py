@@ -0,0 +1,254 @@
+"""
+Instrumentación del backend: tiempos por etapa y métricas para /metrics.
+
+- stage("ml.items") mide un bloque (sync o async). El tiempo va al histograma
+  autitos_stage_seconds y, si hay un request en curso, a su RequestTiming,
+  que TimingMiddleware devuelve en el header Server-Timing.
+- El request en curso viaja en un contextvar: las tareas creadas durante el
+  request (fan-out, batches de /items, single-flight) lo heredan solas.
+- Counter / Gauge / Histogram / callbacks en un registro en memoria, exportado en el
+  formato de texto de Prometheus. Son por proceso.
+"""
+import bisect
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Buckets en segundos: de 5 ms (lookup en memoria) a 30 s (deadline largo)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[tuple(labels.get(name, "") for name in self.labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts por bucket..., +Inf, suma]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                yield self.name + "_bucket", labels, cumulative
+            base = _format_labels(self.labels, key)
+            yield self.name + "_sum", base, round(series[-1], 6)
+            yield self.name + "_count", base, cumulative
+
+
+class Callback:
+    """
+    Métrica leída al exportar: `collect()` devuelve [(labels dict, valor)].
+    Para lo que ya cuentan otros componentes (cache, breakers, upstreams).
+    """
+
+    def __init__(self, name, help, kind, labels, collect):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            if value is None:
+                continue
+            key = tuple(labels.get(name, "") for name in self.labels)
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, kind, labels, collect):
+        return self._add(Callback(name, help, kind, labels, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "autitos_request_duration_seconds", "Duración de los requests HTTP", ("route", "method", "status"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "autitos_stage_seconds", "Duración de cada etapa de una búsqueda", ("stage",),
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "autitos_upstream_request_seconds", "Latencia de cada intento contra un upstream", ("host",),
+)
+
+
+class RequestTiming:
+    """
+    Etapas medidas durante un request, en orden de primera aparición.
+    Las que se repiten (batches de /items, páginas) se acumulan.
+    """
+    __slots__ = ("start", "stages")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}  # nombre -> [total s, veces, máx s]
+
+    def add(self, name, seconds):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [seconds, 1, seconds]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+            entry[2] = max(entry[2], seconds)
+
+    def server_timing(self):
+        parts = []
+        for name, (total, count, longest) in self.stages.items():
+            part = f"{name.replace('.', '-')};dur={total * 1000:.1f}"
+            if count > 1:
+                # Las repetidas corren en paralelo: la suma no es tiempo de pared
+                part += f';desc="{count}x, max {longest * 1000:.1f}ms"'
+            parts.append(part)
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current_timing():
+    return _current.get()
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class TimingMiddleware:
+    """
+    Middleware ASGI: abre un RequestTiming por request HTTP, agrega el header
+    Server-Timing al empezar la respuesta y observa la duración total por
+    ruta. En respuestas streaming el header sale antes de las etapas, así
+    que sólo lleva las previas al primer byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - timing.start,
+                route=getattr(route, "path", "otra"),
+                method=scope["method"],
+                status=status,
+            )
@@ -0,0 +1,164 @@
+"""
+Refresco incremental de las búsquedas de MercadoLibre.
+
+Por query se guarda lo último que se vio de cada publicación: el resultado
+de /search recortado a lo que usa parse_ml_item y los atributos de /items
+(año, km). Con eso, cuando vence la búsqueda cacheada no hace falta volver a
+pedir /items de todo:
+
+- delta: páginas ordenadas de la publicación más nueva a la más vieja hasta
+  llegar a una que termina en publicaciones conocidas. /items sólo para las
+  nuevas o las que cambiaron de precio; el resto sale del estado guardado.
+- completo: la primera vez y cada `full_every` refrescos se recorren todas
+  las páginas en el orden normal, también pidiendo /items sólo de lo nuevo o
+  cambiado. Las conocidas que ya no aparecen se marcan como removidas y
+  dejan de salir en los resultados.
+
+El estado vive en el SharedCache (lo ven todos los workers y worker.py).
+"""
+import time
+
+import orjson
+
+from logs import get_logger
+
+log = get_logger("ml_delta")
+
+# Campos de /search que usa parse_ml_item
+ITEM_FIELDS = (
+    "id", "title", "price", "currency_id", "permalink",
+    "thumbnail", "thumbnail_id", "secure_thumbnail", "address",
+)
+REMOVED_KEEP = 24 * 3600  # segundos que se recuerda una publicación removida
+
+
+def slim_item(item):
+    return {field: item[field] for field in ITEM_FIELDS if field in item}
+
+
+def slim_attributes(body):
+    # Sólo año y km: el resto del body de /items no se usa
+    kept = []
+    for att in body.get("attributes") or []:
+        name = (att.get("name") or "").lower()
+        if "año" in name or "kilómetro" in name or "kilometro" in name:
+            kept.append({"name": att.get("name"), "value_name": att.get("value_name")})
+    return kept
+
+
+class KnownListings:
+    """
+    Publicaciones conocidas de una query, en el orden en que se devuelven.
+    entries: id -> {"item", "attrs", "seen", "removed"}. attrs es None si
+    /items falló (se vuelve a pedir); removed, la fecha o None.
+    """
+
+    def __init__(self, entries=None, since_full=0):
+        self.entries = entries or {}
+        self.since_full = since_full  # refrescos delta desde el último completo
+
+    @classmethod
+    def from_bytes(cls, body):
+        state = orjson.loads(body)
+        return cls(state["entries"], state["since_full"])
+
+    def to_bytes(self):
+        return orjson.dumps({"entries": self.entries, "since_full": self.since_full})
+
+    def is_known(self, item_id):
+        entry = self.entries.get(item_id)
+        return entry is not None and entry["removed"] is None
+
+    def needs_items(self, item):
+        """
+        True si hay que pedir /items: publicación nueva, con otro precio o
+        sin atributos.
+        """
+        entry = self.entries.get(item.get("id"))
+        if entry is None or entry["attrs"] is None:
+            return True
+        known = entry["item"]
+        return known.get("price") != item.get("price") or known.get("currency_id") != item.get("currency_id")
+
+    def apply(self, results, attrs_map, full, now=None):
+        """
+        Incorpora lo que se acaba de ver. Devuelve (nuevas, cambiadas,
+        removidas). Las vistas quedan primero, en el orden de `results`.
+        """
+        now = now or time.time()
+        seen = {}
+        new = changed = removed = 0
+        for item in results:
+            item_id = item.get("id")
+            if not item_id or item_id in seen:
+                continue
+            entry = self.entries.get(item_id)
+            if entry is None:
+                new += 1
+            elif self.needs_items(item):
+                changed += 1
+            body = attrs_map.get(item_id)
+            if body is not None:
+                attrs = slim_attributes(body)
+            elif entry is not None and not self.needs_items(item):
+                attrs = entry["attrs"]
+            else:
+                attrs = None
+            seen[item_id] = {"item": slim_item(item), "attrs": attrs, "seen": now, "removed": None}
+
+        rest = {}
+        for item_id, entry in self.entries.items():
+            if item_id in seen:
+                continue
+            if entry["removed"] is not None:
+                if now - entry["removed"] < REMOVED_KEEP:
+                    rest[item_id] = entry
+                continue
+            if full:
+                # No apareció en una pasada completa: ya no está publicada
+                entry = {**entry, "removed": now}
+                removed += 1
+            rest[item_id] = entry
+
+        self.entries = {**seen, **rest}
+        self.since_full = 0 if full else self.since_full + 1
+        return new, changed, removed
+
+    def results(self, limit):
+        """
+        (resultados de /search, {id: body de /items}) de las publicaciones
+        activas, con el mismo formato que arma una búsqueda completa.
+        """
+        items, attrs_map = [], {}
+        for item_id, entry in self.entries.items():
+            if entry["removed"] is not None:
+                continue
+            if len(items) >= limit:
+                break
+            items.append(entry["item"])
+            attrs_map[item_id] = {"attributes": entry["attrs"] or []}
+        return items, attrs_map
+
+
+class KnownListingsStore:
+    def __init__(self, shared, ttl=7 * 24 * 3600):
+        self.shared = shared
+        self.ttl = ttl
+
+    def _key(self, query, pages):
+        return f"ml:known:{pages}:{' '.join(query.lower().split())}"
+
+    async def load(self, query, pages):
+        try:
+            found = await self.shared.get(self._key(query, pages))
+            return KnownListings.from_bytes(found[0]) if found is not None else None
+        except Exception as e:
+            # Estado ilegible o cache caído: se hace una pasada completa
+            log.warning("ML delta: estado de %r no disponible: %s", query, e)
+            return None
+
+    async def save(self, query, pages, known):
+        try:
+            await self.shared.set(self._key(query, pages), known.to_bytes(), self.ttl)
+        except Exception as e:
+            log.warning("ML delta: no se pudo guardar el estado de %r: %s", query, e)
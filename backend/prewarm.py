@@ -0,0 +1,252 @@
+"""
+Pre-calentado de búsquedas populares.
+
+HotQueries cuenta los hits de /api/cars por (query normalizada, pages,
+fuentes) en un ranking con decaimiento que comparten los workers y worker.py.
+Prewarmer recorre periódicamente la lista de búsquedas calientes (las fijas
+de configuración más las N más pedidas), re-crawlea las que están por vencer
+en el cache y las deja precalculadas, espaciando cada búsqueda con jitter y
+frenando cuando un upstream responde 429.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+from logs import get_logger
+from search_cache import normalize_query
+
+log = get_logger("prewarm")
+
+ALL_SOURCES = ("kavak", "mercadolibre", "v6")
+HOT_QUERIES_KEY = "prewarm:hot_queries"
+HOT_QUERIES_TTL = 30 * 24 * 3600
+
+
+class HotQueries:
+    """
+    Ranking de búsquedas pedidas, compartido por todos los workers.
+
+    Cada proceso junta sus hits y cada `save_interval` los suma, bajo un
+    lock, al ranking del SharedCache. Los puntajes decaen a la mitad cada
+    `half_life` segundos y sólo se guardan las `max_tracked` mejores, así una
+    query que se pidió una vez hace un mes no ocupa lugar para siempre. El
+    JSON en `path` es una copia del ranking para arrancar con algo si el
+    cache compartido está vacío (p.ej. backend en memoria tras un reinicio).
+    """
+
+    def __init__(self, shared, path=None, save_interval=60.0, max_tracked=200, half_life=24 * 3600):
+        self.shared = shared
+        self.path = path
+        self.save_interval = save_interval
+        self.max_tracked = max_tracked
+        self.half_life = half_life
+        self.counts = {}    # (query, pages, sources) -> puntaje, el último ranking leído
+        self._pending = {}  # hits de este proceso todavía no sumados
+        self._task = None
+
+    def hit(self, query, pages, sources):
+        key = (normalize_query(query), pages, tuple(sorted(sources)))
+        # Tope de queries distintas entre guardados: las nuevas esperan al siguiente
+        if key in self._pending or len(self._pending) < self.max_tracked * 5:
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def top(self, n):
+        scores = dict(self.counts)
+        for key, hits in self._pending.items():
+            scores[key] = scores.get(key, 0) + hits
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [key for key, _ in ranked[:n]]
+
+    @staticmethod
+    def _encode(counts, updated_at):
+        return json.dumps({
+            "updated_at": updated_at,
+            "queries": [
+                {"query": q, "pages": p, "sources": list(s), "hits": hits}
+                for (q, p, s), hits in counts.items()
+            ],
+        }).encode()
+
+    @staticmethod
+    def _decode(body):
+        state = json.loads(body)
+        if isinstance(state, list):  # formato viejo del archivo: sin fecha
+            state = {"updated_at": time.time(), "queries": state}
+        counts = {
+            (row["query"], row["pages"], tuple(sorted(row["sources"]))): row["hits"]
+            for row in state["queries"]
+        }
+        return counts, state["updated_at"]
+
+    def _read_file(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                return self._decode(f.read())
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("no se pudo leer %s: %s", self.path, e)
+            return None
+
+    def _write_file(self, body):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, self.path)
+
+    async def _read(self):
+        found = await self.shared.get(HOT_QUERIES_KEY)
+        if found is not None:
+            return self._decode(found[0])
+        return await asyncio.to_thread(self._read_file)
+
+    async def refresh(self):
+        """
+        Trae el ranking compartido sin sumar nada (worker.py).
+        """
+        state = await self._read()
+        if state is not None:
+            self.counts = state[0]
+
+    async def save(self):
+        """
+        Suma los hits pendientes al ranking compartido, con decaimiento y
+        tope, y se queda con el resultado.
+        """
+        token = await self.shared.try_lock("lock:" + HOT_QUERIES_KEY, 10)
+        if token is None:
+            # Otro worker está guardando: lo pendiente va en la próxima vuelta
+            await self.refresh()
+            return
+        try:
+            now = time.time()
+            counts, updated_at = await self._read() or ({}, now)
+            factor = 0.5 ** (max(0.0, now - updated_at) / self.half_life)
+            counts = {key: hits * factor for key, hits in counts.items()}
+            pending, self._pending = self._pending, {}
+            for key, hits in pending.items():
+                counts[key] = counts.get(key, 0) + hits
+            ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+            counts = {key: round(hits, 3) for key, hits in ranked[:self.max_tracked] if hits >= 0.01}
+            body = self._encode(counts, now)
+            try:
+                await self.shared.set(HOT_QUERIES_KEY, body, HOT_QUERIES_TTL)
+            except Exception:
+                for key, hits in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + hits
+                raise
+            self.counts = counts
+            if self.path:
+                await asyncio.to_thread(self._write_file, body)
+        finally:
+            await self.shared.unlock("lock:" + HOT_QUERIES_KEY, token)
+
+    async def _save_loop(self):
+        while True:
+            try:
+                await self.save()
+            except Exception as e:
+                log.warning("no se pudo guardar el ranking de búsquedas: %s", e)
+            await asyncio.sleep(self.save_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._save_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await self.save()
+            except Exception as e:
+                log.warning("no se pudo guardar el ranking de búsquedas: %s", e)
+
+
+def parse_static_queries(spec, pages=3):
+    """
+    "gol trend, onix ,208" -> [("gol trend", 3, todas las fuentes), ...]
+    """
+    return [
+        (normalize_query(q), pages, ALL_SOURCES)
+        for q in (spec or "").split(",") if q.strip()
+    ]
+
+
+class Prewarmer:
+    def __init__(self, crawl, is_fresh, hot_queries, static_queries=(), top_n=20,
+                 interval=600.0, pace=5.0, max_pace=120.0, reload_hot_queries=False):
+        # crawl(query, pages, sources) -> dict de status por fuente
+        # is_fresh(query, pages, sources, horizon) -> True si no hace falta refrescar
+        self.crawl = crawl
+        self.is_fresh = is_fresh
+        self.hot_queries = hot_queries
+        self.static_queries = list(static_queries)
+        self.top_n = top_n
+        self.interval = interval
+        self.base_pace = pace
+        self.pace = pace
+        self.max_pace = max_pace
+        self.reload_hot_queries = reload_hot_queries
+        self._task = None
+
+    async def targets(self):
+        if self.reload_hot_queries:
+            try:
+                await self.hot_queries.refresh()
+            except Exception as e:
+                log.warning("no se pudo leer el ranking de búsquedas: %s", e)
+        seen = set()
+        targets = []
+        for target in self.static_queries + self.hot_queries.top(self.top_n):
+            if target not in seen:
+                seen.add(target)
+                targets.append(target)
+        return targets
+
+    def _sleep_time(self):
+        # Jitter de ±50% para no pegarle a los upstreams en ráfagas regulares
+        return self.pace * random.uniform(0.5, 1.5)
+
+    def _adjust_pace(self, statuses):
+        rate_limited = any("429" in (s.get("error") or "") for s in statuses.values())
+        if rate_limited:
+            self.pace = min(self.pace * 2, self.max_pace)
+            log.warning("rate limit detectado, pausa entre búsquedas: %.0fs", self.pace)
+        else:
+            self.pace = max(self.base_pace, self.pace / 2)
+
+    async def run_round(self):
+        crawled = 0
+        for query, pages, sources in await self.targets():
+            if await self.is_fresh(query, pages, sources, self.interval):
+                continue
+            try:
+                statuses = await self.crawl(query, pages, sources)
+                self._adjust_pace(statuses)
+                crawled += 1
+            except Exception as e:
+                log.error("error en '%s': %s", query, e)
+            await asyncio.sleep(self._sleep_time())
+        return crawled
+
+    async def run_forever(self):
+        while True:
+            start = time.monotonic()
+            crawled = await self.run_round()
+            log.info("ronda terminada: %d búsquedas refrescadas", crawled)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - start)) + random.uniform(0, self.pace))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
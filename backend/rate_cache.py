@@ -0,0 +1,96 @@
+"""
+Cache de proceso para la cotización del dólar.
+
+- Sirve el valor cacheado al instante mientras esté fresco (TTL configurable).
+- Cuando queda viejo lo sigue sirviendo y refresca en segundo plano
+  (stale-while-revalidate).
+- Refrescos concurrentes se unen en un único llamado al upstream.
+- Si el upstream falla se sirve el último valor bueno; el default fijo sólo
+  se usa si nunca se obtuvo un valor.
+- Con un SharedCache el refresco pasa primero por ahí: si otro worker ya
+  trajo la cotización se usa ésa (con su antigüedad real) y, si no, uno solo
+  va a bluelytics mientras los demás esperan.
+"""
+import asyncio
+import time
+
+from logs import get_logger
+
+log = get_logger("rate")
+
+
+class RateCache:
+    def __init__(self, fetcher, ttl, default, error_backoff=30.0, shared=None, shared_key="rate:dollar"):
+        # fetcher: corrutina sin argumentos que devuelve la cotización o lanza
+        self.fetcher = fetcher
+        self.shared = shared
+        self.shared_key = shared_key
+        self.ttl = ttl
+        self.default = default
+        self.error_backoff = error_backoff
+        self.value = None
+        self.fetched_at = None       # time.time() del último valor bueno
+        self.last_error_at = None    # time.monotonic() del último fallo
+        self._inflight = None
+
+    def _age(self):
+        return time.time() - self.fetched_at if self.fetched_at else None
+
+    def _info(self, source):
+        age = self._age()
+        return {
+            "value": self.value if self.value is not None else self.default,
+            "source": source,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "fetched_at": self.fetched_at,
+        }
+
+    async def _do_refresh(self):
+        try:
+            if self.shared is not None:
+                value, fetched_at, _, _ = await self.shared.get_or_fetch(
+                    self.shared_key, self.fetcher, self.ttl, lock_ttl=self.error_backoff,
+                )
+            else:
+                value, fetched_at = await self.fetcher(), time.time()
+            self.value = float(value)
+            self.fetched_at = fetched_at
+            self.last_error_at = None
+            return True
+        except Exception as e:
+            log.warning("error al obtener cotización del dólar: %s", e)
+            self.last_error_at = time.monotonic()
+            return False
+        finally:
+            self._inflight = None
+
+    def _refresh(self):
+        # Single-flight: todos los que piden refresco esperan la misma tarea
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._do_refresh())
+        return self._inflight
+
+    def _in_backoff(self):
+        return (
+            self.last_error_at is not None
+            and time.monotonic() - self.last_error_at < self.error_backoff
+        )
+
+    async def get(self):
+        """
+        Devuelve {"value", "source", "age_seconds", "fetched_at"}.
+        source: "upstream" | "cache" | "stale" | "last-good" | "default".
+        """
+        if self.value is None:
+            if self._in_backoff():
+                return self._info("default")
+            ok = await asyncio.shield(self._refresh())
+            return self._info("upstream" if ok else "default")
+
+        if self._age() < self.ttl:
+            return self._info("cache")
+
+        if self._in_backoff():
+            return self._info("last-good")
+        self._refresh()
+        return self._info("stale")
@@ -0,0 +1,55 @@
+"""
+Respuestas JSON serializadas con orjson.
+
+Devolver un JSONResponse directamente evita que FastAPI pase el contenido por
+jsonable_encoder (que recorre y copia cada auto); orjson serializa los
+Listing (dataclasses), dicts y floats de NumPy de forma nativa.
+
+Las rutas de datos llevan ETag débil (mismo contenido = mismo ETag, con
+cualquier encoding) y, si el cliente ya lo tiene, not_modified responde 304
+antes de armar o serializar nada.
+"""
+import hashlib
+
+import orjson
+from starlette.responses import Response
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content):
+    return orjson.dumps(content, default=str, option=ORJSON_OPTIONS)
+
+
+class JSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def make_etag(*parts):
+    raw = "|".join(str(part) for part in parts).encode()
+    return f'W/"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    """
+    Comparación débil contra If-None-Match (lista de ETags o "*").
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def not_modified(request, headers):
+    """
+    Response 304 si el ETag de `headers` coincide con If-None-Match, si no None.
+    """
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,273 @@
+"""
+Filtros, orden y paginado de /api/cars sobre el resultado cacheado.
+
+Un ResultView se arma una vez por resultado: pasa los autos a columnas NumPy
+y calcula (y memoiza) el orden de cada clave de sort. Filtrar es una máscara
+vectorizada sobre las columnas y cada página es un slice de los índices ya
+ordenados; nunca se re-ordena la lista completa por request.
+
+El cursor es opaco (base64 de offset + huella de filtros/orden + versión del
+resultado), así una página siguiente nunca mezcla resultados de otra búsqueda
+o de un crawl distinto. La versión es un hash del contenido: un crawl que
+trae exactamente lo mismo conserva cursores y ETags.
+"""
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from responses import dumps
+
+# Campos que usa la card del frontend; fields=full devuelve todos
+CARD_FIELDS = (
+    "id", "title", "price", "priceUSD", "originalPrice", "currency", "year",
+    "km", "location", "image", "url", "urls", "priceScore", "source",
+)
+SCORE_ORDER = ("muy-bueno", "bueno", "regular", "malo", "muy-malo")
+# clave -> (columna, descendente)
+SORT_KEYS = {
+    "relevance": None,
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "year_desc": ("year", True),
+    "year_asc": ("year", False),
+    "km_asc": ("km", False),
+    "km_desc": ("km", True),
+    "score": ("score", False),
+}
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+MAX_SELECTIONS = 32  # combinaciones filtro+orden memoizadas por resultado
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def content_hash(result):
+    """
+    Hash de lo que muestra un resultado: autos en orden, cotización y estado
+    de cada fuente (sin tiempos, que cambian en cada crawl).
+    """
+    sources = sorted(
+        (name, s.get("status"), s.get("count"), s.get("fallback")) for name, s in result["sources"].items()
+    )
+    raw = dumps([result["cars"], result["dollar_rate"], sources])
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def encode_cursor(offset, fingerprint):
+    raw = json.dumps({"o": offset, "f": fingerprint}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fingerprint):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("cursor inválido") from e
+    if data.get("f") != fingerprint or offset < 0:
+        raise InvalidCursor("el cursor no corresponde a esta búsqueda o los resultados cambiaron")
+    return offset
+
+
+def _split(value):
+    return tuple(sorted({v.strip() for v in (value or "").split(",") if v.strip()}))
+
+
+class Selection:
+    """
+    Filtros y orden pedidos. `None` en un rango = sin límite.
+    """
+    __slots__ = ("year", "km", "price", "sources", "scores", "sort")
+
+    def __init__(self, year_min=None, year_max=None, km_min=None, km_max=None,
+                 price_min=None, price_max=None, source=None, price_score=None, sort="relevance"):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort desconocido: {sort} (opciones: {', '.join(SORT_KEYS)})")
+        self.year = (year_min, year_max)
+        self.km = (km_min, km_max)
+        self.price = (price_min, price_max)
+        self.sources = _split(source)
+        self.scores = _split(price_score)
+        self.sort = sort
+
+    def key(self):
+        return (self.year, self.km, self.price, self.sources, self.scores, self.sort)
+
+
+class ResultView:
+    def __init__(self, result):
+        self.result = result
+        cars = result["cars"]
+        self.cars = cars
+        n = len(cars)
+        self.columns = {
+            "price": np.fromiter((car.get("priceUSD") or 0 for car in cars), dtype=np.float64, count=n),
+            # Año y km sin dato son NaN: cualquier cota de año o km los deja afuera
+            "year": np.fromiter((car.get("year") or np.nan for car in cars), dtype=np.float64, count=n),
+            "km": np.fromiter((np.nan if car.get("km") is None else car["km"] for car in cars), dtype=np.float64, count=n),
+            "score": np.fromiter(
+                (SCORE_ORDER.index(car["priceScore"]) if car.get("priceScore") in SCORE_ORDER else len(SCORE_ORDER)
+                 for car in cars), dtype=np.float64, count=n),
+        }
+        self.sources = np.array([car.get("source") or "" for car in cars], dtype=object)
+        self.labels = np.array([car.get("priceScore") or "" for car in cars], dtype=object)
+        self.etag_base = content_hash(result)
+        self.version = self.etag_base[:10]
+        self._orders = {}
+        self._selections = OrderedDict()
+
+    def order(self, sort):
+        """
+        Índices ordenados por `sort` (memoizado). Los valores faltantes van
+        siempre al final; el empate respeta el orden original.
+        """
+        order = self._orders.get(sort)
+        if order is None:
+            spec = SORT_KEYS[sort]
+            n = len(self.cars)
+            if spec is None:
+                order = np.arange(n)
+            else:
+                column, descending = spec
+                values = self.columns[column]
+                missing = np.isnan(values) | (values <= 0) if column in ("price", "year") else np.isnan(values)
+                keys = np.where(missing, 0, -values if descending else values)
+                order = np.lexsort((np.arange(n), keys, missing))
+            self._orders[sort] = order
+        return order
+
+    def _mask(self, selection):
+        mask = np.ones(len(self.cars), dtype=bool)
+        for column, (low, high) in (("year", selection.year), ("km", selection.km), ("price", selection.price)):
+            values = self.columns[column]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        # El precio sin dato nunca entra en un listado con rango de precio
+        if selection.price != (None, None):
+            mask &= self.columns["price"] > 0
+        if selection.sources:
+            mask &= np.isin(self.sources, selection.sources)
+        if selection.scores:
+            mask &= np.isin(self.labels, selection.scores)
+        return mask
+
+    def select(self, selection):
+        """
+        Índices (ordenados) de los autos que pasan los filtros. Memoizado por
+        combinación de filtros, así paginar es sólo un slice.
+        """
+        key = selection.key()
+        indices = self._selections.get(key)
+        if indices is None:
+            order = self.order(selection.sort)
+            indices = order[self._mask(selection)[order]]
+            self._selections[key] = indices
+            if len(self._selections) > MAX_SELECTIONS:
+                self._selections.popitem(last=False)
+        else:
+            self._selections.move_to_end(key)
+        return indices
+
+    def fingerprint(self, selection):
+        return hashlib.sha1(repr((self.version, selection.key())).encode()).hexdigest()[:16]
+
+    def page(self, selection, limit=DEFAULT_LIMIT, cursor=None, fields="card"):
+        indices = self.select(selection)
+        fingerprint = self.fingerprint(selection)
+        offset = decode_cursor(cursor, fingerprint) if cursor else 0
+        limit = max(1, min(limit, MAX_LIMIT))
+        chunk = indices[offset:offset + limit]
+        if fields == "full":
+            cars = [self.cars[i] for i in chunk]
+        else:
+            cars = [{f: self.cars[i][f] for f in CARD_FIELDS if f in self.cars[i]} for i in chunk]
+        end = offset + len(chunk)
+        prices = self.columns["price"][indices]
+        prices = prices[prices > 0]
+        return {
+            "cars": cars,
+            "total": int(len(indices)),
+            "stats": {
+                "minUSD": float(prices.min()) if len(prices) else None,
+                "avgUSD": round(float(prices.mean()), 1) if len(prices) else None,
+                "maxUSD": float(prices.max()) if len(prices) else None,
+            },
+            "offset": offset,
+            "next_cursor": encode_cursor(end, fingerprint) if end < len(indices) else None,
+            "prev_cursor": encode_cursor(max(0, offset - limit), fingerprint) if offset > 0 else None,
+        }
+
+    def summary(self, selection):
+        """
+        Estadísticas de los autos que pasan los filtros, para comparar
+        búsquedas entre sí (precios en USD; sin dato no cuenta).
+        """
+        indices = self.select(selection)
+        prices = self.columns["price"][indices]
+        prices = prices[prices > 0]
+        years = self.columns["year"][indices]
+        years = years[years > 0]
+        km = self.columns["km"][indices]
+        km = km[~np.isnan(km)]
+        labels, counts = np.unique(self.labels[indices], return_counts=True)
+        if len(prices):
+            p25, median, p75 = (float(v) for v in np.percentile(prices, (25, 50, 75)))
+        else:
+            p25 = median = p75 = None
+        return {
+            "total": int(len(indices)),
+            "priced": int(len(prices)),
+            "minUSD": float(prices.min()) if len(prices) else None,
+            "p25USD": p25,
+            "medianUSD": median,
+            "p75USD": p75,
+            "maxUSD": float(prices.max()) if len(prices) else None,
+            "avgUSD": round(float(prices.mean()), 1) if len(prices) else None,
+            "medianYear": float(np.median(years)) if len(years) else None,
+            "medianKm": float(np.median(km)) if len(km) else None,
+            "scores": {str(label): int(count) for label, count in zip(labels, counts) if label},
+        }
+
+
+def compare(summaries):
+    """
+    Comparación entre búsquedas a partir de sus summary(): orden por precio
+    mediano y cuánto más cara es cada una que la más barata.
+    """
+    priced = sorted((s["medianUSD"], query) for query, s in summaries.items() if s["medianUSD"])
+    cheapest = priced[0][0] if priced else None
+    return {
+        "by_median_usd": [query for _, query in priced],
+        "cheapest": priced[0][1] if priced else None,
+        "most_listings": max(summaries, key=lambda q: summaries[q]["total"]) if summaries else None,
+        "relative_median": {query: round(median / cheapest, 3) for median, query in priced},
+    }
+
+
+class ViewCache:
+    """
+    ResultView por clave de búsqueda. Se rearma sólo si el resultado cacheado
+    cambió (otro objeto: nuevo crawl o recargado del disco).
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._views = OrderedDict()
+
+    def get(self, key, result):
+        view = self._views.get(key)
+        if view is None or view.result is not result:
+            view = ResultView(result)
+            self._views[key] = view
+            if len(self._views) > self.max_entries:
+                self._views.popitem(last=False)
+        else:
+            self._views.move_to_end(key)
+        return view
@@ -0,0 +1,176 @@
+"""
+Motor de priceScore vectorizado.
+
+Los autos se cargan en columnas NumPy y se calculan estadísticas robustas
+(mediana, IQR, percentiles) por segmento = cluster de km × banda de años ×
+fuente, en una pasada vectorizada. Cada auto recibe:
+
+- priceScore: la etiqueta de siempre, pero contra la mediana del segmento.
+- pricePercentile: percentil del precio dentro del segmento (0-100).
+- priceZScore: z robusto, (precio - mediana) / (IQR / 1.349).
+
+Si el segmento tiene menos de MIN_SEGMENT_SIZE autos se usa el cluster de km
+completo (como antes), para no puntuar contra dos o tres autos.
+
+Con `market` (ver market_stats.py) los autos cuyo segmento ya tiene historia
+se comparan contra el digest de largo plazo del modelo, en precio USD, en vez
+de contra los demás autos de la búsqueda.
+"""
+import numpy as np
+
+KM_CLUSTERS = ("0-70k", "70k-140k", "140k-200k", "+200k", "desconocido")
+KM_EDGES = np.array([70000, 140000, 200000])
+YEAR_BAND_WIDTH = 3
+MIN_SEGMENT_SIZE = 5
+IQR_TO_SIGMA = 1.349
+
+# (ratio contra la mediana, etiqueta); por encima del último es "muy-malo"
+SCORE_THRESHOLDS = ((0.9, "muy-bueno"), (0.97, "bueno"), (1.03, "regular"), (1.1, "malo"))
+SCORE_LABELS = np.array([label for _, label in SCORE_THRESHOLDS] + ["muy-malo"])
+
+
+def get_km_cluster(km):
+    if km is None:
+        return "desconocido"
+    if km < 70000:
+        return "0-70k"
+    elif km < 140000:
+        return "70k-140k"
+    elif km < 200000:
+        return "140k-200k"
+    else:
+        return "+200k"
+
+
+def _columns(cars):
+    """
+    Pasa la lista de autos a columnas: precio, código de cluster de km,
+    banda de años y código de fuente.
+    """
+    n = len(cars)
+    prices = np.fromiter((car.get("price") or 0 for car in cars), dtype=np.float64, count=n)
+    km = np.fromiter((-1 if car.get("km") is None else car["km"] for car in cars), dtype=np.float64, count=n)
+    years = np.fromiter((car.get("year") or 0 for car in cars), dtype=np.int64, count=n)
+    _, source_codes = np.unique([car.get("source", "") for car in cars], return_inverse=True)
+
+    km_codes = np.searchsorted(KM_EDGES, km, side="right")
+    km_codes[km < 0] = len(KM_CLUSTERS) - 1
+    year_bands = np.where(years > 0, years // YEAR_BAND_WIDTH, 0)
+    return prices, km_codes, year_bands, source_codes.reshape(-1)
+
+
+def _group_stats(codes, prices):
+    """
+    Estadísticas por grupo en una pasada: ordena por (grupo, precio) y calcula
+    cuantiles con interpolación lineal sobre los índices de cada grupo.
+
+    Devuelve, alineado con la entrada: tamaño del grupo, mediana, IQR y el
+    percentil del precio dentro del grupo (empates cuentan la mitad).
+    """
+    n = len(prices)
+    order = np.lexsort((prices, codes))
+    sorted_codes = codes[order]
+    sorted_prices = prices[order]
+
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+
+    def quantile(q):
+        pos = starts + q * (sizes - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        return sorted_prices[lo] + (sorted_prices[hi] - sorted_prices[lo]) * (pos - lo)
+
+    median = quantile(0.5)
+    iqr = quantile(0.75) - quantile(0.25)
+
+    # Percentil: (menores + iguales / 2) / tamaño, vía searchsorted sobre una
+    # clave combinada (grupo, precio) que ya está ordenada
+    group_idx = np.repeat(np.arange(len(starts)), sizes)
+    key = group_idx * (sorted_prices.max() + 1.0) + sorted_prices
+    left = np.searchsorted(key, key, side="left")
+    right = np.searchsorted(key, key, side="right")
+    group_start = starts[group_idx]
+    group_size = sizes[group_idx]
+    percentile = ((left - group_start) + 0.5 * (right - left)) / group_size * 100.0
+
+    out_size = np.empty(n, dtype=np.int64)
+    out_median = np.empty(n)
+    out_iqr = np.empty(n)
+    out_pct = np.empty(n)
+    out_size[order] = group_size
+    out_median[order] = median[group_idx]
+    out_iqr[order] = iqr[group_idx]
+    out_pct[order] = percentile
+    return out_size, out_median, out_iqr, out_pct
+
+
+def _market_score(price, digest):
+    """
+    (etiqueta, percentil, z) de un precio USD contra un digest de mercado.
+    """
+    median, iqr = digest.summary()
+    ratio = price / median
+    label = next((label for threshold, label in SCORE_THRESHOLDS if ratio < threshold), "muy-malo")
+    scale = iqr / IQR_TO_SIGMA
+    return label, digest.cdf(price) * 100.0, (price - median) / scale if scale > 0 else 0.0
+
+
+def score_cars(cars, market=None):
+    """
+    Completa priceScore, pricePercentile y priceZScore sobre cada auto.
+    market(car) devuelve el digest de mercado del segmento del auto o None
+    (se puntúa contra la búsqueda).
+    """
+    if not cars:
+        return cars
+
+    prices, km_codes, year_bands, source_codes = _columns(cars)
+    valid = prices > 0
+
+    n_sources = int(source_codes.max()) + 1
+    year_span = int(year_bands.max()) + 1
+    segment_codes = (km_codes * year_span + year_bands) * n_sources + source_codes
+
+    # Los autos sin precio no participan de las estadísticas
+    idx = np.flatnonzero(valid)
+    labels = np.full(len(cars), "regular", dtype=SCORE_LABELS.dtype)
+    percentile = np.full(len(cars), np.nan)
+    zscore = np.full(len(cars), np.nan)
+
+    if len(idx):
+        p = prices[idx]
+        seg_size, seg_median, seg_iqr, seg_pct = _group_stats(segment_codes[idx], p)
+        km_size, km_median, km_iqr, km_pct = _group_stats(km_codes[idx], p)
+
+        use_segment = seg_size >= MIN_SEGMENT_SIZE
+        size = np.where(use_segment, seg_size, km_size)
+        median = np.where(use_segment, seg_median, km_median)
+        iqr = np.where(use_segment, seg_iqr, km_iqr)
+        pct = np.where(use_segment, seg_pct, km_pct)
+
+        ratio = p / median
+        thresholds = np.array([t for t, _ in SCORE_THRESHOLDS])
+        scored = SCORE_LABELS[np.searchsorted(thresholds, ratio, side="right")]
+        # Un auto solo en su grupo no tiene contra qué compararse
+        labels[idx] = np.where(size > 1, scored, "regular")
+
+        scale = iqr / IQR_TO_SIGMA
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(scale > 0, (p - median) / scale, 0.0)
+        percentile[idx] = np.where(size > 1, pct, np.nan)
+        zscore[idx] = np.where(size > 1, z, np.nan)
+
+    if market is not None:
+        for i in idx.tolist():
+            car = cars[i]
+            price = car.get("priceUSD") or 0
+            digest = market(car) if price > 0 else None
+            if digest is not None:
+                labels[i], percentile[i], zscore[i] = _market_score(price, digest)
+
+    for car, label, pct, z in zip(cars, labels.tolist(), percentile.tolist(), zscore.tolist()):
+        car["priceScore"] = label
+        car["pricePercentile"] = None if pct != pct else round(pct, 1)
+        car["priceZScore"] = None if z != z else round(z, 2)
+    return cars
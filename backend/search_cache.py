@@ -0,0 +1,217 @@
+"""
+Cache de resultados de /api/cars.
+
+- Clave: query normalizada + pages + flags de fuentes.
+- LRU acotado por memoria (tamaño aproximado = bytes del JSON).
+- TTL por fuente: una entrada vive lo que la fuente más volátil que incluye.
+- Segundo nivel opcional en un SharedCache (ver shared_cache.py): lo ven
+  todos los workers y worker.py, y con SQLite sobrevive reinicios.
+- Single-flight: N búsquedas idénticas concurrentes disparan un solo fetch,
+  dentro del proceso y, con cache compartido, también entre procesos.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+import orjson
+
+from logs import get_logger
+
+log = get_logger("search_cache")
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def make_key(query, pages, sources):
+    """
+    `sources` es el conjunto de fuentes pedidas, p.ej. {"mercadolibre", "v6"}.
+    """
+    return f"{normalize_query(query)}|pages={pages}|{','.join(sorted(sources))}"
+
+
+class CacheEntry:
+    __slots__ = ("value", "created_at", "expires_at", "size")
+
+    def __init__(self, value, created_at, expires_at, size):
+        self.value = value
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.size = size
+
+    def age(self):
+        return time.time() - self.created_at
+
+
+class SearchCache:
+    def __init__(self, max_bytes, shared=None, decode=None, lock_ttl=30.0):
+        # decode(value) rearma los objetos de un valor leído del cache compartido;
+        # lock_ttl: cuánto puede tardar un fetch antes de que otro proceso lo reintente
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.decode = decode
+        self.lock_ttl = lock_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    # --- memoria ---------------------------------------------------------
+
+    def _put(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._entries.pop(key)
+            self._bytes -= entry.size
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    # --- cache compartido ------------------------------------------------
+
+    def _shared_key(self, key):
+        return "search:" + key
+
+    def _decode(self, body):
+        value = orjson.loads(body)
+        return self.decode(value) if self.decode else value
+
+    async def _get_shared(self, key):
+        try:
+            found = await self.shared.get(self._shared_key(key))
+        except Exception as e:
+            log.warning("cache compartido no disponible: %s", e)
+            return None
+        if found is None:
+            return None
+        body, created_at, expires_at = found
+        try:
+            value = self._decode(body)
+        except (KeyError, TypeError, ValueError) as e:
+            # Entrada escrita por una versión anterior con otro formato
+            log.warning("entrada compartida ilegible, se ignora: %s", e)
+            return None
+        return CacheEntry(value, created_at, expires_at, len(body))
+
+    # --- API -------------------------------------------------------------
+
+    async def get(self, key):
+        entry = self._get_memory(key)
+        if entry is None and self.shared is not None:
+            entry = await self._get_shared(key)
+            if entry is not None:
+                self._put(key, entry)
+        return entry
+
+    async def set(self, key, value, ttl):
+        now = time.time()
+        body = orjson.dumps(value, default=str)
+        entry = CacheEntry(value, now, now + ttl, len(body))
+        self._put(key, entry)
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._shared_key(key), body, ttl)
+            except Exception as e:
+                log.warning("no se pudo escribir en el cache compartido: %s", e)
+        return entry
+
+    async def _fetch_shared(self, key, fetch, ttl_for):
+        """
+        Fetch con lock entre procesos: si otro worker ya está trayendo la
+        misma búsqueda se espera su resultado. Devuelve (value, status).
+        """
+        sizes = []  # el mismo body que se guarda mide el tamaño en memoria
+
+        def encode(value):
+            body = orjson.dumps(value, default=str)
+            sizes.append(len(body))
+            return body
+
+        def decode(body):
+            sizes.append(len(body))
+            return self._decode(body)
+
+        value, created_at, expires_at, status = await self.shared.get_or_fetch(
+            self._shared_key(key), fetch, ttl_for, lock_ttl=self.lock_ttl, encode=encode, decode=decode,
+        )
+        self._put(key, CacheEntry(value, created_at, expires_at, sizes[-1]))
+        # HIT o WAITED: lo trajo otro proceso
+        return value, "MISS" if status == "MISS" else "COALESCED"
+
+    def inflight(self, key):
+        """
+        Tarea de la búsqueda en curso para `key` o None. Su resultado es
+        (value, status) como el de start().
+        """
+        return self._inflight.get(key)
+
+    def start(self, key, fetch, ttl_for):
+        """
+        Arranca fetch() como la búsqueda en curso de `key` y devuelve su
+        tarea, sin esperarla: get_or_fetch se suma a ella mientras dura. La
+        tarea sigue aunque quien la arrancó deje de esperarla, y al terminar
+        deja el valor en el cache. Resultado: (value, "MISS" | "COALESCED").
+        """
+        async def run():
+            try:
+                if self.shared is not None:
+                    return await self._fetch_shared(key, fetch, ttl_for)
+                value = await fetch()
+                await self.set(key, value, ttl_for(value))
+                return value, "MISS"
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(run())
+        self._inflight[key] = task
+        return task
+
+    async def get_or_fetch(self, key, fetch, ttl_for):
+        """
+        Devuelve (value, status, age). status: "HIT" | "MISS" | "COALESCED".
+        `fetch` es una corrutina sin argumentos; `ttl_for(value)` da el TTL.
+        """
+        entry = await self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.value, "HIT", entry.age()
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.hits += 1
+            value, _ = await asyncio.shield(task)
+            return value, "COALESCED", 0.0
+
+        value, status = await asyncio.shield(self.start(key, fetch, ttl_for))
+        if status == "MISS":
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, status, 0.0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
@@ -0,0 +1,264 @@
+"""
+Cache compartido entre procesos (workers de gunicorn/uvicorn y worker.py).
+
+Guarda bytes por clave con vencimiento, más locks con vencimiento para
+coordinar quién va al upstream. Dos backends con la misma interfaz:
+
+- MemoryBackend: dict del proceso. Con un solo worker alcanza.
+- SQLiteBackend: un archivo SQLite en modo WAL que comparten todos los
+  procesos de la máquina; lecturas concurrentes sin bloquearse y escrituras
+  cortas. Sobrevive reinicios.
+
+SharedCache.get_or_fetch hace single-flight entre procesos: el primero que
+toma el lock de la clave va al upstream y los demás esperan a que aparezca
+el valor (o a que el lock venza, si ese proceso murió) en lugar de repetir
+el mismo fetch.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import orjson
+
+from logs import get_logger
+
+log = get_logger("shared_cache")
+
+
+class MemoryBackend:
+    blocking = False
+    cross_process = False
+
+    def __init__(self):
+        self._entries = {}  # key -> (value, created_at, expires_at)
+        self._locks = {}    # key -> (token, expires_at)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._entries[key] = (value, now, now + ttl)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def try_lock(self, key, token, ttl):
+        now = time.time()
+        held = self._locks.get(key)
+        if held is not None and held[1] > now:
+            return False
+        self._locks[key] = (token, now + ttl)
+        return True
+
+    def is_locked(self, key):
+        held = self._locks.get(key)
+        return held is not None and held[1] > time.time()
+
+    def unlock(self, key, token):
+        if self._locks.get(key, (None,))[0] == token:
+            del self._locks[key]
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    blocking = True  # se llama desde threads, fuera del event loop
+    cross_process = True
+    PURGE_EVERY = 200  # escrituras entre limpiezas de vencidos
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conns = set()  # todas las conexiones abiertas, de cualquier thread
+        self._conns_lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS locks (
+                key TEXT PRIMARY KEY,
+                token TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self):
+        # Una conexión por thread: sqlite3 no comparte conexiones entre threads.
+        # check_same_thread=False sólo para que close() pueda cerrarlas todas.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.add(conn)
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, created_at, expires_at FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def try_lock(self, key, token, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO locks (key, token, expires_at) VALUES (?, ?, ?)",
+                (key, token, now + ttl),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def is_locked(self, key):
+        row = self._conn().execute(
+            "SELECT 1 FROM locks WHERE key = ? AND expires_at > ?", (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def unlock(self, key, token):
+        self._conn().execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+    def close(self):
+        """
+        Cierra las conexiones de todos los threads (las del pool de
+        asyncio.to_thread incluidas), no sólo la del thread que llama.
+        """
+        with self._conns_lock:
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+class SharedCache:
+    def __init__(self, backend, poll_interval=0.05):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.fetches = 0
+        self.waits = 0
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key):
+        """
+        (bytes, created_at, expires_at) o None si no está o venció.
+        """
+        return await self._call(self.backend.get, key)
+
+    async def set(self, key, value, ttl):
+        await self._call(self.backend.set, key, value, ttl)
+
+    async def delete(self, key):
+        await self._call(self.backend.delete, key)
+
+    async def try_lock(self, key, ttl):
+        """
+        Token si se tomó el lock (vence solo a los `ttl` segundos), None si no.
+        """
+        token = uuid.uuid4().hex
+        return token if await self._call(self.backend.try_lock, key, token, ttl) else None
+
+    async def is_locked(self, key):
+        return await self._call(self.backend.is_locked, key)
+
+    async def unlock(self, key, token):
+        await self._call(self.backend.unlock, key, token)
+
+    async def get_or_fetch(self, key, fetch, ttl, lock_ttl=30.0, encode=orjson.dumps, decode=orjson.loads):
+        """
+        Devuelve (value, created_at, expires_at, status). status: "HIT" (ya
+        estaba), "MISS" (lo trajo este proceso) o "WAITED" (lo trajo otro
+        proceso mientras éste esperaba). `ttl` puede ser un número o
+        ttl(value).
+        """
+        lock_key = "lock:" + key
+        while True:
+            found = await self.get(key)
+            if found is not None:
+                return decode(found[0]), found[1], found[2], "HIT"
+
+            token = await self.try_lock(lock_key, lock_ttl)
+            if token is not None:
+                try:
+                    # Pudo llegar entre el get y el lock
+                    found = await self.get(key)
+                    if found is not None:
+                        return decode(found[0]), found[1], found[2], "HIT"
+                    self.fetches += 1
+                    value = await fetch()
+                    seconds = ttl(value) if callable(ttl) else ttl
+                    await self.set(key, encode(value), seconds)
+                    now = time.time()
+                    return value, now, now + seconds, "MISS"
+                finally:
+                    await self.unlock(lock_key, token)
+
+            # Otro proceso lo está trayendo: esperar su resultado
+            self.waits += 1
+            while await self.is_locked(lock_key):
+                await asyncio.sleep(self.poll_interval)
+            found = await self.get(key)
+            if found is not None:
+                return decode(found[0]), found[1], found[2], "WAITED"
+            # Falló o murió sin dejar valor: volver a intentar tomar el lock
+
+    def stats(self):
+        return {"backend": type(self.backend).__name__, "fetches": self.fetches, "waits": self.waits}
+
+    def close(self):
+        self.backend.close()
+
+
+def build_shared_cache(kind, path):
+    """
+    kind: "memory" | "sqlite".
+    """
+    if kind == "sqlite":
+        log.info("cache compartido en SQLite: %s", path)
+        return SharedCache(SQLiteBackend(path))
+    if kind != "memory":
+        raise ValueError(f"backend de cache desconocido: {kind}")
+    return SharedCache(MemoryBackend())
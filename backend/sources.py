@@ -0,0 +1,546 @@
+"""
+Adaptadores de fuentes de publicaciones y registro por nombre.
+
+Cada fuente implementa la misma interfaz:
+
+- fetch(query, pages): trae la respuesta cruda del upstream (I/O).
+- parse(raw): la convierte en Listing normalizados (CPU; si
+  offload_parse es True se corre en el pool de procesos, o en un thread si
+  la fuente no tiene pool, y tiene que ser una función a nivel de módulo).
+- annotate(status): datos extra para el bloque de estado de la fuente.
+- fetch_errors(raw): lo que falló dentro de una respuesta que igual se usa
+  (páginas o batches de /items perdidos); si hay algo la fuente sale con
+  status "partial", que se cachea con el TTL corto y pasa por el fallback.
+
+SourceRegistry arma los jobs de fan-out de las fuentes pedidas. Cada fuente
+tiene un CircuitBreaker: después de varias fallas o timeouts seguidos deja de
+llamarla (la fuente sale al instante con status "circuit_open") y, pasado el
+cool-down, deja pasar una sola búsqueda de prueba para ver si volvió.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+
+from fetch_engine import PartialResult
+from http_client import BROWSER_USER_AGENT
+from kavak_parser import parse_kavak_html
+from listing import Listing
+from logs import get_logger, sampled
+from metrics import stage
+from ml_delta import KnownListings
+from v6_catalog import NO_IMAGE_URL
+
+log = get_logger("sources")
+
+ML_SITE = "MLA"               # Argentina
+ML_CARS_CATEGORY = "MLA1744"  # Autos y Camionetas
+ML_PAGE_LIMIT = 50            # máx 50 por página en search API
+ML_ITEMS_BATCH = 20           # máx 20 ids por request a /items
+# Orden por fecha de publicación para los refrescos delta. La respuesta dice
+# qué orden aplicó (sort.id) y cuáles acepta (available_sorts): si no es
+# este, el delta sólo vería la primera página y se pasa a refrescos completos.
+ML_RECENT_SORT = "start_time_desc"
+
+# Headers opcionales (no necesarios para la API, pero útil para trazas)
+ML_HEADERS = {
+    "Accept": "application/json",
+    "User-Agent": "autitos/1.0 (+https://autitos-two.vercel.app)"
+}
+KAVAK_HEADERS = {"User-Agent": BROWSER_USER_AGENT}
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold fallas seguidas) -> open -> (cooldown) ->
+    half-open: pasa una búsqueda de prueba; si sale bien vuelve a closed, si
+    falla vuelve a open con el doble de cool-down (hasta max_cooldown).
+    """
+    def __init__(self, failure_threshold=3, cooldown=30.0, max_cooldown=300.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.last_error = None
+        self.last_failure_at = None
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+
+    def retry_in(self):
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now - self.opened_at >= self.cooldown:
+            self.state = "half-open"
+            self.probe_started_at = now
+            return True
+        # Si la búsqueda de prueba nunca reportó (p. ej. se canceló), se lanza otra
+        if self.state == "half-open" and now - self.probe_started_at >= self.cooldown:
+            self.probe_started_at = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            log.info("breaker: fuente recuperada, circuito cerrado")
+        self.state = "closed"
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, error=None):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.last_failure_at = time.time()
+        if self.state == "half-open":
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open()
+        elif self.state == "closed" and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        log.warning("breaker: circuito abierto por %.0fs: %s", self.cooldown, self.last_error)
+
+    def health(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(self.retry_in(), 1),
+            "cooldown_seconds": self.cooldown,
+            "last_error": self.last_error,
+            "last_failure_age_seconds": round(time.time() - self.last_failure_at, 1) if self.last_failure_at else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class Source:
+    name = ""
+    offload_parse = False
+
+    def __init__(self, deadline, ttl, breaker=None, pool=None):
+        self.deadline = deadline
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker()
+        self.pool = pool  # CpuPool para offload_parse
+
+    async def fetch(self, query, pages):
+        raise NotImplementedError
+
+    def parse(self, raw):
+        return raw
+
+    def annotate(self, status):
+        pass
+
+    def fetch_errors(self, raw):
+        return []
+
+    async def search(self, query, pages):
+        with stage(f"{self.name}.fetch"):
+            raw = await self.fetch(query, pages)
+        with stage(f"{self.name}.parse"):
+            if self.offload_parse and self.pool is not None:
+                cars = await self.pool.run(self.parse, raw)
+            elif self.offload_parse:
+                cars = await asyncio.to_thread(self.parse, raw)
+            else:
+                cars = self.parse(raw)
+        log.debug("%s: %d autos encontrados", self.name, len(cars))
+        errors = self.fetch_errors(raw)
+        if errors:
+            raise PartialResult(cars, "; ".join(errors))
+        return cars
+
+
+class V6Source(Source):
+    """
+    Busca en el snapshot local indexado (ver v6_catalog.py). No descarga
+    nada: el catálogo se refresca en segundo plano.
+    """
+    name = "v6"
+
+    def __init__(self, catalog, deadline, ttl, breaker=None):
+        super().__init__(deadline, ttl, breaker)
+        self.catalog = catalog
+
+    async def fetch(self, query, pages):
+        if not self.catalog.ready:
+            raise RuntimeError("catálogo V6 todavía no disponible")
+        return self.catalog.search(query)
+
+    def annotate(self, status):
+        status["snapshot_age_seconds"] = self.catalog.info()["age_seconds"]
+
+
+class KavakSource(Source):
+    name = "kavak"
+    offload_parse = True  # se parsea directo desde los bytes, fuera del event loop
+    # Función de módulo (no método) para que viaje al pool de procesos
+    parse = staticmethod(parse_kavak_html)
+
+    def __init__(self, client, deadline, ttl, breaker=None, pool=None):
+        super().__init__(deadline, ttl, breaker, pool)
+        self.client = client
+
+    async def fetch(self, query, pages):
+        kavak_query = query.strip().lower().replace(" ", "-")
+        kavak_url = f"https://www.kavak.com/ar/usados/{kavak_query}"
+        log.debug("URL Kavak: %s", kavak_url)
+        r = await self.client.get(kavak_url, headers=KAVAK_HEADERS, timeout=10)
+        if r.status != 200:
+            raise RuntimeError(f"Kavak status {r.status}")
+        return r.body
+
+
+class MercadoLibreSource(Source):
+    """
+    API oficial: https://api.mercadolibre.com/sites/MLA/search
+    Para km y año más precisos se enriquece con /items.
+
+    Pipeline: la primera página da el total; el resto de las páginas se piden
+    en paralelo y los IDs de cada página entran a un pool acotado de workers
+    de /items mientras las demás páginas siguen en vuelo. El orden de salida
+    es el mismo que el del paginado (página, posición).
+
+    Con `known` (ver ml_delta.py) los refrescos son incrementales: /items
+    sólo para publicaciones nuevas o con otro precio, y entre pasadas
+    completas sólo se leen las páginas más recientes.
+    """
+    name = "mercadolibre"
+
+    def __init__(self, client, deadline, ttl, page_concurrency=4, items_concurrency=6, breaker=None,
+                 known=None, full_every=6):
+        super().__init__(deadline, ttl, breaker)
+        self.client = client
+        self.page_concurrency = page_concurrency
+        self.items_concurrency = items_concurrency
+        self.known = known  # KnownListingsStore o None
+        self.full_every = full_every
+        self.delta_enabled = True  # False si la API no ordena por ML_RECENT_SORT
+        self.refreshes = {"full": 0, "delta": 0}
+        self.items_fetched = 0
+        self.items_reused = 0
+        self.removed = 0
+
+    async def fetch_search_page(self, q, offset, sort=None):
+        params = {
+            "q": q,
+            "category": ML_CARS_CATEGORY,
+            "limit": ML_PAGE_LIMIT,
+            "offset": offset
+        }
+        if sort:
+            params["sort"] = sort
+        with stage("mercadolibre.search"):
+            r = await self.client.get(
+                f"https://api.mercadolibre.com/sites/{ML_SITE}/search",
+                headers=ML_HEADERS, params=params, timeout=10
+            )
+        if r.status != 200:
+            raise RuntimeError(f"ML API status {r.status} offset {offset}")
+        return r.json()
+
+    async def fetch_items(self, ids):
+        """
+        Pide un batch (hasta 20) a /items y devuelve {id: body}.
+        """
+        attrs_map = {}
+        with stage("mercadolibre.items"):
+            rr = await self.client.get(
+                "https://api.mercadolibre.com/items",
+                headers=ML_HEADERS, params={"ids": ",".join(ids)}, timeout=10
+            )
+        if rr.status != 200:
+            raise RuntimeError(f"status {rr.status}")
+        for entry in rr.json():
+            if isinstance(entry, dict) and entry.get("code") == 200:
+                item = entry.get("body", {})
+                attrs_map[item.get("id")] = item
+        return attrs_map
+
+    async def fetch(self, query, pages):
+        """
+        Devuelve (resultados por página, {id: body de /items}, errores).
+        """
+        q = query.strip()
+        if self.known is None:
+            return await self.fetch_pages(q, pages)
+
+        known = await self.known.load(q, pages)
+        full = known is None or known.since_full + 1 >= self.full_every or not self.delta_enabled
+        if known is None:
+            known = KnownListings()
+        if not full:
+            recent = await self.fetch_recent(q, pages, known)
+            if recent is None:
+                full = True
+            else:
+                results, attrs_map, errors = recent
+        if full:
+            page_results, attrs_map, errors = await self.fetch_pages(q, pages, known.needs_items)
+            results = [item for page in page_results for item in page or []]
+
+        # Con páginas perdidas lo que no se vio no cuenta como removido
+        new, changed, removed = known.apply(results, attrs_map, full and not errors)
+        self.refreshes["full" if full else "delta"] += 1
+        self.items_fetched += len(attrs_map)
+        # Una publicación puede repetirse entre páginas: se cuentan ids únicos
+        self.items_reused += len({item["id"] for item in results if item.get("id")} - attrs_map.keys())
+        self.removed += removed
+        log.debug(
+            "ML %s %r: %d vistas, %d nuevas, %d con otro precio, %d removidas",
+            "completo" if full else "delta", q, len(results), new, changed, removed,
+        )
+        await self.known.save(q, pages, known)
+        items, attrs_map = known.results(pages * ML_PAGE_LIMIT)
+        return [items], attrs_map, errors
+
+    async def fetch_recent(self, q, pages, known):
+        """
+        Páginas de la más nueva a la más vieja hasta una que termina en una
+        publicación conocida; /items sólo de las que lo necesitan. None si la
+        API no ordenó por fecha (hay que hacer una pasada completa).
+        """
+        results = []
+        for idx in range(pages):
+            data = await self.fetch_search_page(q, idx * ML_PAGE_LIMIT, sort=ML_RECENT_SORT)
+            if idx == 0 and not self.check_recent_sort(data):
+                return None
+            page = data.get("results", [])
+            results.extend(page)
+            total = (data.get("paging") or {}).get("total") or 0
+            if not page or known.is_known(page[-1].get("id")) or (idx + 1) * ML_PAGE_LIMIT >= total:
+                break
+
+        ids = [item["id"] for item in results if item.get("id") and known.needs_items(item)]
+        attrs_map = {}
+        errors = []
+        items_sem = asyncio.Semaphore(self.items_concurrency)
+
+        async def fetch_batch(batch):
+            async with items_sem:
+                try:
+                    attrs_map.update(await self.fetch_items(batch))
+                except Exception as e:
+                    log.warning("ML items: %s", e)
+                    errors.append(f"/items ({len(batch)} ids): {e}")
+
+        await asyncio.gather(*(fetch_batch(ids[i:i + ML_ITEMS_BATCH]) for i in range(0, len(ids), ML_ITEMS_BATCH)))
+        return results, attrs_map, errors
+
+    def check_recent_sort(self, data):
+        """
+        True si la búsqueda salió ordenada por ML_RECENT_SORT. Si no, el
+        delta se apaga en este proceso y se loguea lo que acepta la API.
+        """
+        applied = (data.get("sort") or {}).get("id")
+        if applied == ML_RECENT_SORT:
+            return True
+        available = [sort.get("id") for sort in data.get("available_sorts") or [] if sort.get("id")]
+        log.warning(
+            "ML: la búsqueda ignoró sort=%s (aplicó %s, acepta %s): refrescos completos",
+            ML_RECENT_SORT, applied, ", ".join(available) or "?",
+        )
+        self.delta_enabled = False
+        return False
+
+    async def fetch_pages(self, q, pages, wants_items=None):
+        """
+        Búsqueda completa en el orden normal. wants_items(item) decide qué
+        publicaciones se enriquecen con /items (por defecto todas). Las
+        páginas y batches que fallan quedan afuera y se listan en los errores.
+        """
+        first = await self.fetch_search_page(q, 0)
+        total = (first.get("paging") or {}).get("total") or len(first.get("results", []))
+        n_pages = max(1, min(pages, math.ceil(total / ML_PAGE_LIMIT)))
+
+        page_results = [None] * n_pages
+        page_results[0] = first.get("results", [])
+        attrs_map = {}
+        errors = []
+        queue = asyncio.Queue()
+        page_sem = asyncio.Semaphore(self.page_concurrency)
+
+        async def items_worker():
+            while True:
+                ids = await queue.get()
+                try:
+                    attrs_map.update(await self.fetch_items(ids))
+                except Exception as e:
+                    log.warning("ML items: %s", e)
+                    errors.append(f"/items ({len(ids)} ids): {e}")
+                finally:
+                    queue.task_done()
+
+        def enqueue_ids(results):
+            ids = [item.get("id") for item in results if item.get("id") and (wants_items is None or wants_items(item))]
+            for i in range(0, len(ids), ML_ITEMS_BATCH):
+                queue.put_nowait(ids[i:i + ML_ITEMS_BATCH])
+
+        async def fetch_page(idx):
+            async with page_sem:
+                try:
+                    data = await self.fetch_search_page(q, idx * ML_PAGE_LIMIT)
+                except Exception as e:
+                    log.warning("ML API: %s", e)
+                    errors.append(f"página {idx + 1}: {e}")
+                    return
+            page_results[idx] = data.get("results", [])
+            enqueue_ids(page_results[idx])
+
+        workers = [asyncio.create_task(items_worker()) for _ in range(self.items_concurrency)]
+        try:
+            enqueue_ids(page_results[0])
+            await asyncio.gather(*(fetch_page(idx) for idx in range(1, n_pages)))
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        log.debug("ML API: %d páginas", n_pages)
+        return page_results, attrs_map, errors
+
+    def parse(self, raw):
+        page_results, attrs_map, _ = raw
+        ml_cars = []
+        for results in page_results:
+            for item in results or []:
+                car = parse_ml_item(item, attrs_map.get(item.get("id", ""), {}))
+                if car:
+                    ml_cars.append(car)
+        return ml_cars
+
+    def fetch_errors(self, raw):
+        return raw[2]
+
+
+def parse_ml_item(item, body):
+    """
+    Convierte un resultado de /search (más su body de /items) en un auto.
+    """
+    try:
+        title = item.get("title", "N/A")
+        price_value = item.get("price", 0) or 0
+        currency_id = item.get("currency_id", "ARS")
+        permalink = item.get("permalink", "")
+        thumbnail = item.get("thumbnail", "") or item.get("thumbnail_id", "")
+        # imagen más grande si viene secure_thumbnail
+        image = item.get("secure_thumbnail") or thumbnail or NO_IMAGE_URL
+
+        # ubicación
+        addr = item.get("address", {}) or {}
+        city = addr.get("city_name") or ""
+        state = addr.get("state_name") or ""
+        location = ", ".join([p for p in [city, state] if p]) or "Argentina"
+
+        # Enriquecer con atributos (km/año) desde /items
+        year, km = None, None
+        for att in (body.get("attributes") or []):
+            # Names suelen ser 'Año' y 'Kilómetros'
+            name = (att.get("name") or "").lower()
+            val = att.get("value_name") or ""
+            if "año" in name:
+                try:
+                    y = int(re.search(r"(19|20)\d{2}", val).group()) if re.search(r"(19|20)\d{2}", val) else None
+                    if y and 1950 <= y <= 2030:
+                        year = y
+                except:
+                    pass
+            if "kilómetro" in name or "kilometro" in name:
+                try:
+                    km = int(re.sub(r"[^\d]", "", val)) if val else None
+                except:
+                    pass
+
+        return Listing(
+            title=title,
+            originalPrice=price_value,
+            currency="USD" if currency_id == "USD" else "ARS",
+            year=year,
+            km=km,
+            location=location,
+            image=image,
+            url=permalink,
+            source="mercadolibre",
+            sourceId=item.get("id") or permalink,
+        )
+
+    except Exception as e:
+        sampled(log, logging.WARNING, "ml.parse", "ML parse: %s", e)
+        return None
+
+
+class SourceRegistry:
+    def __init__(self):
+        self._sources = {}  # en orden de registro = orden de fuentes en la respuesta
+
+    def register(self, source):
+        self._sources[source.name] = source
+        return source
+
+    def __getitem__(self, name):
+        return self._sources[name]
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def names(self):
+        return tuple(self._sources)
+
+    def jobs(self, names, query, pages):
+        """
+        Jobs de fan-out {nombre: (factory, deadline)} para las fuentes pedidas,
+        más el status de las que se saltean por tener el circuito abierto.
+        """
+        jobs = {}
+        skipped = {}
+        for name, source in self._sources.items():
+            if name not in names:
+                continue
+            if not source.breaker.allow():
+                skipped[name] = {
+                    "status": "circuit_open",
+                    "error": f"{source.breaker.consecutive_failures} fallas seguidas, "
+                             f"reintento en {source.breaker.retry_in():.0f}s",
+                    "elapsed_ms": 0,
+                }
+                continue
+            jobs[name] = (lambda source=source: source.search(query, pages), source.deadline)
+        return jobs, skipped
+
+    def observe(self, name, status):
+        """
+        Registra el resultado de una fuente en su breaker (timeouts cuentan
+        como falla; una respuesta parcial, como éxito: la fuente contesta).
+        """
+        source = self._sources.get(name)
+        if source is None or status["status"] == "circuit_open":
+            return
+        if status["status"] in ("ok", "partial"):
+            source.breaker.record_success()
+        else:
+            source.breaker.record_failure(status.get("error"))
+
+    def health(self):
+        return {
+            name: {"deadline_seconds": source.deadline, "ttl_seconds": source.ttl, **source.breaker.health()}
+            for name, source in self._sources.items()
+        }
@@ -0,0 +1,47 @@
+"""
+Fixtures comunes: el mock de bench/mock_upstream.py sirviendo los fixtures
+de bench/make_fixtures.py (los grabados no están en el repo), y un
+UpstreamClient apuntado a él.
+"""
+import shutil
+
+import pytest
+
+from bench.make_fixtures import generate
+from bench.mock_upstream import MockUpstream
+from http_client import UpstreamClient
+from upstream_fixtures import FixtureStore
+
+QUERIES = ("onix", "gol trend")
+PAGES = 3
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def generated_fixtures(tmp_path_factory):
+    root = tmp_path_factory.mktemp("upstream")
+    generate(str(root), QUERIES, PAGES, v6_cars=200)
+    return root
+
+
+@pytest.fixture
+def fixture_store(generated_fixtures, tmp_path):
+    # Copia: cada test puede borrar respuestas sin tocar las de los demás
+    root = tmp_path / "upstream"
+    shutil.copytree(generated_fixtures, root)
+    return FixtureStore(str(root))
+
+
+@pytest.fixture
+async def upstream(fixture_store):
+    mock = MockUpstream(fixture_store, latency_ms=0, jitter_ms=0, seed=1)
+    runner, port = await mock.start()
+    client = UpstreamClient(max_retries=0, override=f"http://127.0.0.1:{port}")
+    client.start()
+    yield client
+    await client.close()
+    await runner.cleanup()
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import Admission, Overloaded
+from search_cache import make_key
+
+
+def test_slot_limit():
+    admission = Admission(2, retry_after=3)
+    with admission.slot("/api/cars"), admission.slot("/api/cars"):
+        with pytest.raises(Overloaded) as e:
+            with admission.slot("/api/cars"):
+                pass
+        assert e.value.retry_after == 3
+        # Ya chequeado antes: cuenta sin rechazar
+        with admission.slot("/api/cars/stream", check=False):
+            assert admission.in_flight == 3
+    assert admission.in_flight == 0
+    with Admission(0).slot("/api/cars"):
+        pass
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    # Una búsqueda ya ocupa el único lugar
+    admission = Admission(1)
+    admission.in_flight = 1
+    monkeypatch.setattr(main, "admission", admission)
+    result = {
+        "cars": [], "dollar_rate": 1285.0, "generated_at": time.time(),
+        "sources": {"mercadolibre": {"status": "ok", "count": 0}, "dollar_rate": {"status": "ok"}},
+    }
+    key = make_key("onix", 3, {"mercadolibre"})
+    asyncio.run(main.search_cache.set(key, result, 60))
+    yield TestClient(main.app)
+    main.search_cache._entries.pop(key, None)
+
+
+def test_cache_hits_are_never_shed(saturated):
+    response = saturated.get("/api/cars", params={"query": "onix"})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "HIT"
+    stream = saturated.get("/api/cars/stream", params={"query": "onix"})
+    assert stream.status_code == 200
+    assert stream.text.splitlines()[-1].startswith('{"type":"done","cache":"HIT"')
+
+
+def test_misses_are_shed(saturated):
+    for path in ("/api/cars", "/api/cars/stream"):
+        response = saturated.get(path, params={"query": "hilux"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    response = saturated.post("/api/cars/batch", json={"queries": ["hilux"]})
+    assert response.status_code == 503
@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    # Sin `with`: no corre el startup (ni historial, ni índice, ni V6)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("pages", [0, -1, main.MAX_PAGES + 1])
+def test_pages_out_of_range(client, pages):
+    assert client.get("/api/cars", params={"query": "onix", "pages": pages}).status_code == 422
+    assert client.get("/api/cars/stream", params={"query": "onix", "pages": pages}).status_code == 422
+    assert client.post("/api/cars/batch", json={"queries": ["onix"], "pages": pages}).status_code == 422
+
+
+@pytest.mark.anyio
+async def test_sources_get_the_normalized_query(monkeypatch):
+    seen = []
+
+    async def search(query, pages):
+        seen.append(query)
+        return []
+
+    monkeypatch.setattr(main.source_registry["mercadolibre"], "search", search)
+    jobs, _ = main.build_search_jobs("  Gol   TREND ", 2, {"mercadolibre"})
+    factory, _ = jobs["mercadolibre"]
+    await factory()
+    assert seen == ["gol trend"]
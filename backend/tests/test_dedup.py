@@ -0,0 +1,72 @@
+from dedup import dedupe_cars, listing_id
+from listing import Listing
+
+
+def car(source, source_id, title, price, year=2018, km=60000):
+    return Listing(
+        title=title, originalPrice=price, currency="USD", year=year, km=km, location="Rosario",
+        image="", url=f"https://{source}.example/{source_id}", source=source, sourceId=source_id,
+        priceUSD=price,
+    )
+
+
+def test_ids_are_stable_and_per_source():
+    a = car("mercadolibre", "MLA1", "Peugeot 208 Active", 14000)
+    assert listing_id(a) == listing_id(a.copy())
+    assert listing_id(a) != listing_id(car("kavak", "MLA1", "Peugeot 208 Active", 14000))
+    # Sin id en la fuente, el id sale del contenido
+    b = car("v6", "", "Peugeot 208 Active", 14000)
+    assert listing_id(b) == listing_id(car("v6", "", "Peugeot 208 Active", 14000))
+
+
+def test_cross_source_duplicates_merge():
+    cars = [
+        car("v6", "v6-1", "Peugeot 208 Active 1.6", 14000, km=61000),
+        car("mercadolibre", "MLA1", "Peugeot 208 Active 1.6 2018 Impecable", 14300, km=60000),
+        car("kavak", "k1", "Peugeot 208 Active", 13900, km=62000),
+        car("mercadolibre", "MLA2", "Toyota Hilux SRV", 30000),
+    ]
+    unique, merged = dedupe_cars(cars)
+    assert [c["sourceId"] for c in unique] == ["v6-1", "MLA2"]
+    kept = unique[0]
+    assert {u["source"] for u in kept["urls"]} == {"v6", "mercadolibre", "kavak"}
+    assert merged == {cars[1]["id"]: kept["id"], cars[2]["id"]: kept["id"]}
+    assert "urls" not in unique[1]
+
+
+def test_same_source_is_never_merged():
+    cars = [
+        car("mercadolibre", "MLA1", "Peugeot 208 Active", 14000),
+        car("mercadolibre", "MLA2", "Peugeot 208 Active", 14000),
+    ]
+    unique, merged = dedupe_cars(cars)
+    assert len(unique) == 2 and merged == {}
+
+
+def test_repeated_listing_collapses():
+    first = car("mercadolibre", "MLA1", "Peugeot 208 Active", 14000)
+    unique, merged = dedupe_cars([first, first.copy()])
+    assert len(unique) == 1 and merged == {}
+
+
+def test_different_cars_stay_apart():
+    cars = [
+        car("v6", "v6-1", "Peugeot 208 Active", 14000, km=20000),
+        car("kavak", "k1", "Peugeot 208 Active", 14000, km=90000),     # otro km
+        car("mercadolibre", "MLA1", "Peugeot 208 Active", 19000),      # otro precio
+        car("kavak", "k2", "Peugeot 208 Active", 14000, year=2014),    # otro año
+    ]
+    unique, merged = dedupe_cars(cars)
+    assert len(unique) == 4 and merged == {}
+
+
+def test_one_listing_per_source_in_a_group():
+    # Dos de ML parecidas a la misma de V6: sólo una puede unirse
+    cars = [
+        car("v6", "v6-1", "Peugeot 208 Active", 14000),
+        car("mercadolibre", "MLA1", "Peugeot 208 Active", 14000),
+        car("mercadolibre", "MLA2", "Peugeot 208 Active", 14050),
+    ]
+    unique, merged = dedupe_cars(cars)
+    assert len(unique) == 2
+    assert list(merged) == [cars[1]["id"]]
@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+import pytest
+
+from fetch_engine import PartialResult, fan_out, fan_out_iter
+from sources import ML_CARS_CATEGORY, ML_PAGE_LIMIT, ML_SITE, MercadoLibreSource
+from upstream_fixtures import split_request
+
+pytestmark = pytest.mark.anyio
+
+
+def job(value, delay=0.0, error=None, deadline=1.0):
+    async def run():
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return value
+    return run, deadline
+
+
+async def test_statuses_per_job():
+    results, statuses = await fan_out({
+        "ok": job([1, 2]),
+        "slow": job([3], delay=1.0, deadline=0.05),
+        "broken": job(None, error=RuntimeError("status 503")),
+        "partial": job(None, error=PartialResult([4], "página 2: status 503")),
+    }, budget=2.0)
+    assert results == {"ok": [1, 2], "slow": None, "broken": None, "partial": [4]}
+    assert statuses["ok"]["status"] == "ok"
+    assert statuses["slow"] == {"status": "timeout", "error": "deadline 0.05s", "elapsed_ms": statuses["slow"]["elapsed_ms"]}
+    assert statuses["slow"]["elapsed_ms"] < 500
+    assert statuses["broken"]["status"] == "error" and statuses["broken"]["error"] == "status 503"
+    assert statuses["partial"]["status"] == "partial" and statuses["partial"]["error"] == "página 2: status 503"
+
+
+async def test_budget_cancels_pending_jobs():
+    cancelled = []
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    results, statuses = await fan_out({"fast": job("a"), "hang": (hang, 10.0)}, budget=0.1)
+    assert results == {"fast": "a", "hang": None}
+    assert statuses["hang"]["status"] == "timeout"
+    assert "presupuesto total" in statuses["hang"]["error"]
+    assert cancelled == [True]
+
+
+async def test_iter_yields_in_completion_order():
+    jobs = {"b": job("b", delay=0.05), "a": job("a"), "c": job("c", delay=0.1)}
+    names = [name async for name, _, _ in fan_out_iter(jobs, budget=1.0)]
+    assert names == ["a", "b", "c"]
+
+
+def ml_search_fixture(store, query, page):
+    params = {"q": query, "category": ML_CARS_CATEGORY, "limit": ML_PAGE_LIMIT, "offset": page * ML_PAGE_LIMIT}
+    host, path, merged = split_request(f"https://api.mercadolibre.com/sites/{ML_SITE}/search", params)
+    return store.path_for(host, path, merged)
+
+
+async def test_mercadolibre_complete_search_is_ok(upstream):
+    source = MercadoLibreSource(upstream, deadline=5, ttl=300)
+    results, statuses = await fan_out({"mercadolibre": (lambda: source.search("onix", 3), 5)}, budget=5)
+    assert statuses["mercadolibre"]["status"] == "ok"
+    cars = results["mercadolibre"]
+    assert len(cars) == 3 * ML_PAGE_LIMIT
+    assert all(car["year"] and car["km"] is not None for car in cars)
+
+
+async def test_mercadolibre_lost_page_is_partial(upstream, fixture_store):
+    os.remove(ml_search_fixture(fixture_store, "onix", 2))
+    source = MercadoLibreSource(upstream, deadline=5, ttl=300)
+    results, statuses = await fan_out({"mercadolibre": (lambda: source.search("onix", 3), 5)}, budget=5)
+    status = statuses["mercadolibre"]
+    assert status["status"] == "partial"
+    assert "página 3" in status["error"]
+    assert len(results["mercadolibre"]) == 2 * ML_PAGE_LIMIT
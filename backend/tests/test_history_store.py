@@ -0,0 +1,116 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from history_store import CHUNK_ROWS, HistoryStore
+
+JAN_1 = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+JAN_2 = datetime(2025, 1, 2, 12, tzinfo=timezone.utc)
+FEB_1 = datetime(2025, 2, 1, 12, tzinfo=timezone.utc)
+
+
+def car(source_id, usd, year=2018, km=50000, title="Fiat Cronos Drive", source="mercadolibre"):
+    return {
+        "title": title, "originalPrice": usd, "currency": "USD", "year": year, "km": km, "location": "Mendoza",
+        "image": "", "url": f"https://example.com/{source_id}", "source": source, "sourceId": source_id,
+        "price": usd * 1000, "priceUSD": usd,
+    }
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "history.db")
+
+
+@pytest.fixture
+def store(db_path):
+    store = HistoryStore(None, db_path)
+    yield store
+    store.close()
+
+
+def rows(db_path, sql):
+    # Otra conexión al mismo archivo: lo que se ve es lo que quedó escrito
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_uses_sqlite_without_postgres_url(tmp_path):
+    store = HistoryStore("sqlite:///otra.db", str(tmp_path / "h.db"))
+    assert store.dialect == "sqlite"
+    store.close()
+
+
+def test_same_day_is_upserted_not_duplicated(store, db_path):
+    cars = [car("A", 10000), car("B", 12000), car("C", 14000, source="kavak")]
+    assert store.record("cronos", cars, JAN_1) == 3
+    assert store.record("cronos", cars, JAN_1) == 0
+    assert rows(db_path, "SELECT COUNT(*) FROM listings") == [(3,)]
+    assert rows(db_path, "SELECT COUNT(*) FROM price_observations") == [(3,)]
+    assert store.monthly("cronos") == [
+        {"month": "2025-01", "count": 3, "avgUSD": 12000, "minUSD": 10000, "maxUSD": 14000},
+    ]
+
+
+def test_listing_upsert_keeps_known_attributes(store, db_path):
+    store.record("cronos", [car("A", 10000, year=2018, km=50000)], JAN_1)
+    store.record("cronos", [car("A", 10000, year=None, km=52000, title="Fiat Cronos Drive 1.3")], JAN_2)
+    assert rows(db_path, "SELECT title, year, km, first_seen, last_seen FROM listings") == [
+        ("Fiat Cronos Drive 1.3", 2018, 52000, "2025-01-01 12:00:00", "2025-01-02 12:00:00"),
+    ]
+
+
+def test_monthly_rollup(store):
+    store.record("cronos", [car("A", 10000), car("B", 20000)], JAN_1)
+    store.record("cronos", [car("A", 9000), car("B", 20000)], JAN_2)   # nueva observación por día
+    store.record("cronos", [car("A", 8000)], FEB_1)
+    store.record("onix", [car("X", 50000)], JAN_1)                    # otra búsqueda, otro rollup
+    assert store.monthly("cronos") == [
+        {"month": "2025-01", "count": 4, "avgUSD": 14750, "minUSD": 9000, "maxUSD": 20000},
+        {"month": "2025-02", "count": 1, "avgUSD": 8000, "minUSD": 8000, "maxUSD": 8000},
+    ]
+    assert store.monthly("cronos", months=1) == [
+        {"month": "2025-02", "count": 1, "avgUSD": 8000, "minUSD": 8000, "maxUSD": 8000},
+    ]
+    assert store.monthly("gol") == []
+
+
+def test_skips_cars_without_id_or_price_and_repeated_ones(store):
+    cars = [car("A", 10000), car("", 11000), car("B", 0), car("A", 10000)]
+    assert store.record("cronos", cars, JAN_1) == 1
+    assert store.record("cronos", [car("", 1)], JAN_1) == 0
+
+
+def test_multi_row_upsert_spans_chunks(store, db_path):
+    n = CHUNK_ROWS * 2 + 17
+    cars = [car(f"ID{i}", 5000 + i) for i in range(n)]
+    assert store.record("cronos", cars, JAN_1) == n
+    assert store.record("cronos", cars, JAN_1) == 0
+    assert rows(db_path, "SELECT COUNT(*), MIN(price_usd), MAX(price_usd) FROM price_observations") == [
+        (n, 5000, 5000 + n - 1),
+    ]
+    (month,) = store.monthly("cronos")
+    assert (month["count"], month["minUSD"], month["maxUSD"]) == (n, 5000, 5000 + n - 1)
+
+
+def test_price_history_endpoint(store, monkeypatch):
+    store.record("fiat cronos", [car("A", 10000), car("B", 12000)], JAN_1)
+    monkeypatch.setattr(main, "history_store", store)
+    response = TestClient(main.app).get("/api/price-history", params={"query": "  Fiat  CRONOS", "months": 6})
+    assert response.status_code == 200
+    assert response.json() == {
+        "query": "  Fiat  CRONOS",
+        "months": [{"month": "2025-01", "count": 2, "avgUSD": 11000, "minUSD": 10000, "maxUSD": 12000}],
+    }
+
+
+def test_price_history_without_store(monkeypatch):
+    monkeypatch.setattr(main, "history_store", None)
+    response = TestClient(main.app).get("/api/price-history", params={"query": "cronos"})
+    assert response.json() == {"query": "cronos", "months": []}
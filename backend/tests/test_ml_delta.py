@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from ml_delta import KnownListingsStore
+from shared_cache import build_shared_cache
+from sources import ML_CARS_CATEGORY, ML_PAGE_LIMIT, ML_RECENT_SORT, ML_SITE, MercadoLibreSource
+from upstream_fixtures import split_request
+
+pytestmark = pytest.mark.anyio
+
+
+def ml_source(client, full_every=6):
+    known = KnownListingsStore(build_shared_cache("memory", None))
+    return MercadoLibreSource(client, deadline=5, ttl=300, known=known, full_every=full_every)
+
+
+def rewrite_search_page(store, query, page, sort, change):
+    params = {"q": query, "category": ML_CARS_CATEGORY, "limit": ML_PAGE_LIMIT, "offset": page * ML_PAGE_LIMIT}
+    if sort:
+        params["sort"] = sort
+    host, path, merged = split_request(f"https://api.mercadolibre.com/sites/{ML_SITE}/search", params)
+    status, content_type, body = store.load(host, path, merged)
+    data = json.loads(body)
+    change(data)
+    store.save(host, path, merged, status, content_type, json.dumps(data).encode())
+
+
+async def test_delta_refresh_reads_recent_pages_only(upstream):
+    source = ml_source(upstream)
+    first = source.parse(await source.fetch("onix", 3))
+    assert source.refreshes == {"full": 1, "delta": 0}
+    assert source.items_fetched == 3 * ML_PAGE_LIMIT
+    second = source.parse(await source.fetch("onix", 3))
+    assert source.refreshes == {"full": 1, "delta": 1}
+    assert source.delta_enabled
+    # Nada nuevo: la primera página termina en una conocida y no se pide /items
+    assert source.items_fetched == 3 * ML_PAGE_LIMIT
+    assert source.items_reused == ML_PAGE_LIMIT
+    assert [car["sourceId"] for car in second] == [car["sourceId"] for car in first]
+
+
+async def test_ignored_sort_falls_back_to_full_refresh(upstream, fixture_store):
+    def relevance(data):
+        data["sort"] = {"id": "relevance", "name": "Más relevantes"}
+        data["available_sorts"] = [{"id": "price_asc", "name": "Menor precio"}]
+
+    rewrite_search_page(fixture_store, "onix", 0, ML_RECENT_SORT, relevance)
+    source = ml_source(upstream)
+    await source.fetch("onix", 3)
+    raw = await source.fetch("onix", 3)
+    assert source.refreshes == {"full": 2, "delta": 0}
+    assert not source.delta_enabled
+    assert len(source.parse(raw)) == 3 * ML_PAGE_LIMIT
+
+
+async def test_reused_counts_unique_listings(upstream, fixture_store):
+    # El primer auto de la página 1 se repite al final de la página 2
+    source = ml_source(upstream, full_every=1)
+    await source.fetch("onix", 3)
+    fetched = source.items_fetched
+    first_id = []
+    rewrite_search_page(fixture_store, "onix", 0, None, lambda data: first_id.append(data["results"][0]))
+    rewrite_search_page(fixture_store, "onix", 1, None, lambda data: data["results"].append(first_id[0]))
+    raw = await source.fetch("onix", 3)
+    assert source.refreshes == {"full": 2, "delta": 0}
+    assert source.items_fetched == fetched
+    assert source.items_reused == 3 * ML_PAGE_LIMIT
+    assert len(source.parse(raw)) == 3 * ML_PAGE_LIMIT
@@ -0,0 +1,105 @@
+import pytest
+
+from listing import Listing
+from result_view import InvalidCursor, ResultView, Selection
+
+
+def car(i, price, year, km, source="mercadolibre", score="regular"):
+    return Listing(
+        title=f"Chevrolet Onix {i}", originalPrice=price, currency="USD", year=year, km=km,
+        location="Córdoba", image="", url=f"https://example.com/{i}", source=source,
+        sourceId=str(i), priceScore=score, priceUSD=price, id=f"id{i}",
+    )
+
+
+def result(cars):
+    sources = {name: {"status": "ok", "count": 0} for name in ("v6", "mercadolibre", "kavak")}
+    return {"cars": cars, "dollar_rate": 1285.0, "sources": sources}
+
+
+@pytest.fixture
+def view():
+    cars = [
+        car(0, 10000, 2015, 90000),
+        car(1, 15000, 2019, 30000, source="kavak", score="bueno"),
+        car(2, 0, 2018, 50000),                       # sin precio
+        car(3, 12000, None, 70000, source="v6"),      # sin año
+        car(4, 9000, 2012, None, score="muy-bueno"),  # sin km
+        car(5, 20000, 2021, 10000, source="kavak", score="malo"),
+    ]
+    return ResultView(result(cars))
+
+
+def ids(page):
+    return [c["id"] for c in page["cars"]]
+
+
+def test_filters(view):
+    assert ids(view.page(Selection(year_min=2016))) == ["id1", "id2", "id5"]
+    assert ids(view.page(Selection(km_max=60000))) == ["id1", "id2", "id5"]
+    assert ids(view.page(Selection(price_min=10000, price_max=15000))) == ["id0", "id1", "id3"]
+    assert ids(view.page(Selection(source="kavak,v6"))) == ["id1", "id3", "id5"]
+    assert ids(view.page(Selection(price_score="bueno,muy-bueno"))) == ["id1", "id4"]
+
+
+def test_missing_year_or_km_never_passes_a_bound(view):
+    # Cualquier cota deja afuera al auto sin dato, también las que "no cortan"
+    assert "id3" not in ids(view.page(Selection(year_max=2030)))
+    assert "id3" not in ids(view.page(Selection(year_min=1900)))
+    assert "id4" not in ids(view.page(Selection(km_min=0)))
+    assert "id3" in ids(view.page(Selection()))
+
+
+def test_sort_puts_missing_values_last(view):
+    assert ids(view.page(Selection(sort="price_asc"))) == ["id4", "id0", "id3", "id1", "id5", "id2"]
+    assert ids(view.page(Selection(sort="year_desc"))) == ["id5", "id1", "id2", "id0", "id4", "id3"]
+    assert ids(view.page(Selection(sort="km_asc")))[-1] == "id4"
+
+
+def test_unknown_sort():
+    with pytest.raises(ValueError):
+        Selection(sort="cheapest")
+
+
+def test_cursor_round_trip_covers_every_car_once():
+    view = ResultView(result([car(i, 5000 + i * 37 % 900, 2010 + i % 12, i * 1000) for i in range(53)]))
+    selection = Selection(sort="price_desc", year_min=2012)
+    expected = ids(view.page(selection, limit=200))
+    seen, cursor, offsets = [], None, []
+    while True:
+        page = view.page(selection, limit=7, cursor=cursor)
+        offsets.append(page["offset"])
+        seen.extend(ids(page))
+        assert page["total"] == len(expected)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+    assert offsets == list(range(0, len(expected), 7))
+    # prev_cursor vuelve a la página anterior
+    second = view.page(selection, limit=7, cursor=view.page(selection, limit=7)["next_cursor"])
+    assert ids(view.page(selection, limit=7, cursor=second["prev_cursor"])) == expected[:7]
+
+
+def test_cursor_is_bound_to_filters_and_result(view):
+    cursor = view.page(Selection(sort="price_asc"), limit=2)["next_cursor"]
+    with pytest.raises(InvalidCursor):
+        view.page(Selection(sort="price_desc"), limit=2, cursor=cursor)
+    changed = ResultView(result(list(view.cars) + [car(9, 11000, 2016, 40000)]))
+    with pytest.raises(InvalidCursor):
+        changed.page(Selection(sort="price_asc"), limit=2, cursor=cursor)
+    with pytest.raises(InvalidCursor):
+        view.page(Selection(), cursor="no-es-un-cursor")
+    # El mismo contenido en otro crawl conserva el cursor
+    same = ResultView(result([c.copy() for c in view.cars]))
+    assert same.page(Selection(sort="price_asc"), limit=2, cursor=cursor)["offset"] == 2
+
+
+def test_card_fields_and_stats(view):
+    page = view.page(Selection(), limit=2)
+    assert set(page["cars"][0]) <= {
+        "id", "title", "price", "priceUSD", "originalPrice", "currency", "year",
+        "km", "location", "image", "url", "urls", "priceScore", "source",
+    }
+    assert "sourceId" in view.page(Selection(), limit=2, fields="full")["cars"][0]
+    assert page["stats"] == {"minUSD": 9000.0, "avgUSD": 13200.0, "maxUSD": 20000.0}
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from search_cache import SearchCache, make_key, normalize_query
+from shared_cache import SQLiteBackend, build_shared_cache
+
+pytestmark = pytest.mark.anyio
+
+
+def counting_fetch(calls, value, delay=0.05):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value
+    return fetch
+
+
+def test_key_normalizes_query_and_sources():
+    assert normalize_query("  Gol   TREND ") == "gol trend"
+    assert make_key("Gol  Trend", 3, {"v6", "mercadolibre"}) == make_key("gol trend", 3, ["mercadolibre", "v6"])
+    assert make_key("gol trend", 3, {"v6"}) != make_key("gol trend", 2, {"v6"})
+
+
+async def test_single_flight_in_process():
+    cache = SearchCache(1024 * 1024)
+    calls = []
+    fetch = counting_fetch(calls, {"cars": [1, 2, 3]})
+    results = await asyncio.gather(*(cache.get_or_fetch("k", fetch, lambda v: 60) for _ in range(10)))
+    assert len(calls) == 1
+    assert sorted(status for _, status, _ in results) == ["COALESCED"] * 9 + ["MISS"]
+    assert all(value == {"cars": [1, 2, 3]} for value, _, _ in results)
+    value, status, _ = await cache.get_or_fetch("k", fetch, lambda v: 60)
+    assert status == "HIT" and len(calls) == 1
+    assert (cache.hits, cache.misses) == (10, 1)
+
+
+async def test_single_flight_across_processes(tmp_path):
+    # Dos "workers": cada uno con su SearchCache sobre el mismo SQLite
+    shared = build_shared_cache("sqlite", str(tmp_path / "shared.db"))
+    try:
+        a, b = SearchCache(1024 * 1024, shared=shared), SearchCache(1024 * 1024, shared=shared)
+        calls = []
+        fetch = counting_fetch(calls, {"cars": ["x"]}, delay=0.2)
+        (va, sa, _), (vb, sb, _) = await asyncio.gather(
+            a.get_or_fetch("k", fetch, lambda v: 60), b.get_or_fetch("k", fetch, lambda v: 60),
+        )
+        assert len(calls) == 1
+        assert va == vb == {"cars": ["x"]}
+        assert sorted((sa, sb)) == ["COALESCED", "MISS"]
+    finally:
+        shared.close()
+
+
+async def test_sqlite_close_closes_every_thread_connection(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "shared.db"))
+    backend.set("k", b"v", 60)
+    await asyncio.gather(*(asyncio.to_thread(backend.get, "k") for _ in range(8)))
+    conns = set(backend._conns)
+    assert len(conns) > 1
+    backend.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # Después de cerrar, el backend abre conexiones nuevas si se lo vuelve a usar
+    assert backend.get("k")[0] == b"v"
+    backend.close()
+
+
+async def test_ttl_comes_from_the_result(monkeypatch):
+    cache = SearchCache(1024 * 1024)
+    calls = []
+
+    def ttl_for(value):
+        return 30 if value["failed"] else 300
+
+    await cache.get_or_fetch("ok", counting_fetch(calls, {"failed": False}, 0), ttl_for)
+    await cache.get_or_fetch("failed", counting_fetch(calls, {"failed": True}, 0), ttl_for)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert (await cache.get("ok")) is not None
+    assert (await cache.get("failed")) is None
+    monkeypatch.setattr(time, "time", lambda: now + 301)
+    assert (await cache.get("ok")) is None
+
+
+async def test_failed_fetch_is_not_cached():
+    cache = SearchCache(1024 * 1024)
+
+    async def broken():
+        raise RuntimeError("upstream caído")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("k", broken, lambda v: 60)
+    calls = []
+    _, status, _ = await cache.get_or_fetch("k", counting_fetch(calls, {"cars": []}, 0), lambda v: 60)
+    assert status == "MISS" and len(calls) == 1
+
+
+async def test_lru_is_bounded_by_bytes():
+    cache = SearchCache(max_bytes=300)
+    for i in range(5):
+        await cache.set(f"k{i}", {"cars": ["x" * 80]}, 60)
+    assert cache.stats()["bytes"] <= 300
+    assert (await cache.get("k0")) is None
+    assert (await cache.get("k4")) is not None
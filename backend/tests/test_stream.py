@@ -0,0 +1,109 @@
+import asyncio
+
+import orjson
+import pytest
+
+import main
+from listing import Listing
+from search_cache import SearchCache, make_key
+
+pytestmark = pytest.mark.anyio
+
+RATE = {"value": 1000.0, "source": "test", "age_seconds": 0}
+
+
+def car(title, source, source_id, km=50000, price=10_000_000):
+    return Listing(
+        title=title, originalPrice=price, currency="$", year=2018, km=km, location="CABA",
+        image="", url=f"https://example.com/{source_id}", source=source, sourceId=source_id, price=price,
+    )
+
+
+async def collect(stream):
+    return [orjson.loads(chunk) async for chunk in stream]
+
+
+@pytest.fixture
+def live(monkeypatch):
+    # Cache propio, cotización fija y V6 con dos autos; ML según cada test
+    monkeypatch.setattr(main, "search_cache", SearchCache(1024 * 1024))
+    monkeypatch.setattr(main, "market_stats", None)
+
+    async def rate():
+        return RATE
+
+    async def v6(query, pages):
+        await asyncio.sleep(0.05)
+        return [car("Chevrolet Onix LT", "v6", "a"), car("Chevrolet Onix LTZ", "v6", "b", km=90000)]
+
+    monkeypatch.setattr(main.rate_cache, "get", rate)
+    monkeypatch.setattr(main.source_registry["v6"], "search", v6)
+    return {"mercadolibre", "v6"}
+
+
+async def test_stream_joins_inflight_search(live, monkeypatch):
+    calls = []
+
+    async def ml(query, pages):
+        calls.append(query)
+        await asyncio.sleep(0.1)
+        return [car("Chevrolet Onix Premier", "mercadolibre", "MLA1", km=150000)]
+
+    monkeypatch.setattr(main.source_registry["mercadolibre"], "search", ml)
+    key = make_key("onix", 1, live)
+    # Un stream y un /api/cars para la misma búsqueda mientras otro stream corre
+    first, second, (value, status, _) = await asyncio.gather(
+        collect(main.stream_search_cars(key, "onix", 1, live, None)),
+        collect(main.stream_search_cars(key, "onix", 1, live, None)),
+        main.search_cache.get_or_fetch(key, lambda: main.search_cars("onix", 1, live), main.search_ttl),
+    )
+    assert calls == ["onix"]
+    assert status == "COALESCED"
+    assert [e["type"] for e in first] == ["source", "source", "dedup", "scores", "done"]
+    assert first[-1]["cache"] == "MISS" and second[-1]["cache"] == "COALESCED"
+    assert len(value["cars"]) == 3
+    assert second[-2]["scores"] == first[-2]["scores"]
+    assert (await main.search_cache.get(key)).value is value
+
+
+async def test_stream_survives_client_leaving(live, monkeypatch):
+    async def ml(query, pages):
+        await asyncio.sleep(0.1)
+        return []
+
+    monkeypatch.setattr(main.source_registry["mercadolibre"], "search", ml)
+    key = make_key("onix", 1, live)
+    stream = main.stream_search_cars(key, "onix", 1, live, None)
+    await stream.__anext__()  # el primer evento y el cliente se va
+    await stream.aclose()
+    value, _ = await main.search_cache.inflight(key)
+    assert (await main.search_cache.get(key)).value is value
+
+
+async def test_stream_falls_back_to_index_per_source(live, monkeypatch):
+    async def ml(query, pages):
+        raise RuntimeError("status 503")
+
+    searched = []
+
+    async def search_index(query, sources, year=(None, None), km=(None, None)):
+        searched.append(set(sources))
+        return [car("Chevrolet Onix Joy", "mercadolibre", "MLA9", km=150000)]
+
+    monkeypatch.setattr(main.source_registry["mercadolibre"], "search", ml)
+    monkeypatch.setattr(main, "listing_index", object())
+    monkeypatch.setattr(main, "INDEX_FALLBACK", True)
+    monkeypatch.setattr(main, "search_index", search_index)
+    recorded = []
+    monkeypatch.setattr(main, "index_listings", recorded.extend)
+    events = await collect(main.stream_search_cars(make_key("onix", 1, live), "onix", 1, live, None))
+
+    assert searched == [{"mercadolibre"}]
+    by_source = {e["source"]: e for e in events if e["type"] == "source"}
+    assert by_source["mercadolibre"]["status"]["status"] == "error"
+    assert by_source["mercadolibre"]["status"]["fallback"] == 1
+    assert [c["sourceId"] for c in by_source["mercadolibre"]["cars"]] == ["MLA9"]
+    assert by_source["mercadolibre"]["cars"][0]["priceUSD"] == 10_000
+    assert len(events[-2]["scores"]) == 3
+    # Lo que salió del índice no se vuelve a indexar
+    assert sorted(c["sourceId"] for c in recorded) == ["a", "b"]
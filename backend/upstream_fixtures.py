@@ -0,0 +1,79 @@
+"""
+Fixtures de respuestas de upstreams, para grabar y reproducir offline.
+
+Cada respuesta se guarda como un JSON en <root>/<host>/<clave>.json, donde la
+clave es un hash de (host, path, query params ordenados). La misma clave la
+calcula el cliente al grabar (AUTITOS_RECORD_DIR) y el mock de
+bench/mock_upstream.py al servir, así una corrida grabada se reproduce tal
+cual sin red.
+"""
+import base64
+import hashlib
+import json
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+def split_request(url, params=None):
+    """
+    (host, path, params) de un GET, mezclando la query de la URL con `params`.
+    """
+    parts = urlsplit(url)
+    merged = dict(parse_qsl(parts.query))
+    merged.update({key: str(value) for key, value in (params or {}).items()})
+    return parts.hostname or "", parts.path or "/", merged
+
+
+def fixture_key(host, path, params):
+    raw = f"{host}{path}?{urlencode(sorted(params.items()))}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, host, path, params):
+        return os.path.join(self.root, host, fixture_key(host, path, params) + ".json")
+
+    def save(self, host, path, params, status, content_type, body):
+        try:
+            payload = {"body": body.decode("utf-8"), "encoding": "utf-8"}
+        except UnicodeDecodeError:
+            payload = {"body": base64.b64encode(body).decode("ascii"), "encoding": "base64"}
+        fixture = {
+            "host": host,
+            "path": path,
+            "params": params,
+            "status": status,
+            "content_type": content_type,
+            **payload,
+        }
+        target = self.path_for(host, path, params)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        os.replace(tmp, target)
+        return target
+
+    def load(self, host, path, params):
+        """
+        Devuelve (status, content_type, body bytes) o None si no hay fixture.
+        """
+        try:
+            with open(self.path_for(host, path, params), encoding="utf-8") as f:
+                fixture = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if fixture["encoding"] == "base64":
+            body = base64.b64decode(fixture["body"])
+        else:
+            body = fixture["body"].encode("utf-8")
+        return fixture["status"], fixture["content_type"], body
+
+    def count(self):
+        total = 0
+        for _, _, files in os.walk(self.root):
+            total += sum(1 for name in files if name.endswith(".json"))
+        return total
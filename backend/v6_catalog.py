@@ -0,0 +1,398 @@
+"""
+Snapshot local del catálogo de V6 con índice invertido de tokens.
+
+El dump completo de getPublishedCars se baja en segundo plano (GET
+condicional con ETag / Last-Modified), se guarda en disco y se indexa en
+memoria por tokens de marca, modelo, versión y año. Una búsqueda es un lookup
+en el índice más una intersección; nunca espera al refresco.
+
+Con un SharedCache entre workers sólo uno baja el dump (lock) y publica cuándo
+lo hizo; los demás cargan el snapshot que dejó en disco en vez de pedirlo.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+
+from http_client import BROWSER_USER_AGENT
+from listing import Listing
+from logs import get_logger, sampled
+
+log = get_logger("v6")
+
+V6_API_URL = "https://autoprecios-api.onrender.com/api/db/getPublishedCars"
+V6_HEADERS = {
+    "User-Agent": BROWSER_USER_AGENT,
+    "Origin": "https://v6.com.ar",
+    "Referer": "https://v6.com.ar/"
+}
+V6_RETRY_INTERVAL = 60  # segundos
+V6_PEER_WAIT = 5  # segundos hasta reintentar si otro worker no pudo bajar el dump
+V6_PEER_POLL = 0.2  # segundos entre chequeos mientras otro worker lo baja
+V6_LOCK_TTL = 120  # el fetch tiene timeout de 60 s, más el reindexado
+V6_META_KEY = "v6:meta"
+NO_IMAGE_URL = "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ac/No_image_available.svg/480px-No_image_available.svg.png"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """
+    Minúsculas y sin acentos, para indexar y buscar con el mismo criterio.
+    """
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def parse_v6_car(car):
+    """
+    Convierte un auto crudo de la API de V6 al formato común de listados.
+    """
+    # Construir título legible
+    title = f"{car.get('brand', '').title()} {car.get('model', '').title()}"
+    if car.get('version'):
+        title += f" {car.get('version')}"
+    if car.get('year'):
+        title += f" {car.get('year')}"
+
+    # Precio (parece que está en centavos o formato especial)
+    price_raw = car.get('price', 0)
+    if isinstance(price_raw, str):
+        price_raw = int(re.sub(r'[^\d]', '', price_raw))
+
+    # Si el precio es muy alto, probablemente esté en pesos;
+    # si no, probablemente ya esté en USD
+    currency = "ARS" if price_raw > 1000000 else "USD"
+
+    # Kilómetros
+    km = None
+    km_raw = car.get('kilometers')
+    if km_raw:
+        try:
+            km = int(re.sub(r'[^\d]', '', str(km_raw)))
+        except:
+            pass
+
+    # Año
+    year = None
+    year_raw = car.get('year')
+    if year_raw:
+        try:
+            year = int(year_raw)
+        except:
+            pass
+
+    # Ubicación
+    location = car.get('city', '')
+    if car.get('province') and location:
+        location += f", {car.get('province')}"
+    elif car.get('province'):
+        location = car.get('province')
+
+    # Imagen
+    image = NO_IMAGE_URL
+    if car.get('cover') and car['cover'].get('url'):
+        image = car['cover']['url']
+    elif car.get('exterior') and len(car['exterior']) > 0:
+        image = car['exterior'][0].get('url', image)
+
+    # URL
+    car_id = car.get('carId') or car.get('id', '')
+    url = f"https://v6.com.ar/car/{car_id}" if car_id else "https://v6.com.ar"
+
+    return Listing(
+        title=title.strip(),
+        originalPrice=price_raw,
+        currency=currency,
+        year=year,
+        km=km,
+        location=location or "Argentina",
+        image=image,
+        url=url,
+        source="v6",
+        sourceId=str(car_id) or url,
+    )
+
+
+def build_index(raw_cars):
+    """
+    Precalcula los autos normalizados y el índice token -> posiciones.
+    Devuelve (entries, index, sorted_tokens).
+    """
+    entries = []
+    index = {}
+    for car in raw_cars:
+        try:
+            parsed = parse_v6_car(car)
+        except Exception as e:
+            sampled(log, logging.WARNING, "v6.car", "error procesando auto: %s", e)
+            continue
+        pos = len(entries)
+        entries.append((car, parsed))
+        tokens = set(tokenize(f"{car.get('brand', '')} {car.get('model', '')} {car.get('version', '')}"))
+        if parsed["year"]:
+            tokens.add(str(parsed["year"]))
+        for token in tokens:
+            index.setdefault(token, set()).add(pos)
+    return entries, index, sorted(index)
+
+
+class V6Catalog:
+    def __init__(self, client, snapshot_path, refresh_interval, shared=None):
+        self.client = client
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.shared = shared
+        # (entries, index, sorted_tokens) se reemplaza entero en cada refresco
+        self._state = ([], {}, [])
+        self.ready = False
+        self.fetched_at = None
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.last_error = None
+        self._task = None
+
+    # --- consultas -------------------------------------------------------
+
+    def _positions_for(self, token, index, sorted_tokens):
+        # Coincidencia exacta o por prefijo ("tre" -> "trend")
+        positions = set()
+        i = bisect.bisect_left(sorted_tokens, token)
+        while i < len(sorted_tokens) and sorted_tokens[i].startswith(token):
+            positions |= index[sorted_tokens[i]]
+            i += 1
+        return positions
+
+    def _match(self, query):
+        """
+        Posiciones (ordenadas) de los autos cuyo índice contiene todos los
+        tokens de la query, cada uno como palabra completa o prefijo.
+        """
+        entries, index, sorted_tokens = self._state
+        # Los tokens más largos suelen ser los más selectivos
+        tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not tokens:
+            return entries, []
+
+        candidates = None
+        for token in tokens:
+            positions = self._positions_for(token, index, sorted_tokens)
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return entries, []
+        return entries, sorted(candidates)
+
+    def search(self, query):
+        # Copias, porque get_cars completa id/precio/priceScore sobre cada auto
+        entries, positions = self._match(query)
+        return [entries[pos][1].copy() for pos in positions]
+
+    def search_raw(self, query):
+        entries, positions = self._match(query)
+        return [entries[pos][0] for pos in positions]
+
+    def age(self):
+        return time.time() - self.fetched_at if self.fetched_at else None
+
+    def info(self):
+        age = self.age()
+        return {
+            "ready": self.ready,
+            "total_cars": len(self._state[0]),
+            "tokens": len(self._state[2]),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "last_error": self.last_error,
+        }
+
+    # --- snapshot en disco ----------------------------------------------
+
+    def load_snapshot(self, expected_hash=None):
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snap = json.load(f)
+            if expected_hash is not None and snap.get("content_hash") != expected_hash:
+                # El worker que lo bajó no pudo escribirlo: éste no es ese catálogo
+                log.warning("el snapshot en disco no es el del cache compartido")
+                return False
+            self._install(snap["cars"], snap.get("content_hash"))
+            self.fetched_at = snap.get("fetched_at")
+            self.etag = snap.get("etag")
+            self.last_modified = snap.get("last_modified")
+            log.info("snapshot cargado (%d autos)", len(self._state[0]))
+            return True
+        except Exception as e:
+            log.warning("no se pudo leer el snapshot: %s", e)
+            return False
+
+    def _write_snapshot(self, raw_cars):
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "fetched_at": self.fetched_at,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "content_hash": self.content_hash,
+                "cars": raw_cars,
+            }, f)
+        os.replace(tmp, self.snapshot_path)
+
+    def _install(self, raw_cars, content_hash):
+        self._state = build_index(raw_cars)
+        self.content_hash = content_hash
+        self.ready = True
+
+    # --- refresco en segundo plano --------------------------------------
+
+    async def refresh(self):
+        """
+        Refresca el catálogo. Con cache compartido, si otro worker lo bajó hace
+        menos de refresh_interval se carga su snapshot; si otro lo está bajando
+        ahora se espera a que termine y se carga el suyo.
+        """
+        if self.shared is None:
+            return await self.refresh_upstream()
+
+        meta = await self._fresh_meta()
+        if meta is not None:
+            return await self._adopt(meta)
+
+        token = await self.shared.try_lock("lock:" + V6_META_KEY, V6_LOCK_TTL)
+        if token is None:
+            while await self.shared.is_locked("lock:" + V6_META_KEY):
+                await asyncio.sleep(V6_PEER_POLL)
+            meta = await self._fresh_meta()
+            # Si el otro worker falló, la próxima vuelta lo intenta éste
+            return await self._adopt(meta) if meta is not None else False
+        try:
+            changed = await self.refresh_upstream()
+            if self.last_error is None:
+                meta = {"fetched_at": self.fetched_at, "content_hash": self.content_hash}
+                await self.shared.set(V6_META_KEY, json.dumps(meta).encode(), 30 * 24 * 3600)
+            return changed
+        finally:
+            await self.shared.unlock("lock:" + V6_META_KEY, token)
+
+    async def _fresh_meta(self):
+        found = await self.shared.get(V6_META_KEY)
+        if found is None:
+            return None
+        meta = json.loads(found[0])
+        return meta if time.time() - meta["fetched_at"] < self.refresh_interval else None
+
+    async def _adopt(self, meta):
+        """
+        Usa el snapshot que dejó otro worker. Devuelve True si cambió.
+        """
+        changed = meta["content_hash"] != self.content_hash
+        if changed and not await asyncio.to_thread(self.load_snapshot, meta["content_hash"]):
+            # Sin snapshot legible en disco se baja como si no hubiera otro worker
+            return await self.refresh_upstream()
+        self.fetched_at = meta["fetched_at"]
+        self.last_error = None
+        return changed
+
+    async def refresh_upstream(self):
+        """
+        GET condicional al dump de V6. Si no cambió (304 o mismo hash) sólo
+        actualiza la fecha; si cambió reindexa fuera del event loop.
+        """
+        headers = dict(V6_HEADERS)
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        try:
+            response = await self.client.get(V6_API_URL, headers=headers, timeout=60)
+            if response.status == 304:
+                self.fetched_at = time.time()
+                self.last_error = None
+                return False
+            if response.status != 200:
+                raise RuntimeError(f"V6 API status {response.status}")
+            body = response.body
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            self.last_error = str(e)
+            log.error("error conectando con la API: %s", e)
+            return False
+
+        content_hash = hashlib.sha256(body).hexdigest()
+        if content_hash == self.content_hash:
+            self.etag, self.last_modified = etag, last_modified
+            self.fetched_at = time.time()
+            self.last_error = None
+            return False
+
+        try:
+            raw_cars = json.loads(body)
+            state = await asyncio.to_thread(build_index, raw_cars)
+        except Exception as e:
+            # p.ej. una página de error HTML con status 200: se sigue con el
+            # catálogo anterior y sin guardar el ETag, así no vuelve un 304
+            self.last_error = f"catálogo inválido: {e}"
+            log.error("respuesta de la API inválida: %s", e)
+            return False
+        # Recién con el índice nuevo instalado se da por bajada esta versión
+        self._state = state
+        self.content_hash = content_hash
+        self.ready = True
+        self.etag, self.last_modified = etag, last_modified
+        self.fetched_at = time.time()
+        self.last_error = None
+        try:
+            await asyncio.to_thread(self._write_snapshot, raw_cars)
+        except OSError as e:
+            # El catálogo nuevo ya está en uso; los otros workers ven que el
+            # snapshot no coincide y lo bajan ellos (ver load_snapshot)
+            log.error("no se pudo escribir el snapshot: %s", e)
+        log.info("catálogo actualizado (%d autos, %d tokens)", len(state[0]), len(state[2]))
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            age = self.age()
+            if age is None or age >= self.refresh_interval:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    # Un error inesperado (cache compartido, disco) no mata la tarea
+                    self.last_error = str(e)
+                    log.error("error refrescando el catálogo: %s", e)
+                age = self.age()
+                if self.last_error is not None:
+                    # Falló (p.ej. cold start de onrender): se reintenta antes
+                    wait = V6_RETRY_INTERVAL
+                elif age is None or age >= self.refresh_interval:
+                    # Otro worker lo estaba bajando y no dejó resultado
+                    wait = V6_PEER_WAIT
+                else:
+                    wait = self.refresh_interval - age
+            else:
+                wait = self.refresh_interval - age
+            await asyncio.sleep(wait)
+
+    def start(self):
+        self.load_snapshot()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,44 @@
+"""
+Worker de pre-calentado: corre el Prewarmer fuera del proceso web.
+
+Lee las búsquedas calientes que cuenta la app (en el cache compartido) más
+las fijas de AUTITOS_PREWARM_QUERIES, y deja los resultados en el cache de
+búsquedas. Para que el proceso web los vea, ambos deben usar
+AUTITOS_CACHE_BACKEND=sqlite con el mismo AUTITOS_CACHE_PATH, en la misma
+máquina (un dyno aparte no ve ese archivo: ahí va AUTITOS_PREWARM=1 en la app).
+Sin un cache compartido entre procesos el worker no arranca: sólo gastaría
+rate limit de los upstreams en un cache que nadie lee.
+
+    AUTITOS_CACHE_BACKEND=sqlite python worker.py
+"""
+import asyncio
+import sys
+
+import main
+from logs import get_logger
+
+log = get_logger("worker")
+
+
+async def run():
+    main.cpu_pool.start()
+    main.v6_catalog.start()
+    if main.market_stats:
+        main.market_stats.start()
+    prewarmer = main.build_prewarmer(reload_hot_queries=True)
+    try:
+        await prewarmer.run_forever()
+    finally:
+        await main.v6_catalog.stop()
+        if main.market_stats:
+            await main.market_stats.stop()
+        await main.upstream.close()
+        main.cpu_pool.close()
+        main.shared_cache.close()
+
+
+if __name__ == "__main__":
+    if not main.shared_cache.backend.cross_process:
+        log.error("AUTITOS_CACHE_BACKEND no es sqlite: el proceso web no vería los resultados")
+        sys.exit(1)
+    asyncio.run(run())
@@ -18,6 +18,7 @@ const AutoValor = () => {
   const [hasSearched, setHasSearched] = useState(false);
   const [cars, setCars] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const [error, setError] = useState(null);
   const [dollarRate, setDollarRate] = useState(null);
   const [dollarLoading, setDollarLoading] = useState(false);
@@ -25,17 +26,27 @@ const AutoValor = () => {
   const [paginaActual, setPaginaActual] = useState(1);
   const autosPorPagina = 20;
   const [priceScoreFilter, setPriceScoreFilter] = useState('');
+  const [sortKey, setSortKey] = useState('relevance');
+  // Página servida por /api/cars (filtros y orden en el backend); null mientras llega el stream
+  const [serverPage, setServerPage] = useState(null);
+  const [cursors, setCursors] = useState([null]);
+  const [activeQuery, setActiveQuery] = useState('');
 
 
-  const priceHistory = [
-    { month: 'Jul 2024', price: 7800 },
-    { month: 'Ago 2024', price: 8200 },
-    { month: 'Sep 2024', price: 8500 },
-    { month: 'Oct 2024', price: 8900 },
-    { month: 'Nov 2024', price: 9200 },
-    { month: 'Dec 2024', price: 9600 },
-    { month: 'Ene 2025', price: 10200 }
-  ];
+  const [priceHistory, setPriceHistory] = useState([]);
+  const [historyQuery, setHistoryQuery] = useState('');
+
+  const fetchPriceHistory = async (query) => {
+    try {
+      const response = await axios.get(`${config.API_BASE_URL}/api/price-history?query=${encodeURIComponent(query)}`);
+      const months = (response.data && response.data.months) || [];
+      setPriceHistory(months.map((m) => ({ month: m.month, price: m.avgUSD, count: m.count })));
+      setHistoryQuery(query);
+    } catch (err) {
+      console.error('Error al obtener historial de precios:', err);
+      setPriceHistory([]);
+    }
+  };
 
   useEffect(() => {
     const fetchDollarRate = async () => {
@@ -97,33 +108,119 @@ const AutoValor = () => {
     return car.currency === 'USD' ? formatUSD(car.originalPrice) : formatPrice(car.originalPrice);
   };
 
+  // Lee /api/cars/stream (NDJSON) y va renderizando cada fuente apenas llega
+  const streamSearch = async (query) => {
+    const url = `${config.API_BASE_URL}/api/cars/stream?query=${encodeURIComponent(query)}&include_kavak=true&include_ml=true&include_v6=true`;
+    const response = await fetch(url);
+    if (!response.ok || !response.body) {
+      const err = new Error(`Error del servidor: ${response.status} - ${response.statusText}`);
+      err.isServerError = true;
+      throw err;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handleEvent = (event) => {
+      if (event.type === 'source') {
+        if (event.cars.length > 0) {
+          setCars((prev) => [...prev, ...event.cars]);
+          setLoading(false);
+        }
+      } else if (event.type === 'dedup') {
+        // El mismo auto publicado en varias fuentes queda en una sola card
+        setCars((prev) => prev
+          .filter((car) => !event.merged[car.id])
+          .map((car) => (event.urls[car.id] ? { ...car, urls: event.urls[car.id] } : car)));
+      } else if (event.type === 'scores') {
+        setCars((prev) => prev.map((car) => ({
+          ...car,
+          ...(event.details && event.details[car.id]),
+          priceScore: event.scores[car.id] || car.priceScore
+        })));
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) handleEvent(JSON.parse(buffer));
+  };
+
+  const searchParams = (query, cursor) => {
+    const params = new URLSearchParams({
+      query,
+      include_kavak: 'true',
+      include_ml: 'true',
+      include_v6: 'true',
+      sort: sortKey,
+      limit: String(autosPorPagina)
+    });
+    if (priceRange.min) params.set('price_min', priceRange.min);
+    if (priceRange.max) params.set('price_max', priceRange.max);
+    if (priceScoreFilter) params.set('price_score', priceScoreFilter);
+    if (cursor) params.set('cursor', cursor);
+    return params;
+  };
+
+  // Pide una página ya filtrada y ordenada sobre el resultado cacheado en el backend
+  const fetchPage = async (query, cursor, pageIndex) => {
+    try {
+      const response = await axios.get(`${config.API_BASE_URL}/api/cars?${searchParams(query, cursor)}`);
+      setServerPage(response.data);
+      setPaginaActual(pageIndex + 1);
+      setCursors((prev) => {
+        const next = prev.slice(0, pageIndex + 1);
+        next[pageIndex] = cursor;
+        if (response.data.next_cursor) next.push(response.data.next_cursor);
+        return next;
+      });
+    } catch (err) {
+      console.error('Error al obtener resultados:', err);
+    }
+  };
+
+  useEffect(() => {
+    if (!hasSearched || streaming || !activeQuery) return undefined;
+    // Debounce para no pedir una página por cada tecla del rango de precios
+    const timer = setTimeout(() => fetchPage(activeQuery, null, 0), 300);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [priceRange, priceScoreFilter, sortKey, streaming, activeQuery]);
+
   const handleSearch = async (e) => {
     e.preventDefault();
     if (searchQuery.trim()) {
       setHasSearched(true);
       setLoading(true);
+      setStreaming(true);
       setError(null);
       setCars([]);
+      setServerPage(null);
+      setCursors([null]);
+      setActiveQuery('');
+      setPaginaActual(1);
       try {
-        const response = await axios.get(`${config.API_BASE_URL}/api/cars?query=${encodeURIComponent(searchQuery.trim())}&include_kavak=true&include_ml=true&include_v6=true`);
-        if (Array.isArray(response.data)) {
-          setCars(response.data);
-          setPaginaActual(1);
-        } else {
-          setError('Formato de respuesta inválido');
-          setCars([]);
-        }
+        await streamSearch(searchQuery.trim());
+        // El resultado quedó cacheado: desde acá filtros, orden y páginas los resuelve el backend
+        setActiveQuery(searchQuery.trim());
+        fetchPriceHistory(searchQuery.trim());
       } catch (err) {
         console.error('Error al buscar autos:', err);
-        setError(err.response
-          ? `Error del servidor: ${err.response.status} - ${err.response.statusText}`
-          : err.request
-          ? 'Error de conexión. Verifica que el servidor esté corriendo en http://localhost:8000'
-          : 'Error inesperado al buscar autos'
+        setError(err.isServerError
+          ? err.message
+          : 'Error de conexión. Verifica que el servidor esté corriendo en http://localhost:8000'
         );
         setCars([]);
       } finally {
         setLoading(false);
+        setStreaming(false);
         setTimeout(() => {
           const section = document.getElementById('results-section');
           if (section) section.scrollIntoView({ behavior: 'smooth' });
@@ -132,7 +229,8 @@ const AutoValor = () => {
     }
   };
 
-  const filteredCars = cars.filter((car) => {
+  // Mientras llega el stream se filtra lo recibido en el cliente
+  const streamedCars = cars.filter((car) => {
     if (!car || car.priceUSD == null) return false;
   
     const carPrice = parseInt(car.priceUSD);
@@ -146,11 +244,19 @@ const AutoValor = () => {
   
 
   const indiceInicio = (paginaActual - 1) * autosPorPagina;
-  const autosPaginados = filteredCars.slice(indiceInicio, indiceInicio + autosPorPagina);
-  const totalPaginas = Math.ceil(filteredCars.length / autosPorPagina);
+  const autosPaginados = serverPage
+    ? serverPage.cars
+    : streamedCars.slice(indiceInicio, indiceInicio + autosPorPagina);
+  const totalResultados = serverPage ? serverPage.total : streamedCars.length;
+  const totalPaginas = Math.ceil(totalResultados / autosPorPagina);
 
   const irPagina = (num) => {
-    if (num >= 1 && num <= totalPaginas) setPaginaActual(num);
+    if (num < 1 || num > totalPaginas) return;
+    if (!serverPage) {
+      setPaginaActual(num);
+    } else if (num === paginaActual + 1 || num === paginaActual - 1) {
+      fetchPage(activeQuery, cursors[num - 1], num - 1);
+    }
   };
 
   return (
@@ -180,7 +286,13 @@ const AutoValor = () => {
         <div id="results-section" className="bg-gray-50 py-12">
           <div className="max-w-7xl mx-auto px-4 grid grid-cols-1 lg:grid-cols-3 gap-8">
             <div className="lg:col-span-3 mb-8">
-              <ResultStats filteredCars={filteredCars} loading={loading} error={error} />
+              <ResultStats
+                filteredCars={streamedCars}
+                total={totalResultados}
+                stats={serverPage && serverPage.stats}
+                loading={loading}
+                error={error}
+              />
             </div>
 
             {loading && (
@@ -204,6 +316,24 @@ const AutoValor = () => {
               <>
                 {/* Resultados (2 columnas) */}
                 <div className="lg:col-span-2">
+                  {streaming && (
+                    <p className="text-sm text-gray-500 mb-4">Buscando en más fuentes...</p>
+                  )}
+                  <div className="flex justify-end mb-4">
+                    <select
+                      value={sortKey}
+                      onChange={(e) => setSortKey(e.target.value)}
+                      disabled={streaming}
+                      className="px-3 py-2 border border-gray-300 rounded-lg text-sm"
+                    >
+                      <option value="relevance">Relevancia</option>
+                      <option value="price_asc">Menor precio</option>
+                      <option value="price_desc">Mayor precio</option>
+                      <option value="year_desc">Más nuevos</option>
+                      <option value="km_asc">Menos kilómetros</option>
+                      <option value="score">Mejor precio según mercado</option>
+                    </select>
+                  </div>
                   <ResultList
                     filteredCars={autosPaginados}
                     selectedCar={selectedCar}
@@ -228,22 +358,9 @@ const AutoValor = () => {
                     >
                       ← Anterior
                     </button>
-                    {[...Array(totalPaginas)].map((_, idx) => {
-                      const pageNum = idx + 1;
-                      return (
-                        <button
-                          key={pageNum}
-                          onClick={() => irPagina(pageNum)}
-                          className={`px-3 py-1 rounded ${
-                            pageNum === paginaActual
-                              ? 'bg-blue-600 text-white font-semibold'
-                              : 'bg-gray-200 hover:bg-gray-300'
-                          }`}
-                        >
-                          {pageNum}
-                        </button>
-                      );
-                    })}
+                    <span className="px-3 py-1 text-gray-700">
+                      Página {paginaActual} de {Math.max(totalPaginas, 1)}
+                    </span>
                     <button
                       onClick={() => irPagina(paginaActual + 1)}
                       disabled={paginaActual === totalPaginas}
@@ -256,7 +373,7 @@ const AutoValor = () => {
 
                 {/* Panel derecho */}
                 <div className="space-y-6 lg:sticky lg:top-20 h-fit">
-                <PriceHistoryPanel data={priceHistory} />
+                <PriceHistoryPanel data={priceHistory} query={historyQuery} />
                 <DollarRateDisplay 
                   dollarRate={dollarRate} 
                   loading={dollarLoading} 
@@ -1,4 +1,15 @@
 import React from 'react';
+import config from '../config';
+
+// Las imágenes pasan por el proxy del backend (/api/img) cuando viene una ruta relativa
+const imageUrl = (src) => (src && src.startsWith('/api/') ? `${config.API_BASE_URL}${src}` : src);
+
+// Misma imagen al doble de ancho para pantallas de alta densidad
+const imageSrcSet = (src) => {
+  const url = imageUrl(src);
+  if (!url || !url.includes('/api/img?')) return undefined;
+  return `${url} 1x, ${url.replace(/([?&]w=)\d+/, '$1640')} 2x`;
+};
 
 const ResultCard = ({ 
   car, 
@@ -97,10 +108,13 @@ const ResultCard = ({
         {/* Imagen */}
         <div className="md:w-1/3 relative">
           <img
-            src={car.image}
+            src={imageUrl(car.image)}
+            srcSet={imageSrcSet(car.image)}
+            loading="lazy"
             alt={car.title}
             className="w-full h-48 md:h-full object-cover"
             onError={(e) => {
+              e.target.srcset = '';
               e.target.src = '/placeholder-car.png';
             }}
           />
@@ -234,6 +248,24 @@ const ResultCard = ({
               </svg>
               Ver Publicación en {sourceName}
             </button>
+            {/* Mismo auto publicado en otras fuentes */}
+            {car.urls?.length > 1 && (
+              <div className="mt-2 flex flex-wrap gap-2 text-xs text-gray-600">
+                <span>También en:</span>
+                {car.urls.filter((listing) => listing.url !== car.url).map((listing) => (
+                  <a
+                    key={listing.url}
+                    href={listing.url}
+                    target="_blank"
+                    rel="noopener noreferrer"
+                    onClick={(e) => e.stopPropagation()}
+                    className="underline hover:text-gray-900"
+                  >
+                    {getSourceName(listing)}{listing.priceUSD ? ` (${formatUSD(listing.priceUSD)})` : ''}
+                  </a>
+                ))}
+              </div>
+            )}
           </div>
 
           {/* Indicador de conversión */}
@@ -1,10 +1,12 @@
 import { Search, DollarSign, TrendingUp } from 'lucide-react';
 
-const ResultStats = ({ filteredCars }) => {
+const ResultStats = ({ filteredCars, total, stats }) => {
+  // Con paginado en el backend los agregados vienen calculados sobre todo el resultado
   const pricesUSD = filteredCars.map(car => car.priceUSD);
-  const avg = (pricesUSD.reduce((a, b) => a + b, 0) / pricesUSD.length) || 0;
-  const min = Math.min(...pricesUSD);
-  const max = Math.max(...pricesUSD);
+  const avg = stats ? (stats.avgUSD || 0) : ((pricesUSD.reduce((a, b) => a + b, 0) / pricesUSD.length) || 0);
+  const min = stats ? (stats.minUSD || 0) : Math.min(...pricesUSD);
+  const max = stats ? (stats.maxUSD || 0) : Math.max(...pricesUSD);
+  const count = total != null ? total : filteredCars.length;
 
   return (
     <div className="grid grid-cols-1 md:grid-cols-4 gap-4 mb-8">
@@ -12,7 +14,7 @@ const ResultStats = ({ filteredCars }) => {
         <div className="flex items-center justify-between">
           <div>
             <p className="text-sm font-medium text-gray-600">Resultados</p>
-            <p className="text-3xl font-bold text-gray-900">{filteredCars.length}</p>
+            <p className="text-3xl font-bold text-gray-900">{count}</p>
           </div>
           <div className="bg-blue-100 p-3 rounded-xl">
             <Search className="h-6 w-6 text-blue-600" />